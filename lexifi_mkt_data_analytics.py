@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS = 252
+REALIZED_VOL_WINDOWS = (21, 63, 252)  # 1M, 3M, 1Y en jours de cotation
+MIN_WINDOW_FRACTION = 0.8  # part minimale de rendements présents dans une fenêtre
+EWMA_HALFLIFE = 30  # jours de cotation
+EWMA_LOOKBACK_HALFLIVES = 10  # poids < 0.1 % au-delà
+MIN_OVERLAP = 20  # rendements communs minimum pour une corrélation
+
+def rebase_panel(panel, base=100.0):
+    # Panel large (dates x actifs) : chaque colonne ramenée à base à sa première valeur, base avant elle
+    first_values = panel.bfill().iloc[0] if len(panel) else pd.Series(np.nan, index=panel.columns)
+    excluded = first_values.index[first_values.isna()].tolist()
+    kept = panel.drop(columns=excluded)
+    rebased = kept.div(first_values.drop(excluded)) * base
+    started = kept.notna().cummax()
+    return rebased.where(started, base), excluded
+
+def year_end_closes(panel):
+    # Dernière valeur connue de chaque année, par colonne
+    return panel.groupby(panel.index.year).last()
+
+def yearly_performance(panel, start_year=None):
+    # Perf de l'année N = clôture N / dernière clôture connue jusqu'à N-1 - 1, en %
+    closes = year_end_closes(panel)
+    closes = closes.reindex(range(closes.index.min(), closes.index.max() + 1)) if len(closes) else closes
+    perf = (closes / closes.ffill().shift(1) - 1) * 100
+    if start_year is not None:
+        perf = perf[perf.index >= start_year]
+    return perf.T.rename(columns=lambda year: f"Perf {year}")
+
+def ytd_performance(panel):
+    closes = year_end_closes(panel)
+    if len(closes) < 2:
+        return pd.Series(np.nan, index=panel.columns)
+    return (closes.iloc[-1] / closes.iloc[-2] - 1) * 100
+
+def annualized_vol(panel, periods=TRADING_DAYS):
+    # Rendement de chaque cotation sur la précédente cotation connue : les trous ne coupent pas la série
+    returns = panel / panel.ffill().shift(1) - 1
+    return returns.std() * np.sqrt(periods)
+
+def panel_stats(panel, start_year):
+    # Même tableau que asset_spot_stats / asset_spot_yearly, calculé à la volée sur un panel déjà chargé
+    stats = pd.DataFrame({
+        "Valeur actuelle": panel.ffill().iloc[-1] if len(panel) else np.nan,
+        "Min": panel.min(),
+        "Max": panel.max(),
+        "Perf YTD": ytd_performance(panel),
+        "Volatilité réalisée (%)": annualized_vol(panel) * 100,
+    })
+    stats = stats.join(yearly_performance(panel, start_year))
+    return stats[panel.notna().any().reindex(stats.index)]
+
+def relative_slope_matrix(values, index=None):
+    # M[i, j] = values[j] / values[i] - 1 (en %), ligne à NaN si values[i] est nul
+    values = np.asarray(values, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        matrix = (values[None, :] / values[:, None] - 1) * 100
+    matrix[values == 0, :] = np.nan
+    return pd.DataFrame(matrix, index=index, columns=index)
+
+def forward_spot_ratio(forwards, spot_panel, base_ids, id_col, date_col, value_col):
+    # forwards : format long (id forward, date, valeur) ; spot_panel : dates x sous-jacents ; base_ids : id forward -> sous-jacent
+    # Une seule jointure sur (sous-jacent, date) pour tous les forwards, ratio ffill par forward
+    spot = spot_panel.stack().dropna().rename("spot")
+    spot.index.names = ["date", "base_id"]
+    order = list(dict.fromkeys(base_ids))
+    ratio = pd.DataFrame({
+        "id": pd.Categorical(forwards[id_col], categories=order),
+        "date": pd.to_datetime(forwards[date_col]),
+        "fwd": forwards[value_col].astype(float).to_numpy(),
+    })
+    ratio = ratio[ratio["id"].notna()]
+    ratio["base_id"] = ratio["id"].astype(str).map(base_ids)
+    ratio = ratio.join(spot, on=["date", "base_id"]).sort_values(["id", "date"], kind="stable")
+    ratio["fwd_spot"] = (ratio["fwd"] / ratio["spot"]).groupby(ratio["id"], observed=True).ffill()
+    ratio["id"] = ratio["id"].astype(str)
+    return ratio.reset_index(drop=True)
+
+# ----------------------- VOL RÉALISÉE / CORRÉLATIONS -----------------------
+
+def log_returns(panel):
+    # Rendement entre deux cotations successives de chaque actif : un jour sans cotation ne crée pas de rendement nul,
+    # le rendement suivant couvre tout l'écart
+    values = panel.to_numpy(dtype=float)
+    previous = pd.DataFrame(values).ffill().shift(1).to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.log(values / previous)
+    returns[~np.isfinite(returns)] = np.nan
+    return pd.DataFrame(returns, index=panel.index, columns=panel.columns)
+
+def rolling_realized_vol(returns, windows=REALIZED_VOL_WINDOWS, periods=TRADING_DAYS, min_fraction=MIN_WINDOW_FRACTION):
+    # Vol annualisée glissante pour toutes les fenêtres et tous les actifs à partir de sommes cumulées ;
+    # NaN si moins de min_fraction x window rendements présents dans la fenêtre
+    values = returns.to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    zeros = np.zeros((1, values.shape[1]))
+    n = np.vstack([zeros, np.cumsum(valid, axis=0)])
+    s = np.vstack([zeros, np.cumsum(filled, axis=0)])
+    ss = np.vstack([zeros, np.cumsum(filled ** 2, axis=0)])
+    end = np.arange(1, len(values) + 1)
+    vols = {}
+    for window in windows:
+        begin = np.maximum(end - window, 0)
+        count = n[end] - n[begin]
+        total = s[end] - s[begin]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            variance = (ss[end] - ss[begin] - total ** 2 / count) / (count - 1)
+        variance[count < max(2, np.ceil(min_fraction * window))] = np.nan
+        vols[window] = pd.DataFrame(np.sqrt(np.maximum(variance, 0) * periods), index=returns.index, columns=returns.columns)
+    return vols
+
+def ewma_covariance(returns, halflife=EWMA_HALFLIFE, periods=TRADING_DAYS, min_overlap=MIN_OVERLAP):
+    # Covariance EWMA à moyenne nulle (annualisée) et corrélation, chaque paire normalisée sur les seules dates
+    # où les deux actifs ont un rendement : les trous d'un actif ne biaisent pas les autres paires
+    returns = returns.iloc[-int(EWMA_LOOKBACK_HALFLIVES * halflife):]
+    values = returns.to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    mask = valid.astype(float)
+    weights = 0.5 ** (np.arange(len(values))[::-1] / halflife)
+    weighted = filled * weights[:, None]
+    cross = weighted.T @ filled
+    overlap = (mask * weights[:, None]).T @ mask
+    squares = (weighted * filled).T @ mask  # [i, j] = somme des r_i² sur les dates communes à i et j
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = cross / overlap * periods
+        corr = cross / np.sqrt(squares * squares.T)
+    thin = (mask.T @ mask) < min_overlap
+    cov[thin] = np.nan
+    corr[thin] = np.nan
+    corr = np.clip(corr, -1.0, 1.0)
+    return (
+        pd.DataFrame(cov, index=returns.columns, columns=returns.columns),
+        pd.DataFrame(corr, index=returns.columns, columns=returns.columns),
+    )
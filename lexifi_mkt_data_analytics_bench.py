@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+from time import perf_counter
+from lexifi_mkt_data_analytics import rebase_panel, yearly_performance, annualized_vol, relative_slope_matrix, forward_spot_ratio
+from lexifi_mkt_data_pricer import PRICING_TENORS, PRICING_STRIKES, price_grid
+from math import erf, log, sqrt
+
+N_ASSETS = 500
+N_DAYS = 252 * 10
+N_TENORS = 30
+N_FORWARDS = 50
+N_PRICER_UNDERLYINGS = 5000
+N_PRICER_RUNS = 5
+START_YEAR = 2016
+SEED = 42
+
+# ----------------------- ANCIENNES BOUCLES (dashboard) -----------------------
+
+def loop_rebase(panel):
+    rebased_df = panel.copy()
+    excluded_series = []
+    for col in rebased_df.columns:
+        first_valid = rebased_df[col].first_valid_index()
+        if first_valid:
+            base_value = rebased_df.loc[first_valid, col]
+            rebased_df.loc[first_valid:, col] = (rebased_df[col] / base_value) * 100
+            rebased_df.loc[:first_valid, col] = 100
+        else:
+            excluded_series.append(col)
+    return rebased_df.drop(columns=excluded_series), excluded_series
+
+def loop_yearly_performance(panel, start_year):
+    years = list(range(start_year, panel.index.max().year + 1))
+    rows = {}
+    for col in panel.columns:
+        serie = panel[col].dropna()
+        perf_by_year = {}
+        for year in years:
+            try:
+                dec_31 = pd.Timestamp(f"{year-1}-12-31")
+                end_val = serie[serie.index.year == year].iloc[-1]
+                start_val = serie[serie.index <= dec_31].iloc[-1]
+                perf_by_year[f"Perf {year}"] = (end_val / start_val - 1) * 100
+            except IndexError:
+                perf_by_year[f"Perf {year}"] = np.nan
+        rows[col] = perf_by_year
+    return pd.DataFrame.from_dict(rows, orient="index")
+
+def loop_annualized_vol(panel):
+    return pd.Series({col: panel[col].dropna().pct_change().dropna().std() * np.sqrt(252) for col in panel.columns})
+
+def loop_slope_matrix(forward_series):
+    tenors = sorted(forward_series.index.tolist())
+    rel_matrix = pd.DataFrame(index=tenors, columns=tenors, dtype=float)
+    for i in tenors:
+        for j in tenors:
+            if forward_series[i] != 0:
+                rel_matrix.loc[i, j] = ((forward_series[j] / forward_series[i]) - 1) * 100
+            else:
+                rel_matrix.loc[i, j] = None
+    return rel_matrix
+
+def loop_forward_spot_ratio(fwd_df, spot_panel, base_ids):
+    spot_df_all = spot_panel.reset_index().melt(id_vars="date", var_name="id", value_name="spot").dropna(subset=["spot"])
+    merged = []
+    for fid, base_id in base_ids.items():
+        fwd_data = fwd_df[fwd_df["fid"] == fid][["date", "fwd"]]
+        spot_data = spot_df_all[spot_df_all["id"] == base_id][["date", "spot"]]
+        merged_df = pd.merge(fwd_data, spot_data, on="date", how="left").sort_values("date")
+        if merged_df.empty:
+            continue
+        merged_df["fwd_spot"] = (merged_df["fwd"] / merged_df["spot"]).ffill()
+        merged_df["id"] = fid
+        merged.append(merged_df)
+    return pd.concat(merged, ignore_index=True)
+
+# ----------------------- DONNÉES SYNTHÉTIQUES -----------------------
+
+def make_panel():
+    rng = np.random.default_rng(SEED)
+    dates = pd.bdate_range(f"{START_YEAR - 1}-06-01", periods=N_DAYS)
+    returns = rng.normal(0.0002, 0.01, size=(N_DAYS, N_ASSETS))
+    panel = pd.DataFrame(100 * np.exp(np.cumsum(returns, axis=0)), index=dates, columns=[f"ASSET_{i}" for i in range(N_ASSETS)])
+    # Débuts décalés et une série vide, comme dans le panel ffill du dashboard
+    starts = rng.integers(0, N_DAYS // 2, size=N_ASSETS)
+    mask = np.arange(N_DAYS)[:, None] < starts[None, :]
+    panel = panel.mask(mask)
+    panel.iloc[:, -1] = np.nan
+    return panel
+
+def make_forwards(panel):
+    # N_FORWARDS forwards sur les premiers actifs, une date sur deux pour tester le left join
+    rng = np.random.default_rng(SEED)
+    base_ids = {f"{panel.columns[i % 10]} FWD{i}": panel.columns[i % 10] for i in range(N_FORWARDS)}
+    dates = panel.index[::2]
+    fwd_df = pd.concat([
+        pd.DataFrame({"fid": fid, "date": dates, "fwd": panel[base_id].reindex(dates).to_numpy() * rng.uniform(0.9, 1.1)})
+        for fid, base_id in base_ids.items()
+    ], ignore_index=True).dropna()
+    return fwd_df, base_ids
+
+def scalar_black76_call(forward, strike, ttm, vol):
+    sigma_t = vol * sqrt(ttm)
+    d1 = log(forward / strike) / sigma_t + 0.5 * sigma_t
+    cdf = lambda x: 0.5 * (1.0 + erf(x / sqrt(2.0)))
+    return forward * cdf(d1) - strike * cdf(d1 - sigma_t)
+
+def bench_pricer():
+    rng = np.random.default_rng(SEED)
+    spot = rng.uniform(50, 500, N_PRICER_UNDERLYINGS)
+    forwards = spot[:, None] * np.exp(rng.normal(0.0, 0.02, (N_PRICER_UNDERLYINGS, 1)) * PRICING_TENORS)
+    vols = rng.uniform(10, 40, (N_PRICER_UNDERLYINGS, len(PRICING_TENORS), len(PRICING_STRIKES)))
+    n_points = vols.size
+    print(f"\n🔄 Pricer Black-76 : {n_points} points (calls, puts et greeks)")
+    start = perf_counter()
+    for _ in range(N_PRICER_RUNS):
+        result = price_grid(spot, forwards, vols, greeks=True)
+    elapsed = (perf_counter() - start) / N_PRICER_RUNS
+    print(f"   {'vectorisé':<12} {elapsed * 1000:>10.1f} ms  ({n_points / elapsed / 1e6:.1f} M points/s)")
+
+    i, t, k = 7, 4, 6
+    expected = scalar_black76_call(forwards[i, t] / spot[i], PRICING_STRIKES[k] / 100, PRICING_TENORS[t], vols[i, t, k] / 100) * 100
+    assert abs(result["call"][i, t, k] - expected) < 1e-9
+    print("   ✅ cohérent avec la formule scalaire")
+
+def timed(label, func, *args):
+    start = perf_counter()
+    result = func(*args)
+    elapsed = (perf_counter() - start) * 1000
+    print(f"   {label:<12} {elapsed:>10.1f} ms")
+    return result, elapsed
+
+def check_rebase(expected, result):
+    pd.testing.assert_frame_equal(expected[0], result[0], check_dtype=False)
+    assert expected[1] == result[1]
+
+def compare(title, loop_func, vec_func, loop_args, vec_args, check):
+    print(f"\n🔄 {title}")
+    expected, t_loop = timed("boucles", loop_func, *loop_args)
+    result, t_vec = timed("vectorisé", vec_func, *vec_args)
+    check(expected, result)
+    print(f"   ✅ résultats identiques, x{t_loop / max(t_vec, 1e-9):.0f}")
+
+def main():
+    panel = make_panel()
+    print(f"📏 Panel : {panel.shape[0]} dates x {panel.shape[1]} actifs")
+
+    compare(
+        "Rebasement à 100", loop_rebase, rebase_panel, (panel,), (panel,), check_rebase
+    )
+    compare(
+        "Perf annuelle", loop_yearly_performance, yearly_performance, (panel, START_YEAR), (panel, START_YEAR),
+        lambda e, r: pd.testing.assert_frame_equal(e, r.loc[e.index, e.columns], check_dtype=False)
+    )
+    compare(
+        "Vol annualisée", loop_annualized_vol, annualized_vol, (panel,), (panel,),
+        lambda e, r: pd.testing.assert_series_equal(e, r, check_names=False)
+    )
+
+    tenors = np.arange(1, N_TENORS + 1)
+    forward_series = pd.Series(100 * np.exp(0.01 * tenors), index=tenors)
+    compare(
+        "Matrice des pentes", loop_slope_matrix, relative_slope_matrix,
+        (forward_series,), (forward_series.to_numpy(), forward_series.index),
+        lambda e, r: pd.testing.assert_frame_equal(e, r, check_dtype=False)
+    )
+
+    fwd_df, base_ids = make_forwards(panel)
+    spot_panel = panel[list(dict.fromkeys(base_ids.values()))].rename_axis(index="date")
+    compare(
+        "Forward / spot", loop_forward_spot_ratio, forward_spot_ratio,
+        (fwd_df, spot_panel, base_ids), (fwd_df, spot_panel, base_ids, "fid", "date", "fwd"),
+        lambda e, r: pd.testing.assert_frame_equal(e[["id", "date", "fwd_spot"]], r[["id", "date", "fwd_spot"]], check_dtype=False)
+    )
+
+    bench_pricer()
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,20 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.express as px
-import plotly.graph_objects as go
-from io import BytesIO
-from sqlalchemy import create_engine
 import base64
+from time import perf_counter
+from lexifi_mkt_data_dashboard_db import (
+    fetch_spot_bounds, fetch_spot_panel, fetch_spot_stats, fetch_asset_mapping, fetch_spot_at_date,
+    fetch_forward_bounds, fetch_forward_history, fetch_forward_dates, fetch_forward_term, snap_date,
+    fetch_vol_date_range, fetch_vol_history_agg, vol_history_step, VOL_STEP_LABELS, fetch_vol_dates, fetch_vol_surface,
+    render_query_timings, sync_data_versions, get_search_index, asset_picker, render_export,
+    fetch_ewma_correlation, fetch_realized_vols, fetch_vol_spread_screen, fetch_asof_snapshot
+)
+from lexifi_mkt_data_db_vol_spread import SPREAD_TENORS
+from lexifi_mkt_data_snapshot import SNAPSHOT_TABLES
+from lexifi_mkt_data_search import base_id_map
+from lexifi_mkt_data_analytics import rebase_panel, panel_stats, relative_slope_matrix, forward_spot_ratio, REALIZED_VOL_WINDOWS, EWMA_HALFLIFE
+from lexifi_mkt_data_downsampling import DEFAULT_CHART_WIDTH_PX, target_points, downsample_long
 
 # ----------------------- CONFIG BDD -----------------------
 DB_USER = "postgres"
@@ -33,47 +43,6 @@ VOL_BASE_ID = "lexifi_id"
 
 # ----------------------- FONCTIONS -----------------------
 
-def get_engine():
-    engine_str = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-    return create_engine(engine_str)
-
-@st.cache_data
-def connect_and_fetch_ids():
-    engine = get_engine()
-    df = pd.read_sql(f"SELECT DISTINCT {ID_COL} FROM {TABLE_NAME}", con=engine)
-    return df[ID_COL].dropna().astype(str).tolist()
-
-@st.cache_data
-def fetch_data_for_id(selected_id):
-    engine = get_engine()
-    query = f"""
-        SELECT {DATE_COL}, {VALUE_COL}
-        FROM {TABLE_NAME}
-        WHERE {ID_COL} = %s
-        ORDER BY {DATE_COL}
-    """
-    df = pd.read_sql(query, con=engine, params=(selected_id,))
-    df[DATE_COL] = pd.to_datetime(df[DATE_COL])
-    df["id"] = selected_id
-    return df
-
-@st.cache_data
-def fetch_asset_mapping():
-    engine = get_engine()
-    df = pd.read_sql("SELECT lexifi_id, asset_name FROM asset_mapping", con=engine)
-    df['asset_name'] = df['asset_name'].astype(str).apply(lambda x: x.encode('utf-8', errors='replace').decode('utf-8'))
-    return dict(zip(df["lexifi_id"], df["asset_name"]))
-
-@st.cache_data
-def fetch_forward_ids():
-    engine = get_engine()
-    df = pd.read_sql(f"""
-        SELECT DISTINCT {FORWARD_ID}, {FORWARD_BASE_ID}
-        FROM {FORWARD_TABLE}
-        WHERE {FORWARD_ID} IS NOT NULL AND {FORWARD_VALUE} IS NOT NULL
-    """, con=engine)
-    return df
-
 # ----------------------- PAGE CONFIG -----------------------
 st.set_page_config(
     page_title="Arkea Asset Management",
@@ -84,33 +53,33 @@ st.set_page_config(
 st.title("🔍 Market Data Overwatch 🔍")
 st.caption("Source: LexiFi")
 
+# Caches des tables réingérées depuis la dernière exécution invalidés (data_version / NOTIFY)
+sync_data_versions()
+
 asset_name_map = fetch_asset_mapping()
-id_list = connect_and_fetch_ids()
-display_list = [f"{id_} - {asset_name_map.get(id_, 'Inconnu')}" for id_ in id_list]
-id_display_map = dict(zip(display_list, id_list))
 
-tab_labels = ["📈 Spot", "📈 Forward", "📈 Volatility"]
-tabs = st.tabs(tab_labels)
+# Résolution des courbes : ~2 points par pixel sur la fenêtre de dates affichée, exports et stats restent complets
+chart_width = st.sidebar.slider("🖥️ Largeur des graphiques (px)", 600, 3000, DEFAULT_CHART_WIDTH_PX, step=100)
+full_resolution = st.sidebar.checkbox("Afficher tous les points (sans échantillonnage)", value=False)
+chart_points = None if full_resolution else target_points(chart_width)
+
+tab_labels = ["📈 Spot", "📈 Forward", "📈 Volatility", "🔗 Corrélations", "💶 Pricer"]
+# Une seule vue exécutée par rerun (st.tabs exécute tous les onglets à chaque interaction)
+active_view = st.radio("Vue", tab_labels, horizontal=True, key="active_view", label_visibility="collapsed")
 
 # ----------------------- ONGLET SPOT -----------------------
-with tabs[0]:
-    selected_display = st.multiselect("Sélectionner un ou plusieurs IDs :", display_list)
-    selected_ids = [id_display_map[label] for label in selected_display]
+if active_view == tab_labels[0]:
+    selected_ids = asset_picker(get_search_index("spot", TABLE_NAME), "spot_picker")
 
     if selected_ids:
-        all_data = [fetch_data_for_id(i) for i in selected_ids]
-        combined_df = pd.concat(all_data)
-        combined_df = combined_df.pivot(index=DATE_COL, columns="id", values=VALUE_COL)
-        combined_df = combined_df.sort_index().ffill()
-
-        full_min_date = combined_df.index.min().date()
-        full_max_date = combined_df.index.max().date()
+        bounds_df = fetch_spot_bounds(tuple(selected_ids))
+        if bounds_df.empty:
+            st.warning("⚠️ Aucune donnée spot pour les IDs sélectionnés.")
+            st.stop()
 
-        common_min_date = pd.to_datetime("today")
-        for col in combined_df.columns:
-            first_valid = combined_df[col].first_valid_index()
-            if first_valid is not None and first_valid < common_min_date:
-                common_min_date = first_valid
+        full_min_date = bounds_df["min_date"].min().date()
+        full_max_date = bounds_df["max_date"].max().date()
+        common_min_date = bounds_df["min_date"].min()
 
         if "start_date" not in st.session_state or st.session_state.get("last_ids") != selected_ids:
             st.session_state.start_date = common_min_date.date()
@@ -125,6 +94,9 @@ with tabs[0]:
         )
         st.session_state.start_date = start_date
 
+        # Fenêtre poussée en SQL ; la dernière valeur avant start_date est incluse pour le ffill
+        combined_df = fetch_spot_panel(selected_ids, start_date)
+        combined_df = combined_df.sort_index().ffill()
         filtered_df = combined_df[combined_df.index >= pd.to_datetime(start_date)]
 
         if filtered_df.dropna(how='all').empty:
@@ -132,21 +104,10 @@ with tabs[0]:
         else:
             try:
                 if len(selected_ids) > 1:
-                    rebased_df = filtered_df.copy()
-                    excluded_series = []
-
-                    for col in rebased_df.columns:
-                        first_valid = rebased_df[col].first_valid_index()
-                        if first_valid:
-                            base_value = rebased_df.loc[first_valid, col]
-                            rebased_df.loc[first_valid:, col] = (rebased_df[col] / base_value) * 100
-                            rebased_df.loc[:first_valid, col] = 100
-                        else:
-                            excluded_series.append(col)
+                    rebased_df, excluded_series = rebase_panel(filtered_df)
 
                     if excluded_series:
                         st.info(f"Séries exclues : {', '.join(excluded_series)}")
-                        rebased_df.drop(columns=excluded_series, inplace=True)
 
                     plot_df = rebased_df.reset_index().melt(id_vars=DATE_COL, var_name="lexifi_id", value_name="Valeur")
                 else:
@@ -156,7 +117,7 @@ with tabs[0]:
                 chart_title = f"Séries rebasées à 100 à partir du {start_date}" if len(selected_ids) > 1 else f"Évolution historique de l'actif : {plot_df['Asset'].iloc[0]}"
 
                 fig = px.line(
-                    plot_df,
+                    downsample_long(plot_df, DATE_COL, "Valeur", "Asset", chart_points),
                     x=DATE_COL,
                     y="Valeur",
                     color="Asset",
@@ -165,56 +126,17 @@ with tabs[0]:
                 fig.update_layout(height=800, xaxis_title="Date", yaxis_title="Valeur", hovermode="x unified")
                 st.plotly_chart(fig, use_container_width=True)
 
-                raw_plot_df = filtered_df.reset_index().melt(id_vars=DATE_COL, var_name="ID", value_name="Valeur")
-                csv_buffer = BytesIO()
-                raw_plot_df.to_csv(csv_buffer, index=False)
-                st.download_button("📁 Télécharger les données affichées", data=csv_buffer.getvalue(), file_name="donnees.csv", mime="text/csv")
+                render_export("spot", {"ids": list(filtered_df.columns), "start_date": start_date}, "spot_export", "spot")
 
                 st.subheader("📊 Statistiques")
 
-                stats_summary = []
-                last_date = filtered_df.index.max()
-                start_year = pd.to_datetime(start_date).year
-                years = list(range(start_year, last_date.year + 1))
-
-                for col in filtered_df.columns:
-                    serie = filtered_df[col].dropna()
-                    if serie.empty:
-                        continue
-
-                    val_current = serie.iloc[-1]
-                    val_min = serie.min()
-                    val_max = serie.max()
-                    returns = serie.pct_change().dropna()
-                    vol_annuelle = returns.std() * np.sqrt(252)
-
-                    perf_by_year = {}
-                    for year in years:
-                        try:
-                            dec_31 = pd.Timestamp(f"{year-1}-12-31")
-                            end_val = serie[serie.index.year == year].iloc[-1]
-                            start_val = serie[serie.index <= dec_31].iloc[-1]
-                            perf_by_year[f"Perf {year}"] = (end_val / start_val - 1) * 100
-                        except:
-                            perf_by_year[f"Perf {year}"] = None
-
-                    try:
-                        ytd_start_val = serie[serie.index <= pd.Timestamp(f"{last_date.year - 1}-12-31")].iloc[-1]
-                        perf_ytd = (val_current / ytd_start_val - 1) * 100
-                    except:
-                        perf_ytd = None
-
-                    stats_summary.append({
-                        "Actif": asset_name_map.get(col, col),
-                        "Valeur actuelle": val_current,
-                        "Min": val_min,
-                        "Max": val_max,
-                        "Perf YTD": perf_ytd,
-                        "Volatilité réalisée (%)": vol_annuelle * 100,
-                        **perf_by_year
-                    })
-
-                stats_table = pd.DataFrame(stats_summary)
+                # Lecture unique de asset_spot_yearly / asset_spot_stats, alimentées par lexifi_mkt_data_db_updater
+                stats_table = fetch_spot_stats(tuple(filtered_df.columns), start_date)
+                if stats_table.empty:
+                    # Tables de stats pas encore alimentées : calcul vectorisé sur le panel affiché
+                    stats_table = panel_stats(filtered_df, pd.to_datetime(start_date).year)
+                stats_table.insert(0, "Actif", [asset_name_map.get(i, i) for i in stats_table.index])
+                stats_table = stats_table.reset_index(drop=True)
 
                 def format_number(x):
                     try:
@@ -229,7 +151,7 @@ with tabs[0]:
                         return "-"
 
                 for col in stats_table.columns:
-                    if col.startswith("Perf") or col in ["Valeur actuelle", "Min", "Max", "Volatilité réalisée (%)"]:
+                    if col.startswith("Perf") or col.startswith("Vol ") or col in ["Valeur actuelle", "Min", "Max", "Volatilité réalisée (%)"]:
                         stats_table[col] = pd.to_numeric(stats_table[col], errors='coerce')
 
                 perf_cols = [col for col in stats_table.columns if "Perf" in col]
@@ -239,7 +161,10 @@ with tabs[0]:
                     "Valeur actuelle": format_number,
                     "Min": format_number,
                     "Max": format_number,
-                    "Volatilité réalisée (%)": format_percent
+                    "Volatilité réalisée (%)": format_percent,
+                    "Vol 1M (%)": format_percent,
+                    "Vol 3M (%)": format_percent,
+                    "Vol 1Y (%)": format_percent
                 })
 
                 styled = stats_table.style.format(format_dict)
@@ -262,67 +187,40 @@ with tabs[0]:
                 st.error(f"Erreur : {e}")
 
 # ----------------------- ONGLET FORWARD -----------------------
-with tabs[1]:
-    forward_ids_df = fetch_forward_ids()
-    forward_ids_df["asset_name"] = forward_ids_df[FORWARD_BASE_ID].map(asset_name_map)
-    forward_ids_df["display"] = forward_ids_df[FORWARD_ID] + " - " + forward_ids_df["asset_name"].fillna("Inconnu")
-    forward_display_map = dict(zip(forward_ids_df["display"], forward_ids_df[FORWARD_ID]))
-    forward_baseid_map = dict(zip(forward_ids_df[FORWARD_ID], forward_ids_df[FORWARD_BASE_ID]))
-
-    selected_display = st.multiselect("Sélectionner un ou plusieurs IDs :", forward_display_map.keys())
-    selected_forward_ids = [forward_display_map[d] for d in selected_display]
+if active_view == tab_labels[1]:
+    forward_index = get_search_index("forward", FORWARD_TABLE)
+    selected_forward_ids = asset_picker(forward_index, "forward_picker")
+    forward_baseid_map = base_id_map(forward_index, selected_forward_ids)
     selected_base_ids = list(set(forward_baseid_map[fid] for fid in selected_forward_ids))
 
     if selected_forward_ids:
-        engine = get_engine()
-
-        forward_id_tuple = tuple(selected_forward_ids)
-        if len(forward_id_tuple) == 1:
-            forward_id_tuple += ("",)
+        min_date, max_date = fetch_forward_bounds(FORWARD_TABLE, tuple(selected_forward_ids))
 
-        fwd_query = f"""
-            SELECT {FORWARD_ID}, {FORWARD_DATE}, {FORWARD_VALUE}, {FORWARD_BASE_ID}
-            FROM {FORWARD_TABLE}
-            WHERE {FORWARD_ID} IN %s
-        """
-        fwd_df = pd.read_sql(fwd_query, con=engine, params=(forward_id_tuple,))
-        fwd_df[FORWARD_DATE] = pd.to_datetime(fwd_df[FORWARD_DATE])
-
-        if fwd_df.empty:
+        if pd.isna(min_date):
             st.warning("⚠️ Aucune donnée forward trouvée.")
             st.stop()
 
-        spot_df_all = pd.concat([fetch_data_for_id(i) for i in selected_base_ids])
+        start_date_fwd = st.date_input("Choisir une date de départ pour l’affichage :", value=min_date.date(), min_value=min_date.date(), max_value=max_date.date(), key="start_date_forward")
 
-        merged = []
-        for fid in selected_forward_ids:
-            base_id = forward_baseid_map[fid]
-            fwd_data = fwd_df[fwd_df[FORWARD_ID] == fid][[FORWARD_DATE, FORWARD_VALUE]].rename(columns={FORWARD_DATE: 'date', FORWARD_VALUE: 'fwd'})
-            spot_data = spot_df_all[spot_df_all["id"] == base_id][[DATE_COL, VALUE_COL]].rename(columns={DATE_COL: 'date', VALUE_COL: 'spot'})
+        fwd_df = fetch_forward_history(FORWARD_TABLE, selected_forward_ids, start_date_fwd)
 
-            merged_df = pd.merge(fwd_data, spot_data, on='date', how='left').sort_values('date')
-            if merged_df.empty:
-                continue
+        if fwd_df.empty:
+            st.warning("⚠️ Aucune donnée forward trouvée.")
+            st.stop()
 
-            merged_df['fwd_spot'] = merged_df['fwd'] / merged_df['spot']
-            merged_df['fwd_spot'] = merged_df['fwd_spot'].ffill()
-            asset_name = asset_name_map.get(base_id, base_id)
-            merged_df['Asset'] = f"{fid} - {asset_name}"
-            merged.append(merged_df)
+        spot_panel = fetch_spot_panel(selected_base_ids, start_date_fwd)
 
-        if not merged:
+        # Jointure forward / spot sur (sous-jacent, date) en une passe pour tous les forwards sélectionnés
+        ratio_df = forward_spot_ratio(fwd_df, spot_panel, forward_baseid_map, FORWARD_ID, FORWARD_DATE, FORWARD_VALUE)
+        if ratio_df.empty:
             st.warning("⚠️ Aucune donnée mergeable Spot/Forward pour les actifs sélectionnés.")
             st.stop()
+        ratio_df["Asset"] = ratio_df["id"] + " - " + ratio_df["base_id"].map(lambda base_id: asset_name_map.get(base_id, base_id))
 
-        ratio_df = pd.concat(merged)
-        min_date = ratio_df['date'].min().date()
-        max_date = ratio_df['date'].max().date()
-
-        start_date_fwd = st.date_input("Choisir une date de départ pour l’affichage :", value=min_date, min_value=min_date, max_value=max_date, key="start_date_forward")
         plot_df = ratio_df[ratio_df['date'] >= pd.to_datetime(start_date_fwd)]
 
         fig = px.line(
-            plot_df,
+            downsample_long(plot_df, "date", "fwd_spot", "Asset", chart_points),
             x="date",
             y="fwd_spot",
             color="Asset",
@@ -336,214 +234,176 @@ with tabs[1]:
         )
         fig.update_yaxes(tickformat=".2%")
         st.plotly_chart(fig, use_container_width=True)
+        render_export("forward", {"ids": selected_forward_ids, "start_date": start_date_fwd}, "forward_export", "forward", forward_table=FORWARD_TABLE)
 
-    # ----- STRUCTURE PAR TERME -----
-    st.markdown("---")
-    st.subheader("📉 Structure par terme")
-
-    if selected_forward_ids:
-        default_asset_id = forward_baseid_map[selected_forward_ids[0]]
-
-        engine = get_engine()
-        date_query = f"""
-            SELECT DISTINCT {FORWARD_DATE}
-            FROM {FORWARD_TABLE}
-            WHERE {FORWARD_BASE_ID} = %s
-            ORDER BY {FORWARD_DATE} DESC
-        """
-        date_df = pd.read_sql(date_query, con=engine, params=(default_asset_id,))
-        date_df[FORWARD_DATE] = pd.to_datetime(date_df[FORWARD_DATE])
-
-        if date_df.empty:
-            st.warning("⚠️ Aucune date disponible pour cet actif.")
-            st.stop()
-
-        selected_term_date = st.date_input(
-            "Date d'observation :",
-            value=date_df[FORWARD_DATE].max().date(),
-            min_value=date_df[FORWARD_DATE].min().date(),
-            max_value=date_df[FORWARD_DATE].max().date(),
-            key="structure_term_date"
-        )
-
-        fwd_term_query = f"""
-            SELECT {FORWARD_ID}, {FORWARD_VALUE}
-            FROM {FORWARD_TABLE}
-            WHERE {FORWARD_BASE_ID} = %s AND {FORWARD_DATE} = %s
-        """
-        term_df = pd.read_sql(fwd_term_query, con=engine, params=(default_asset_id, selected_term_date))
-        if term_df.empty:
-            st.warning("⚠️ Aucune donnée forward à cette date pour cet actif.")
-            st.stop()
+    # Fragment : changer la date d'observation ne relance que la structure par terme et la matrice des pentes
+    @st.fragment
+    def render_term_structure(selected_forward_ids):
+        # ----- STRUCTURE PAR TERME -----
+        st.markdown("---")
+        st.subheader("📉 Structure par terme")
 
-        def extract_years(tenor_str):
-            try:
-                t = tenor_str.split()[1]
-                return int(t.replace("Y", "")) if "Y" in t else None
-            except:
-                return None
-
-        term_df["Tenor"] = term_df[FORWARD_ID].apply(lambda x: x.split()[1] if len(x.split()) > 1 and "Y" in x.split()[1] else None)
-        term_df["Tenor_num"] = term_df["Tenor"].apply(lambda x: int(x.replace("Y", "")) if x else None)
-        term_df = term_df.dropna(subset=["Tenor_num"])
-        term_df = term_df.sort_values("Tenor_num")
-
-        spot_query = f"""
-            SELECT {VALUE_COL}
-            FROM {TABLE_NAME}
-            WHERE {ID_COL} = %s AND {DATE_COL} = %s
-            LIMIT 1
-        """
-        spot_result = pd.read_sql(spot_query, con=engine, params=(default_asset_id, selected_term_date))
-
-        if not spot_result.empty:
-            spot_value = spot_result.iloc[0][VALUE_COL]
-            st.markdown(f"📌 **Prix spot au {selected_term_date} : {f'{spot_value:,.2f}'.replace(',', ' ')}**")
-        else:
-            st.warning(f"Aucun prix spot trouvé au {selected_term_date} pour l'actif sélectionné.")
+        if selected_forward_ids:
+            default_asset_id = forward_baseid_map[selected_forward_ids[0]]
 
-        fig_term = px.line(
-            term_df,
-            x="Tenor",
-            y=FORWARD_VALUE,
-            title=f"Structure par terme • {asset_name_map.get(default_asset_id, default_asset_id)} • {selected_term_date}"
-        )
-        fig_term.update_layout(
-            height=500,
-            xaxis_title="Échéance",
-            yaxis_title="Forward"
-        )
-        fig_term.update_yaxes(tickformat=".2f")
-        st.plotly_chart(fig_term, use_container_width=True)
+            date_df = fetch_forward_dates(FORWARD_TABLE, default_asset_id)
 
-    else:
-        st.info("Veuillez d'abord sélectionner un ou plusieurs forwards au-dessus pour activer la structure par terme.")
+            if date_df.empty:
+                st.warning("⚠️ Aucune date disponible pour cet actif.")
+                return
 
-    # ----- PENTES RELATIVES -----
-    try:
-        forward_series = term_df.set_index("Tenor_num")[FORWARD_VALUE]
+            selected_term_date = st.date_input(
+                "Date d'observation :",
+                value=date_df[FORWARD_DATE].max().date(),
+                min_value=date_df[FORWARD_DATE].min().date(),
+                max_value=date_df[FORWARD_DATE].max().date(),
+                key="structure_term_date"
+            )
+            snapped_term_date = snap_date(date_df[FORWARD_DATE], selected_term_date)
+            if snapped_term_date != selected_term_date:
+                st.caption(f"↪ Pas d'observation au {selected_term_date} : date utilisée {snapped_term_date}")
+                selected_term_date = snapped_term_date
+
+            term_df = fetch_forward_term(FORWARD_TABLE, default_asset_id, selected_term_date)
+            if term_df.empty:
+                st.warning("⚠️ Aucune donnée forward à cette date pour cet actif.")
+                return
+
+            def extract_years(tenor_str):
+                try:
+                    t = tenor_str.split()[1]
+                    return int(t.replace("Y", "")) if "Y" in t else None
+                except:
+                    return None
+
+            term_df["Tenor"] = term_df[FORWARD_ID].apply(lambda x: x.split()[1] if len(x.split()) > 1 and "Y" in x.split()[1] else None)
+            term_df["Tenor_num"] = term_df["Tenor"].apply(lambda x: int(x.replace("Y", "")) if x else None)
+            term_df = term_df.dropna(subset=["Tenor_num"])
+            term_df = term_df.sort_values("Tenor_num")
+
+            spot_value = fetch_spot_at_date(default_asset_id, selected_term_date)
+
+            if spot_value is not None:
+                st.markdown(f"📌 **Prix spot au {selected_term_date} : {f'{spot_value:,.2f}'.replace(',', ' ')}**")
+            else:
+                st.warning(f"Aucun prix spot trouvé au {selected_term_date} pour l'actif sélectionné.")
+
+            fig_term = px.line(
+                term_df,
+                x="Tenor",
+                y=FORWARD_VALUE,
+                title=f"Structure par terme • {asset_name_map.get(default_asset_id, default_asset_id)} • {selected_term_date}"
+            )
+            fig_term.update_layout(
+                height=500,
+                xaxis_title="Échéance",
+                yaxis_title="Forward"
+            )
+            fig_term.update_yaxes(tickformat=".2f")
+            st.plotly_chart(fig_term, use_container_width=True)
 
-        tenors = sorted(forward_series.index.tolist())
-        rel_matrix = pd.DataFrame(index=tenors, columns=tenors, dtype=float)
+        else:
+            st.info("Veuillez d'abord sélectionner un ou plusieurs forwards au-dessus pour activer la structure par terme.")
+            return
+
+        # ----- PENTES RELATIVES -----
+        try:
+            forward_series = term_df.set_index("Tenor_num")[FORWARD_VALUE]
+
+            forward_series = forward_series.sort_index()
+            rel_matrix = relative_slope_matrix(forward_series.to_numpy(), forward_series.index)
+
+            rel_matrix.index = [f"{i}Y" for i in rel_matrix.index]
+            rel_matrix.columns = [f"{j}Y" for j in rel_matrix.columns]
+
+            import plotly.figure_factory as ff
+
+            z = rel_matrix.values
+            x = rel_matrix.columns.tolist()
+            y = rel_matrix.index.tolist()
+
+            fig_rel_heatmap = ff.create_annotated_heatmap(
+                z,
+                x=x,
+                y=y,
+                colorscale="RdBu",
+                showscale=True,
+                reversescale=True,
+                zmin=-np.nanmax(np.abs(z)),
+                zmax=np.nanmax(np.abs(z)),
+                annotation_text=[[f"{v:.2f}%" if pd.notna(v) else "" for v in row] for row in z],
+                hoverinfo="z"
+            )
 
-        for i in tenors:
-            for j in tenors:
-                if forward_series[i] != 0:
-                    rel_matrix.loc[i, j] = ((forward_series[j] / forward_series[i]) - 1) * 100
-                else:
-                    rel_matrix.loc[i, j] = None
-
-        rel_matrix.index = [f"{i}Y" for i in rel_matrix.index]
-        rel_matrix.columns = [f"{j}Y" for j in rel_matrix.columns]
-
-        import plotly.figure_factory as ff
-
-        z = rel_matrix.values
-        x = rel_matrix.columns.tolist()
-        y = rel_matrix.index.tolist()
-
-        fig_rel_heatmap = ff.create_annotated_heatmap(
-            z,
-            x=x,
-            y=y,
-            colorscale="RdBu",
-            showscale=True,
-            reversescale=True,
-            zmin=-np.nanmax(np.abs(z)),
-            zmax=np.nanmax(np.abs(z)),
-            annotation_text=[[f"{v:.2f}%" if pd.notna(v) else "" for v in row] for row in z],
-            hoverinfo="z"
-        )
+            fig_rel_heatmap.update_layout(
+                title=f"Matrice des pentes relatives • Fwd(j) / Fwd(i) - 1 • {asset_name_map.get(default_asset_id, default_asset_id)}",
+                xaxis_title="Tenor(j)",
+                yaxis_title="Tenor(i)",
+                height=600,
+                margin=dict(l=60, r=60, t=80, b=40)
+            )
 
-        fig_rel_heatmap.update_layout(
-            title=f"Matrice des pentes relatives • Fwd(j) / Fwd(i) - 1 • {asset_name_map.get(default_asset_id, default_asset_id)}",
-            xaxis_title="Tenor(j)",
-            yaxis_title="Tenor(i)",
-            height=600,
-            margin=dict(l=60, r=60, t=80, b=40)
-        )
+            st.plotly_chart(fig_rel_heatmap, use_container_width=True)
 
-        st.plotly_chart(fig_rel_heatmap, use_container_width=True)
+        except Exception as e:
+            st.warning(f"Erreur lors de la génération de la matrice des pentes relatives : {e}")
 
-    except Exception as e:
-        st.warning(f"Erreur lors de la génération de la matrice des pentes relatives : {e}")
+    render_term_structure(selected_forward_ids)
 
 # ----------------------- ONGLET VOLATILITY -----------------------
-with tabs[2]:
-    engine = get_engine()
-
-    @st.cache_data
-    def get_vol_id_mapping():
-        df = pd.read_sql(f"SELECT DISTINCT {VOL_ID_COL}, {VOL_BASE_ID} FROM {VOL_TABLE}", con=engine)
-        df["asset_name"] = df[VOL_BASE_ID].map(asset_name_map)
-        df["display"] = df[VOL_ID_COL] + " - " + df["asset_name"].fillna("Inconnu")
-        return df
+if active_view == tab_labels[2]:
+    vol_index = get_search_index("vol", VOL_TABLE)
+    selected_vol_ids = asset_picker(vol_index, "vol_picker")
+    vol_baseid_map = base_id_map(vol_index, selected_vol_ids)
 
-    vol_df = get_vol_id_mapping()
-    vol_display_map = dict(zip(vol_df["display"], vol_df[VOL_ID_COL]))
-    vol_baseid_map = dict(zip(vol_df[VOL_ID_COL], vol_df[VOL_BASE_ID]))
+    # ---- Screener implicite ATM - réalisée sur tous les sous-jacents, précalculé par lexifi_mkt_data_db_vol_spread
+    with st.expander("📊 Vol implicite ATM - vol réalisée (tous les sous-jacents)"):
+        col1, col2 = st.columns(2)
+        with col1:
+            spread_tenor = st.selectbox("📏 Tenor (Y)", SPREAD_TENORS, index=0, key="spread_tenor")
+        with col2:
+            spread_date = st.date_input("📅 Date :", value=pd.Timestamp.today().date(), key="spread_date")
 
-    selected_display = st.multiselect("Sélectionner un ou plusieurs IDs :", vol_display_map.keys())
-    selected_vol_ids = [vol_display_map[d] for d in selected_display]
+        screen = fetch_vol_spread_screen(spread_tenor, spread_date)
+        if screen.empty:
+            st.info("Aucun spread calculé pour ce tenor à cette date.")
+        else:
+            st.caption(f"Spreads au {screen[VOL_DATE_COL].iloc[0].date()} : vol implicite 100% - vol réalisée sur {spread_tenor} an(s), en points de vol")
+            screen.insert(1, "Actif", screen[VOL_BASE_ID].map(asset_name_map).fillna("Inconnu"))
+            screen = screen.drop(columns=[VOL_DATE_COL]).rename(columns={"implied_vol": "Vol implicite (%)", "realized_vol": "Vol réalisée (%)", "spread": "Spread"})
+            st.dataframe(
+                screen.style.format({"Vol implicite (%)": "{:.2f}", "Vol réalisée (%)": "{:.2f}", "Spread": "{:+.2f}"}, na_rep="-"),
+                use_container_width=True,
+                hide_index=True
+            )
 
     if selected_vol_ids:
         selected_base_ids = list(set(vol_baseid_map[v] for v in selected_vol_ids))
         default_base_id = vol_baseid_map[selected_vol_ids[0]]
 
-        @st.cache_data
-        def get_date_range(base_ids):
-            query = f"""
-                SELECT MIN({VOL_DATE_COL}) AS min_date, MAX({VOL_DATE_COL}) AS max_date
-                FROM {VOL_TABLE}
-                WHERE {VOL_ID_COL} IN %s
-            """
-            ids = tuple(selected_vol_ids) if len(selected_vol_ids) > 1 else (selected_vol_ids[0], "")
-            df = pd.read_sql(query, con=engine, params=(ids,))
-            return pd.to_datetime(df.iloc[0]["min_date"]), pd.to_datetime(df.iloc[0]["max_date"])
-
-        min_date, max_date = get_date_range(selected_base_ids)
+        min_date, max_date = fetch_vol_date_range(tuple(selected_vol_ids))
         start_date = st.date_input("📅 Date de départ :", value=min_date.date(), min_value=min_date.date(), max_value=max_date.date(), key="vol_start")
 
-        @st.cache_data
-        def load_filtered_vol(base_ids, start_dt):
-            ids = tuple(selected_vol_ids) if len(selected_vol_ids) > 1 else (selected_vol_ids[0], "")
-            query = f"""
-                SELECT {VOL_ID_COL}, {VOL_DATE_COL}, {VOL_VALUE_COL}, {VOL_BASE_ID}
-                FROM {VOL_TABLE}
-                WHERE {VOL_ID_COL} IN %s AND {VOL_DATE_COL} >= %s
-            """
-            df = pd.read_sql(query, con=engine, params=(ids, start_dt))
-            df[VOL_DATE_COL] = pd.to_datetime(df[VOL_DATE_COL])
-            df["Asset"] = df[VOL_ID_COL] + " - " + df[VOL_BASE_ID].map(asset_name_map).fillna("Inconnu")
-            return df
-
-        vol_data = load_filtered_vol(selected_base_ids, start_date)
-
-        if vol_data.empty:
-            st.warning("⚠️ Aucune donnée disponible.")
-            st.stop()
+        # Moyennes hebdo / mensuelles calculées en base sur les longs historiques, séries trop courtes filtrées dans la requête
+        vol_step = "day" if full_resolution else vol_history_step(start_date, max_date)
+        filtered_df = fetch_vol_history_agg(tuple(selected_vol_ids), start_date, vol_step)
 
         # ---- Graph évolution historique
         st.subheader("📈 Volatilité implicite - Historique")
 
-        # Vérifier les données valides
-        valid_plot_df = vol_data[vol_data[VOL_VALUE_COL].notna()].copy()
-        valid_plot_df["Asset"] = valid_plot_df[VOL_ID_COL] + " - " + valid_plot_df[VOL_BASE_ID].map(asset_name_map).fillna("Inconnu")
-
-        # Ne garde que les séries avec plus de 3 points valides pour éviter les gribouillis
-        plot_counts = valid_plot_df.groupby("Asset")[VOL_DATE_COL].count()
-        valid_assets = plot_counts[plot_counts > 3].index.tolist()
-        filtered_df = valid_plot_df[valid_plot_df["Asset"].isin(valid_assets)]
+        # Libellés résolus une fois par série puis joints sur l'id
+        vol_labels = {vid: f"{vid} - {asset_name_map.get(vol_baseid_map[vid], 'Inconnu')}" for vid in selected_vol_ids}
+        filtered_df["Asset"] = filtered_df[VOL_ID_COL].map(vol_labels)
 
         if filtered_df.empty:
             st.warning("⚠️ Aucune série avec suffisamment de données pour affichage.")
         else:
             fig_hist = px.line(
-                filtered_df,
+                downsample_long(filtered_df, VOL_DATE_COL, VOL_VALUE_COL, "Asset", chart_points),
                 x=VOL_DATE_COL,
                 y=VOL_VALUE_COL,
                 color="Asset",
-                title="Évolution historique des volatilités implicites",
+                title=f"Évolution historique des volatilités implicites ({VOL_STEP_LABELS[vol_step]})",
             )
             fig_hist.update_layout(
                 height=600,
@@ -552,44 +412,30 @@ with tabs[2]:
                 hovermode="x unified"
             )
             st.plotly_chart(fig_hist, use_container_width=True)
+            render_export("vol", {"ids": selected_vol_ids, "start_date": start_date}, "vol_export", "volatility")
 
-        @st.cache_data
-        def get_term_data_for_date(base_id, date):
-            query = f"""
-                SELECT {VOL_ID_COL}, {VOL_VALUE_COL}
-                FROM {VOL_TABLE}
-                WHERE {VOL_BASE_ID} = %s AND {VOL_DATE_COL} = %s
-            """
-            df = pd.read_sql(query, con=engine, params=(base_id, date))
-            df["Tenor"] = df[VOL_ID_COL].apply(lambda x: int(x.split()[1].replace("Y", "")) if len(x.split()) > 2 else None)
-            df["Strike"] = df[VOL_ID_COL].apply(lambda x: int(x.split()[2].replace("%", "")) if len(x.split()) > 2 else None)
-            df.dropna(subset=["Tenor", "Strike"], inplace=True)
-            return df
-
-        @st.cache_data
-        def get_available_dates(base_id):
-            query = f"SELECT DISTINCT {VOL_DATE_COL} FROM {VOL_TABLE} WHERE {VOL_BASE_ID} = %s ORDER BY {VOL_DATE_COL} DESC"
-            df = pd.read_sql(query, con=engine, params=(base_id,))
-            df[VOL_DATE_COL] = pd.to_datetime(df[VOL_DATE_COL])
-            return df[VOL_DATE_COL].dt.date.tolist()
-
-        available_dates = get_available_dates(default_base_id)
+        available_dates = fetch_vol_dates(default_base_id)
         selected_obs_date = st.selectbox("📅 Date d'observation", available_dates, index=0)
 
-        term_df = get_term_data_for_date(default_base_id, selected_obs_date)
+        surface_source = st.radio("Surface", ["Points cotés", "Grille normalisée"], horizontal=True, key="vol_surface_source")
+        surface = fetch_vol_surface(default_base_id, selected_obs_date, surface_source == "Grille normalisée")
+        if surface is None and surface_source == "Grille normalisée":
+            st.info("Pas de surface normalisée pour cette date : affichage des points cotés.")
+            surface = fetch_vol_surface(default_base_id, selected_obs_date)
 
-        if term_df.empty:
+        if surface is None:
             st.warning("Aucune donnée pour cette date.")
             st.stop()
 
-        available_strikes = sorted(term_df["Strike"].unique())
-        available_tenors = sorted(term_df["Tenor"].unique())
+        surface_tenors, surface_strikes, surface_vols = surface
+        available_strikes = surface_strikes.tolist()
+        available_tenors = surface_tenors.tolist()
 
         selected_strike = st.selectbox("🎯 Strike (%)", available_strikes, index=available_strikes.index(100) if 100 in available_strikes else 0)
         selected_tenor = st.selectbox("📏 Tenor (Y)", available_tenors, index=available_tenors.index(5) if 5 in available_tenors else 0)
 
-        tenor_df = term_df[term_df["Strike"] == selected_strike].sort_values("Tenor")
-        smile_df = term_df[term_df["Tenor"] == selected_tenor].sort_values("Strike")
+        tenor_df = pd.DataFrame({"Tenor": surface_tenors, VOL_VALUE_COL: surface_vols[:, available_strikes.index(selected_strike)]})
+        smile_df = pd.DataFrame({"Strike": surface_strikes, VOL_VALUE_COL: surface_vols[available_tenors.index(selected_tenor), :]})
 
         col1, col2 = st.columns(2)
         with col1:
@@ -603,10 +449,10 @@ with tabs[2]:
         st.markdown("---")
         st.subheader("🌐 Surface de volatilité 3D")
 
-        surface_df = term_df.pivot(index="Tenor", columns="Strike", values=VOL_VALUE_COL).sort_index().sort_index(axis=1)
+        import plotly.graph_objects as go
 
         fig_surface = go.Figure(data=[
-            go.Surface(z=surface_df.values, x=surface_df.columns, y=surface_df.index, colorscale="Viridis")
+            go.Surface(z=surface_vols, x=surface_strikes, y=surface_tenors, colorscale="Viridis")
         ])
         fig_surface.update_layout(
             title=f"Surface 3D - {asset_name_map.get(default_base_id, default_base_id)} - {selected_obs_date}",
@@ -618,10 +464,183 @@ with tabs[2]:
             height=700
         )
         st.plotly_chart(fig_surface, use_container_width=True)
+        # Toutes les surfaces du sous-jacent sur la fenêtre choisie, lues par lots depuis la base
+        render_export("vol_surface", {"lexifi_id": default_base_id, "start_date": start_date, "end_date": max_date.date()}, "vol_surface_export", f"surfaces_{default_base_id}")
 
     else:
         st.info("Veuillez sélectionner au moins un ID de volatilité.")
 
+# ----------------------- ONGLET CORRÉLATIONS -----------------------
+if active_view == tab_labels[3]:
+    corr_ids = asset_picker(get_search_index("spot", TABLE_NAME), "corr_picker")
+
+    if len(corr_ids) >= 2:
+        bounds_df = fetch_spot_bounds(tuple(corr_ids))
+        if bounds_df.empty:
+            st.warning("⚠️ Aucune donnée spot pour les IDs sélectionnés.")
+            st.stop()
+
+        corr_min_date = bounds_df["min_date"].min().date()
+        corr_max_date = bounds_df["max_date"].max().date()
+
+        col1, col2 = st.columns(2)
+        with col1:
+            as_of = st.date_input("📅 Date d'arrêté :", value=corr_max_date, min_value=corr_min_date, max_value=corr_max_date, key="corr_as_of")
+        with col2:
+            halflife = st.select_slider("Demi-vie EWMA (jours de cotation)", options=[10, 20, 30, 60, 120], value=EWMA_HALFLIFE, key="corr_halflife")
+
+        # Panier trié : même entrée de cache quel que soit l'ordre de sélection
+        basket = tuple(sorted(corr_ids))
+        _, corr = fetch_ewma_correlation(basket, as_of, halflife)
+        order = [i for i in corr_ids if i in corr.index]
+        corr = corr.loc[order, order]
+        corr_labels = [f"{i} - {asset_name_map.get(i, i)}" for i in order]
+
+        fig_corr = px.imshow(
+            corr.to_numpy(),
+            x=corr_labels,
+            y=corr_labels,
+            zmin=-1,
+            zmax=1,
+            color_continuous_scale="RdBu_r",
+            text_auto=".2f" if len(order) <= 25 else False,
+            aspect="auto",
+            title=f"Corrélations EWMA des rendements (demi-vie {halflife} j) au {as_of}"
+        )
+        fig_corr.update_layout(height=max(600, 12 * len(order)), margin=dict(l=60, r=60, t=80, b=40))
+        st.plotly_chart(fig_corr, use_container_width=True)
+
+        st.subheader("📉 Volatilité réalisée glissante")
+        window_labels = {21: "1M", 63: "3M", 252: "1Y"}
+        vol_window = st.radio("Fenêtre", REALIZED_VOL_WINDOWS, format_func=lambda w: window_labels.get(w, f"{w} j"), horizontal=True, key="corr_vol_window")
+        vol_start = st.date_input(
+            "Début du graphique :",
+            value=max(corr_min_date, (pd.Timestamp(as_of) - pd.DateOffset(years=5)).date()),
+            min_value=corr_min_date,
+            max_value=as_of,
+            key="corr_vol_start"
+        )
+
+        realized = fetch_realized_vols(basket, vol_start, as_of)
+        if realized[vol_window].empty:
+            st.warning("⚠️ Pas assez d'historique pour calculer les volatilités réalisées.")
+            st.stop()
+
+        latest_vols = pd.DataFrame({f"Vol {window_labels.get(w, w)} (%)": realized[w].ffill().iloc[-1] * 100 for w in REALIZED_VOL_WINDOWS}).reindex(order)
+        latest_vols.insert(0, "Actif", [asset_name_map.get(i, i) for i in latest_vols.index])
+        st.dataframe(latest_vols.style.format({c: "{:.2f}%" for c in latest_vols.columns if c != "Actif"}, na_rep="-"), use_container_width=True)
+
+        vol_long = (realized[vol_window][order] * 100).reset_index().melt(id_vars=DATE_COL, var_name="lexifi_id", value_name="Vol (%)").dropna(subset=["Vol (%)"])
+        vol_long["Asset"] = vol_long["lexifi_id"].map(asset_name_map).fillna(vol_long["lexifi_id"])
+        fig_realized = px.line(
+            downsample_long(vol_long, DATE_COL, "Vol (%)", "Asset", chart_points),
+            x=DATE_COL,
+            y="Vol (%)",
+            color="Asset",
+            title=f"Volatilité réalisée {window_labels.get(vol_window, vol_window)} annualisée"
+        )
+        fig_realized.update_layout(height=600, xaxis_title="Date", yaxis_title="Volatilité (%)", hovermode="x unified")
+        st.plotly_chart(fig_realized, use_container_width=True)
+    else:
+        st.info("Veuillez sélectionner au moins deux actifs.")
+
+# ----------------------- ONGLET PRICER -----------------------
+if active_view == tab_labels[4]:
+    st.subheader("💶 Pricer Black-76 sur les grilles normalisées")
+    from lexifi_mkt_data_pricer import PRICING_TENORS, PRICING_STRIKES, PRICING_MAX_AGE_DAYS, align_inputs, select_underlyings, price_grid
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        pricing_date = st.date_input("📅 Date de pricing :", value=pd.Timestamp.today().date(), key="pricing_date")
+    with col2:
+        pricing_rate = st.number_input("Taux (%)", value=0.0, step=0.25, key="pricing_rate") / 100
+    with col3:
+        option_type = st.radio("Type", ["Call", "Put"], horizontal=True, key="pricing_type")
+
+    # Dernier spot / forwards / vols <= date pour tout l'univers (cache par date et version), puis toutes les grilles en une passe
+    snapshots = [fetch_asof_snapshot(SNAPSHOT_TABLES[kind], pricing_date, PRICING_MAX_AGE_DAYS) for kind in ("spot", "forward", "vol")]
+    inputs = align_inputs(*snapshots)
+    n_mismatched = int((~inputs["same_date"]).sum())
+    common_date = st.checkbox("Même date d'observation pour spot, forwards et vols", value=True, key="pricing_common_date")
+    if common_date:
+        inputs = select_underlyings(inputs, inputs["same_date"])
+        if n_mismatched:
+            st.info(f"ℹ️ {n_mismatched} sous-jacent(s) écarté(s) : spot, forwards et vols observés à des dates différentes.")
+    elif n_mismatched:
+        st.warning(f"⚠️ {n_mismatched} sous-jacent(s) pricé(s) avec des entrées de dates différentes (voir les colonnes de dates).")
+    if len(inputs["base_ids"]) == 0:
+        st.warning("⚠️ Aucun sous-jacent avec spot, forwards et vols normalisés à cette date.")
+        st.stop()
+
+    start = perf_counter()
+    priced = price_grid(inputs["spot"], inputs["forwards"], inputs["vols"], rate=pricing_rate, greeks=True)
+    elapsed_ms = (perf_counter() - start) * 1000
+    st.caption(f"{inputs['vols'].size} points pricés ({len(inputs['base_ids'])} sous-jacents, calls, puts et greeks) en {elapsed_ms:.1f} ms")
+
+    prefix = option_type.lower()
+    tenor_list = PRICING_TENORS.astype(int).tolist()
+    strike_list = PRICING_STRIKES.tolist()
+    atm = strike_list.index(100.0)
+
+    # ---- Univers : option ATM au tenor choisi
+    pricing_tenor = st.selectbox("📏 Tenor (Y)", tenor_list, index=0, key="pricing_tenor")
+    t = tenor_list.index(pricing_tenor)
+    universe = pd.DataFrame({
+        "Sous-jacent": inputs["base_ids"],
+        "Actif": [asset_name_map.get(i, i) for i in inputs["base_ids"]],
+        "Date spot": inputs["spot_date"].astype(str),
+        "Date forwards": inputs["forward_date"].astype(str),
+        "Date vols": inputs["vol_date"].astype(str),
+        "Spot": inputs["spot"],
+        "Forward (% spot)": inputs["forwards"][:, t] / inputs["spot"] * 100,
+        "Vol ATM (%)": inputs["vols"][:, t, atm],
+        f"{option_type} ATM (% spot)": priced[prefix][:, t, atm],
+        "Delta": priced[f"delta_{prefix}"][:, t, atm],
+        "Vega (% spot / pt)": priced["vega"][:, t, atm],
+    })
+    st.dataframe(
+        universe.style.format({
+            "Spot": "{:,.2f}", "Forward (% spot)": "{:.2f}", "Vol ATM (%)": "{:.2f}",
+            f"{option_type} ATM (% spot)": "{:.2f}", "Delta": "{:.3f}", "Vega (% spot / pt)": "{:.3f}"
+        }, na_rep="-"),
+        use_container_width=True,
+        hide_index=True
+    )
+
+    # ---- Détail : grille tenor x strike des sous-jacents sélectionnés
+    pricing_ids = asset_picker(get_search_index("spot", TABLE_NAME), "pricing_picker", label="🎯 Sous-jacent(s) :")
+    measures = {
+        "Prix (% spot)": priced[prefix],
+        "Delta": priced[f"delta_{prefix}"],
+        "Gamma (% spot)": priced["gamma"],
+        "Vega (% spot / pt)": priced["vega"],
+        "Theta (% spot / jour)": priced[f"theta_{prefix}"],
+        "Vol (%)": inputs["vols"],
+    }
+    measure = st.radio("Mesure", list(measures), horizontal=True, key="pricing_measure")
+    missing_ids = [i for i in pricing_ids if i not in set(inputs["base_ids"])]
+    if missing_ids:
+        st.warning(f"⚠️ Pas de spot, forwards et vols normalisés exploitables à cette date pour : {', '.join(missing_ids)}")
+    if not pricing_ids:
+        st.info("Veuillez sélectionner au moins un sous-jacent.")
+    for pricing_id in pricing_ids:
+        if pricing_id in missing_ids:
+            continue
+        n = int(np.searchsorted(inputs["base_ids"], pricing_id))
+        fig_pricing = px.imshow(
+            measures[measure][n],
+            x=[f"{k:.0f}%" for k in strike_list],
+            y=[f"{tenor}Y" for tenor in tenor_list],
+            text_auto=".3f" if measure == "Delta" else ".2f",
+            color_continuous_scale="Viridis",
+            aspect="auto",
+            labels=dict(x="Strike", y="Tenor", color=measure),
+            title=f"{option_type} • {measure} • {pricing_id} - {asset_name_map.get(pricing_id, pricing_id)} au {pricing_date}"
+        )
+        fig_pricing.update_layout(height=600, margin=dict(l=60, r=60, t=80, b=40))
+        st.plotly_chart(fig_pricing, use_container_width=True)
+        st.caption(f"Observations : spot au {inputs['spot_date'][n]}, forwards au {inputs['forward_date'][n]}, vols au {inputs['vol_date'][n]}")
+
 # ----------------------- FOOTER -----------------------
 with open("C:/Users/Simon/Documents/ArkeaAM/VSCode/icons/AAM_2.png", "rb") as f:
     img_bytes = f.read()
@@ -639,5 +658,6 @@ st.markdown(
 
 st.markdown("---")
 st.markdown(f"🧩 **Base PostgreSQL utilisée** : `{DB_NAME}` sur `{DB_HOST}:{DB_PORT}`")
+render_query_timings()
 
 
@@ -0,0 +1,852 @@
+import pickle
+import hashlib
+import select
+import threading
+import psycopg2
+import streamlit as st
+import pandas as pd
+from collections import OrderedDict
+from time import perf_counter, sleep
+from functools import lru_cache, wraps
+from sqlalchemy import create_engine, text
+
+from lexifi_mkt_data_vol_surface import fetch_surface, SURFACE_TABLE
+from lexifi_mkt_data_spot_stats import YEARLY_TABLE, STATS_TABLE, TRADING_DAYS
+from lexifi_mkt_data_db_metadata import CATALOG_TABLE, DATES_TABLE, VERSION_TABLE, VERSION_CHANNEL
+from lexifi_mkt_data_result_cache import make_result_cache, NullResultCache, DEFAULT_PATH
+from lexifi_mkt_data_search import build_search_index, search, label_of
+from lexifi_mkt_data_export import EXPORT_FORMATS, export_fingerprint, export_path, build_export
+from lexifi_mkt_data_spot_matrix import STORE_DIR, SpotMatrix, read_meta
+from lexifi_mkt_data_db_vol_spread import SPREAD_TABLE
+from lexifi_mkt_data_snapshot import fetch_snapshot
+from lexifi_mkt_data_analytics import REALIZED_VOL_WINDOWS, EWMA_HALFLIFE, EWMA_LOOKBACK_HALFLIVES, log_returns, rolling_realized_vol, ewma_covariance
+
+# ----------------------- CONFIG BDD -----------------------
+DB_USER = "postgres"
+DB_PASSWORD = "0112"
+DB_HOST = "localhost"
+DB_PORT = "5432"
+DB_NAME = "lexifi_mkt_data"
+
+POOL_SIZE = 5
+MAX_OVERFLOW = 10
+POOL_RECYCLE = 1800  # secondes
+RANGE_STORE_SIZE = 2000  # séries spot / forward / vol gardées en mémoire (LRU, partagé entre sessions)
+VERSION_POLL_SECONDS = 60  # relecture de data_version si aucun NOTIFY n'arrive
+
+# Cache disque partagé par tous les workers Streamlit de la machine ; None = mémoire du process uniquement
+RESULT_CACHE_BACKEND = "sqlite"
+RESULT_CACHE_PATH = DEFAULT_PATH
+RESULT_CACHE_MAX_MB = 2048
+
+# Matrice spot dates x actifs tenue par le script d'ingestion ; None = panels toujours lus en base
+SPOT_MATRIX_PATH = STORE_DIR
+
+TABLE_NAME = "asset_spot"
+ID_COL = "lexifi_id"
+DATE_COL = "lexifi_date"
+VALUE_COL = "lexifi_spot"
+
+FORWARD_VALUE = "lexifi_forward"
+FORWARD_ID = "lexifi_forward_id"
+FORWARD_DATE = "lexifi_date"
+FORWARD_BASE_ID = "lexifi_id"
+
+VOL_TABLE = "asset_volatility"
+VOL_ID_COL = "lexifi_vol_id"
+VOL_VALUE_COL = "lexifi_vol"
+VOL_DATE_COL = "lexifi_date"
+VOL_BASE_ID = "lexifi_id"
+VOL_MIN_POINTS = 3  # séries avec au plus ce nombre de points non affichées
+# (pas date_trunc, profondeur max en jours) : quotidien sur 2 ans, hebdo jusqu'à 10 ans, mensuel au-delà
+VOL_HISTORY_STEPS = [("day", 2 * 366), ("week", 10 * 366), ("month", None)]
+VOL_STEP_LABELS = {"day": "quotidien", "week": "moyenne hebdomadaire", "month": "moyenne mensuelle"}
+
+# Requêtes paramétrées ; {forward_table} est résolu à la compilation (asset_forward_normalized / asset_fwd)
+QUERIES = {
+    "data_versions": f"SELECT source_table, version FROM {VERSION_TABLE}",
+    "available_dates": f"""
+        SELECT obs_date
+        FROM {DATES_TABLE}
+        WHERE source_table = :source_table AND base_id = :lexifi_id
+        ORDER BY obs_date DESC
+    """,
+    "catalog": f"""
+        SELECT instrument_id, base_id, first_date, last_date, n_points
+        FROM {CATALOG_TABLE}
+        WHERE source_table = :source_table
+        ORDER BY instrument_id
+    """,
+    "spot_ids": f"SELECT DISTINCT {ID_COL} FROM {TABLE_NAME}",
+    "spot_bounds": f"""
+        SELECT {ID_COL}, MIN({DATE_COL}) AS min_date, MAX({DATE_COL}) AS max_date
+        FROM {TABLE_NAME}
+        WHERE {ID_COL} = ANY(:lexifi_ids)
+        GROUP BY {ID_COL}
+    """,
+    "spot_at_date": f"""
+        SELECT {VALUE_COL}
+        FROM {TABLE_NAME}
+        WHERE {ID_COL} = :lexifi_id AND {DATE_COL} = :obs_date
+        LIMIT 1
+    """,
+    "asset_mapping": "SELECT lexifi_id, asset_name FROM asset_mapping",
+    "spot_stats": f"""
+        SELECT y.{ID_COL}, y.year, y.close, y.low, y.high, y.n_returns, y.sum_returns, y.sum_sq_returns,
+               t.last_value, t.ytd_base, t.vol_1m, t.vol_3m, t.vol_1y
+        FROM {STATS_TABLE} t
+        JOIN {YEARLY_TABLE} y ON y.{ID_COL} = t.{ID_COL} AND y.year >= :start_year - 1
+        WHERE t.{ID_COL} = ANY(:lexifi_ids)
+        ORDER BY y.{ID_COL}, y.year
+    """,
+    # Début de fenêtre en cours d'année : extrêmes et sommes des rendements lus sur asset_spot de start_date au 31/12
+    "spot_stats_head": f"""
+        SELECT {ID_COL}, MIN({VALUE_COL}) AS low, MAX({VALUE_COL}) AS high,
+               COUNT(r) AS n_returns, COALESCE(SUM(r), 0) AS sum_returns, COALESCE(SUM(r * r), 0) AS sum_sq_returns
+        FROM (
+            SELECT {ID_COL}, {VALUE_COL},
+                   {VALUE_COL} / NULLIF(LAG({VALUE_COL}) OVER (PARTITION BY {ID_COL} ORDER BY {DATE_COL}), 0) - 1 AS r
+            FROM {TABLE_NAME}
+            WHERE {ID_COL} = ANY(:lexifi_ids) AND {VALUE_COL} IS NOT NULL
+              AND {DATE_COL} >= :start_date AND {DATE_COL} < make_date(:start_year + 1, 1, 1)
+        ) x
+        GROUP BY {ID_COL}
+    """,
+    "forward_ids": f"""
+        SELECT DISTINCT {FORWARD_ID}, {FORWARD_BASE_ID}
+        FROM {{forward_table}}
+        WHERE {FORWARD_ID} IS NOT NULL AND {FORWARD_VALUE} IS NOT NULL
+    """,
+    "forward_bounds": f"""
+        SELECT MIN({FORWARD_DATE}) AS min_date, MAX({FORWARD_DATE}) AS max_date
+        FROM {{forward_table}}
+        WHERE {FORWARD_ID} = ANY(:forward_ids)
+    """,
+    "forward_dates": f"""
+        SELECT DISTINCT {FORWARD_DATE}
+        FROM {{forward_table}}
+        WHERE {FORWARD_BASE_ID} = :lexifi_id
+        ORDER BY {FORWARD_DATE} DESC
+    """,
+    "forward_term": f"""
+        SELECT {FORWARD_ID}, {FORWARD_VALUE}
+        FROM {{forward_table}}
+        WHERE {FORWARD_BASE_ID} = :lexifi_id AND {FORWARD_DATE} = :obs_date
+    """,
+    "vol_ids": f"SELECT DISTINCT {VOL_ID_COL}, {VOL_BASE_ID} FROM {VOL_TABLE}",
+    "vol_date_range": f"""
+        SELECT MIN({VOL_DATE_COL}) AS min_date, MAX({VOL_DATE_COL}) AS max_date
+        FROM {VOL_TABLE}
+        WHERE {VOL_ID_COL} = ANY(:vol_ids)
+    """,
+    # Dernière date calculée <= obs_date, tous les sous-jacents (index (lexifi_date, tenor) de asset_vol_spread)
+    "vol_spread_screen": f"""
+        SELECT {VOL_BASE_ID}, {VOL_DATE_COL}, implied_vol, realized_vol, spread
+        FROM {SPREAD_TABLE}
+        WHERE tenor = :tenor
+          AND {VOL_DATE_COL} = (SELECT MAX({VOL_DATE_COL}) FROM {SPREAD_TABLE} WHERE tenor = :tenor AND {VOL_DATE_COL} <= :obs_date)
+        ORDER BY spread DESC NULLS LAST
+    """,
+    # Historique agrégé côté base : moyenne par jour / semaine / mois, séries avec trop peu de points écartées dans la requête
+    "vol_history_agg": f"""
+        SELECT {VOL_ID_COL}, MIN({VOL_BASE_ID}) AS {VOL_BASE_ID},
+               CAST(date_trunc(CAST(:step AS text), {VOL_DATE_COL}) AS date) AS {VOL_DATE_COL},
+               AVG({VOL_VALUE_COL}) AS {VOL_VALUE_COL}
+        FROM (
+            SELECT {VOL_ID_COL}, {VOL_BASE_ID}, {VOL_DATE_COL}, {VOL_VALUE_COL},
+                   COUNT(*) OVER (PARTITION BY {VOL_ID_COL}) AS n_points
+            FROM {VOL_TABLE}
+            WHERE {VOL_ID_COL} = ANY(:vol_ids) AND {VOL_DATE_COL} >= :start_date AND {VOL_VALUE_COL} IS NOT NULL
+        ) v
+        WHERE n_points > :min_points
+        GROUP BY {VOL_ID_COL}, 3
+        ORDER BY {VOL_ID_COL}, 3
+    """,
+    # "<id> 5Y 100%" -> Tenor 5, Strike 100 ; identifiants d'un autre format écartés
+    "vol_term": f"""
+        SELECT {VOL_ID_COL}, {VOL_VALUE_COL}, "Tenor", "Strike"
+        FROM (
+            SELECT {VOL_ID_COL}, {VOL_VALUE_COL},
+                   CASE WHEN split_part({VOL_ID_COL}, ' ', 2) ~ '^[0-9]+Y$'
+                        THEN rtrim(split_part({VOL_ID_COL}, ' ', 2), 'Y')::int END AS "Tenor",
+                   CASE WHEN split_part({VOL_ID_COL}, ' ', 3) ~ '^-?[0-9]+(\.[0-9]+)?%$'
+                        THEN rtrim(split_part({VOL_ID_COL}, ' ', 3), '%')::float END AS "Strike"
+            FROM {VOL_TABLE}
+            WHERE {VOL_BASE_ID} = :lexifi_id AND {VOL_DATE_COL} = :obs_date
+        ) t
+        WHERE "Tenor" IS NOT NULL AND "Strike" IS NOT NULL
+    """,
+    "vol_dates": f"SELECT DISTINCT {VOL_DATE_COL} FROM {VOL_TABLE} WHERE {VOL_BASE_ID} = :lexifi_id ORDER BY {VOL_DATE_COL} DESC",
+}
+
+# Fenêtre [start_date, end_date) par série ; end_date NULL = jusqu'à la dernière date disponible
+RANGE_WINDOW_SQL = """
+    SELECT s.{key_col} AS series_key, s.{date_col} AS obs_date, s.{value_col} AS obs_value
+    FROM unnest(CAST(:keys AS text[]), CAST(:end_dates AS date[])) AS r(series_key, end_date)
+    JOIN {table} s ON s.{key_col} = r.series_key
+    WHERE (CAST(:start_date AS date) IS NULL OR s.{date_col} >= CAST(:start_date AS date))
+      AND (r.end_date IS NULL OR s.{date_col} < r.end_date)
+      AND s.{value_col} IS NOT NULL
+"""
+
+# Dernière observation strictement avant start_date (point d'ancrage pour le ffill)
+RANGE_ANCHOR_SQL = """
+    SELECT a.series_key, a.obs_date, a.obs_value
+    FROM unnest(CAST(:keys AS text[])) AS r(series_key)
+    CROSS JOIN LATERAL (
+        SELECT s.{key_col} AS series_key, s.{date_col} AS obs_date, s.{value_col} AS obs_value
+        FROM {table} s
+        WHERE s.{key_col} = r.series_key AND s.{date_col} < CAST(:start_date AS date) AND s.{value_col} IS NOT NULL
+        ORDER BY s.{date_col} DESC
+        LIMIT 1
+    ) a
+"""
+
+QUERIES["range_window"] = RANGE_WINDOW_SQL
+QUERIES["range_window_anchor"] = RANGE_WINDOW_SQL + "UNION ALL" + RANGE_ANCHOR_SQL
+
+# ----------------------- MOTEUR / EXÉCUTION -----------------------
+
+@st.cache_resource
+def get_engine():
+    engine_str = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    return create_engine(
+        engine_str,
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_pre_ping=True,
+        pool_recycle=POOL_RECYCLE
+    )
+
+@lru_cache(maxsize=None)
+def get_query(name, **tables):
+    return text(QUERIES[name].format(**tables))
+
+@st.cache_resource
+def get_query_timings():
+    return {}
+
+def record_timing(name, elapsed_ms, n_rows):
+    stats = get_query_timings().setdefault(name, {"calls": 0, "total_ms": 0.0, "last_ms": 0.0, "max_ms": 0.0, "last_rows": 0})
+    stats["calls"] += 1
+    stats["total_ms"] += elapsed_ms
+    stats["last_ms"] = elapsed_ms
+    stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+    stats["last_rows"] = n_rows
+
+def run_query(name, params=None, **tables):
+    start = perf_counter()
+    with get_engine().connect() as conn:
+        df = pd.read_sql(get_query(name, **tables), con=conn, params=params or {})
+    record_timing(name, (perf_counter() - start) * 1000, len(df))
+    return df
+
+def query_timings_frame():
+    rows = [
+        {"Requête": name, "Appels": s["calls"], "Dernière (ms)": s["last_ms"], "Moyenne (ms)": s["total_ms"] / s["calls"], "Max (ms)": s["max_ms"], "Lignes": s["last_rows"]}
+        for name, s in get_query_timings().items()
+    ]
+    return pd.DataFrame(rows)
+
+def render_query_timings():
+    with st.expander("⏱️ Temps des requêtes"):
+        timings = query_timings_frame()
+        if timings.empty:
+            st.caption("Aucune requête exécutée pour l'instant.")
+        else:
+            st.dataframe(timings.sort_values("Moyenne (ms)", ascending=False), use_container_width=True)
+        cache_stats = get_result_cache().stats()
+        if cache_stats["backend"] != "none":
+            st.caption(f"💾 Cache partagé : {cache_stats['entries']} entrée(s), {cache_stats['size_mb']:.1f} Mo, {cache_stats['hits']} hit(s) / {cache_stats['misses']} miss(es) pour ce process")
+
+# ----------------------- VERSIONS DE DONNÉES -----------------------
+
+# (tables lues, fonction en cache) : un cache par table pour les fonctions à argument table, pour l'éviction ciblée après une ingestion
+_versioned_functions = []
+
+def load_data_versions():
+    try:
+        df = run_query("data_versions")
+    except Exception:
+        return {}
+    return dict(zip(df["source_table"], df["version"].astype(int)))
+
+def _listen_data_versions(state):
+    # Connexion dédiée hors pool : LISTEN sur le canal des scripts d'ingestion, relecture périodique en filet de sécurité
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT)
+            conn.autocommit = True
+            cur = conn.cursor()
+            cur.execute(f"LISTEN {VERSION_CHANNEL}")
+            while True:
+                if select.select([conn], [], [], VERSION_POLL_SECONDS) != ([], [], []):
+                    conn.poll()
+                    conn.notifies.clear()
+                cur.execute(QUERIES["data_versions"])
+                versions = {table: int(version) for table, version in cur.fetchall()}
+                with state["lock"]:
+                    state["versions"] = versions
+        except Exception:
+            pass
+        finally:
+            # Connexion en échec fermée avant de retenter : pas de connexion serveur orpheline par erreur
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        sleep(VERSION_POLL_SECONDS)
+
+@st.cache_resource
+def get_version_state():
+    versions = load_data_versions()
+    state = {"versions": versions, "seen": dict(versions), "lock": threading.Lock()}
+    threading.Thread(target=_listen_data_versions, args=(state,), daemon=True).start()
+    return state
+
+def table_versions(tables):
+    versions = get_version_state()["versions"]
+    return tuple(versions.get(table, 0) for table in tables)
+
+# ----------------------- CACHE PARTAGÉ -----------------------
+
+@st.cache_resource
+def get_result_cache():
+    if RESULT_CACHE_BACKEND is None:
+        return NullResultCache()
+    try:
+        return make_result_cache(RESULT_CACHE_BACKEND, path=RESULT_CACHE_PATH, max_mb=RESULT_CACHE_MAX_MB)
+    except Exception as e:
+        print(f"❌ Cache partagé indisponible, repli sur la mémoire du process : {e}")
+        return NullResultCache()
+
+def result_key(name, args, kwargs):
+    return f"{name}:{hashlib.sha1(pickle.dumps((args, sorted(kwargs.items())))).hexdigest()}"
+
+def shared_result(key, version, compute):
+    # Lecture / écriture best effort : une erreur du cache disque ne doit jamais casser le dashboard
+    cache = get_result_cache()
+    try:
+        hit, value = cache.get(key, version)
+    except Exception:
+        hit, value = False, None
+    if hit:
+        return value
+    value = compute()
+    try:
+        cache.put(key, version, value)
+    except Exception:
+        pass
+    return value
+
+def versioned_cache(*tables, table_arg=None):
+    # st.cache_data dont la clé inclut la version des tables lues ; table_arg = position de l'argument portant le nom de table.
+    # Avec table_arg, un cache distinct par table : une réingestion ne libère que les entrées de la table concernée.
+    # Un échec mémoire passe par le cache disque partagé avant d'interroger la base.
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+        per_table = {}
+        lock = threading.Lock()
+
+        def make_cached(read_tables, suffix=""):
+            def cached(data_version, *args, **kwargs):
+                return shared_result(result_key(name, args, kwargs), data_version, lambda: func(*args, **kwargs))
+            cached.__name__ = func.__name__
+            cached.__qualname__ = f"{func.__qualname__}_versioned{suffix}"
+            cached = st.cache_data(cached)
+            _versioned_functions.append((read_tables, cached))
+            return cached
+
+        def cached_for(table):
+            with lock:
+                if table not in per_table:
+                    per_table[table] = make_cached(tables + (table,), f"_{table}")
+                return per_table[table]
+
+        default = make_cached(tables) if table_arg is None else None
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if table_arg is None:
+                return default(table_versions(tables), *args, **kwargs)
+            names = tables + (args[table_arg],)
+            return cached_for(args[table_arg])(table_versions(names), *args, **kwargs)
+
+        def clear():
+            for cached in ([default] if default is not None else list(per_table.values())):
+                cached.clear()
+        wrapper.clear = clear
+        return wrapper
+    return decorator
+
+def evict_tables(changed):
+    for tables, cached in list(_versioned_functions):
+        if set(tables) & set(changed):
+            cached.clear()
+    store = get_range_store()
+    with store["lock"]:
+        for key in [k for k in store["entries"] if k[0] in changed]:
+            del store["entries"][key]
+        store["generation"] += 1
+
+def sync_data_versions():
+    # Appelé en tête de chaque exécution du dashboard : libère les entrées des tables réingérées
+    state = get_version_state()
+    with state["lock"]:
+        changed = [table for table, version in state["versions"].items() if state["seen"].get(table) != version]
+        state["seen"] = dict(state["versions"])
+    if changed:
+        evict_tables(changed)
+    return changed
+
+# ----------------------- SÉRIES PAR FENÊTRE DE DATES -----------------------
+
+@st.cache_resource
+def get_range_store():
+    return {"entries": OrderedDict(), "lock": threading.Lock(), "generation": 0}
+
+def load_shared_range(table, key):
+    try:
+        hit, entry = get_result_cache().get(f"range:{table}:{key}", table_versions((table,)))
+    except Exception:
+        return None
+    return entry if hit else None
+
+def store_shared_range(table, key, entry):
+    try:
+        get_result_cache().put(f"range:{table}:{key}", table_versions((table,)), entry)
+    except Exception:
+        pass
+
+def wider_start(a, b):
+    # Début de couverture le plus ancien, None = tout l'historique
+    return None if a is None or b is None else min(a, b)
+
+def fetch_ranged_series(table, key_col, value_col, keys, start_date=None, with_anchor=False):
+    # Chaque série est gardée avec la date de début couverte : une fenêtre plus large déjà en cache
+    # sert les demandes plus étroites, une demande plus large ne charge que la portion manquante.
+    # Le verrou ne couvre que la lecture et la fusion du store : les requêtes tournent hors verrou.
+    start = None if start_date is None else pd.Timestamp(start_date)
+    store = get_range_store()
+    entries = store["entries"]
+    keys = list(dict.fromkeys(keys))
+    with store["lock"]:
+        generation = store["generation"]
+        current = {key: entries.get((table, key)) for key in keys}
+
+    for key in keys:
+        if current[key] is None:
+            current[key] = load_shared_range(table, key)
+    to_load, end_dates = [], []
+    for key in keys:
+        entry = current[key]
+        if entry is None:
+            to_load.append(key)
+            end_dates.append(None)
+        elif entry["start"] is not None and (start is None or start < entry["start"]):
+            to_load.append(key)
+            end_dates.append(entry["start"].date())
+
+    if to_load:
+        query_name = "range_window_anchor" if with_anchor and start is not None else "range_window"
+        params = {"keys": to_load, "end_dates": end_dates, "start_date": None if start is None else start.date()}
+        df = run_query(query_name, params, table=table, key_col=key_col, date_col=DATE_COL, value_col=value_col)
+        df["obs_date"] = pd.to_datetime(df["obs_date"])
+        loaded = dict(tuple(df.groupby("series_key", sort=False)))
+        for key in to_load:
+            group = loaded.get(key)
+            if group is None:
+                new = pd.Series(dtype=float, index=pd.DatetimeIndex([]))
+            else:
+                new = pd.Series(group["obs_value"].to_numpy(dtype=float), index=pd.DatetimeIndex(group["obs_date"]))
+            old = current[key]
+            if old is not None:
+                new = pd.concat([new, old["series"]])
+                new = new[~new.index.duplicated(keep="last")]
+            current[key] = {"series": new.sort_index(), "start": start}
+            store_shared_range(table, key, current[key])
+
+    with store["lock"]:
+        # Store vidé entre-temps (nouvelle version de la table) : résultats servis sans être mémorisés
+        if store["generation"] == generation:
+            for key in keys:
+                entry = current[key]
+                other = entries.get((table, key))
+                if other is not None and other is not entry:
+                    # Une autre session a chargé la série pendant la requête : union des deux couvertures
+                    series = pd.concat([entry["series"], other["series"]])
+                    entry = {"series": series[~series.index.duplicated(keep="last")].sort_index(), "start": wider_start(entry["start"], other["start"])}
+                entries[(table, key)] = entry
+                entries.move_to_end((table, key))
+            while len(entries) > RANGE_STORE_SIZE:
+                entries.popitem(last=False)
+
+    result = {}
+    for key in keys:
+        series = current[key]["series"]
+        if start is not None:
+            window = series[series.index >= start]
+            if with_anchor:
+                window = pd.concat([series[series.index < start].iloc[-1:], window])
+            series = window
+        result[key] = series.rename(key)
+    return result
+
+def series_to_long(series, id_col, date_col, value_col, base_id_col):
+    frames = [
+        pd.DataFrame({id_col: key, date_col: s.index, value_col: s.to_numpy(), base_id_col: key.split()[0]})
+        for key, s in series.items() if not s.empty
+    ]
+    if not frames:
+        return pd.DataFrame(columns=[id_col, date_col, value_col, base_id_col])
+    return pd.concat(frames, ignore_index=True)
+
+# ----------------------- CATALOGUE -----------------------
+
+@versioned_cache(table_arg=0)
+def fetch_catalog(source_table):
+    # Vide si la table source n'est pas (encore) suivie par les scripts d'ingestion : les appelants retombent sur un DISTINCT
+    try:
+        df = run_query("catalog", {"source_table": source_table})
+    except Exception:
+        return pd.DataFrame(columns=["instrument_id", "base_id", "first_date", "last_date", "n_points"])
+    df["first_date"] = pd.to_datetime(df["first_date"])
+    df["last_date"] = pd.to_datetime(df["last_date"])
+    return df
+
+def catalog_rows(source_table, instrument_ids):
+    catalog = fetch_catalog(source_table)
+    rows = catalog[catalog["instrument_id"].isin(list(instrument_ids))]
+    return None if rows.empty else rows
+
+@versioned_cache(table_arg=0)
+def fetch_available_dates(source_table, lexifi_id):
+    # Dates d'observation triées de la plus récente à la plus ancienne ; vide si la table n'est pas suivie
+    try:
+        df = run_query("available_dates", {"source_table": source_table, "lexifi_id": lexifi_id})
+    except Exception:
+        return []
+    return pd.to_datetime(df["obs_date"]).dt.date.tolist()
+
+def snap_date(available_dates, chosen):
+    # Dernière observation disponible à la date choisie, sinon la première qui suit
+    dates = pd.DatetimeIndex(sorted(pd.to_datetime(list(available_dates))))
+    if dates.empty:
+        return None
+    pos = dates.searchsorted(pd.Timestamp(chosen), side="right") - 1
+    return dates[max(pos, 0)].date()
+
+# ----------------------- SPOT -----------------------
+
+@versioned_cache(TABLE_NAME)
+def connect_and_fetch_ids():
+    catalog = fetch_catalog(TABLE_NAME)
+    if not catalog.empty:
+        return catalog["instrument_id"].tolist()
+    df = run_query("spot_ids")
+    return df[ID_COL].dropna().astype(str).tolist()
+
+@versioned_cache(TABLE_NAME)
+def fetch_spot_bounds(lexifi_ids):
+    rows = catalog_rows(TABLE_NAME, lexifi_ids)
+    if rows is not None:
+        return rows.rename(columns={"instrument_id": ID_COL, "first_date": "min_date", "last_date": "max_date"})[[ID_COL, "min_date", "max_date"]]
+    df = run_query("spot_bounds", {"lexifi_ids": list(lexifi_ids)})
+    df["min_date"] = pd.to_datetime(df["min_date"])
+    df["max_date"] = pd.to_datetime(df["max_date"])
+    return df
+
+@st.cache_resource(max_entries=2)
+def open_spot_matrix_version(version):
+    # Lève si la matrice sur disque n'est pas (encore) à cette version : rien n'est mis en cache, réessai au prochain appel
+    meta = read_meta(SPOT_MATRIX_PATH)
+    if meta is None or meta["version"] != version:
+        raise LookupError(f"Matrice spot absente ou pas à la version {version}")
+    return SpotMatrix(SPOT_MATRIX_PATH, meta)
+
+def get_spot_matrix():
+    if SPOT_MATRIX_PATH is None:
+        return None
+    try:
+        return open_spot_matrix_version(table_versions((TABLE_NAME,))[0])
+    except Exception:
+        return None
+
+def fetch_spot_panel(lexifi_ids, start_date=None):
+    # Lecture directe dans la matrice mappée si elle est à jour et couvre tous les actifs, sinon séries chargées en base
+    matrix = get_spot_matrix()
+    if matrix is not None and all(i in matrix.columns for i in lexifi_ids):
+        start = perf_counter()
+        panel = matrix.frame(lexifi_ids, start_date, with_anchor=True)
+        record_timing("spot_matrix", (perf_counter() - start) * 1000, len(panel))
+        panel.index.name = DATE_COL
+        panel.columns.name = "id"
+        return panel
+    series = fetch_ranged_series(TABLE_NAME, ID_COL, VALUE_COL, lexifi_ids, start_date, with_anchor=True)
+    panel = pd.concat(list(series.values()), axis=1).sort_index()
+    panel.index.name = DATE_COL
+    panel.columns.name = "id"
+    return panel
+
+@versioned_cache(TABLE_NAME)
+def fetch_spot_stats(lexifi_ids, start_date):
+    # Min, Max et vol réalisée sur la fenêtre exacte depuis start_date : années complètes lues dans asset_spot_yearly,
+    # année de départ entamée recalculée sur asset_spot (au plus un an de cotations par actif)
+    start_date = pd.Timestamp(start_date)
+    start_year = start_date.year
+    df = run_query("spot_stats", {"lexifi_ids": list(lexifi_ids), "start_year": start_year})
+    if df.empty:
+        return pd.DataFrame()
+    if start_date > pd.Timestamp(start_year, 1, 1):
+        head = run_query("spot_stats_head", {"lexifi_ids": list(lexifi_ids), "start_date": start_date.date(), "start_year": start_year})
+        head["year"] = start_year
+        window_cols = ["low", "high", "n_returns", "sum_returns", "sum_sq_returns"]
+        first_year = df[df["year"] == start_year].drop(columns=window_cols).merge(head, on=[ID_COL, "year"], how="left")
+        df = pd.concat([df[df["year"] != start_year], first_year]).sort_values([ID_COL, "year"])
+    closes = df.pivot(index=ID_COL, columns="year", values="close").reindex(columns=range(start_year - 1, int(df["year"].max()) + 1))
+    # Base de l'année N = dernière clôture connue jusqu'à N-1
+    perf = (closes / closes.ffill(axis=1).shift(axis=1) - 1) * 100
+    perf = perf.loc[:, start_year:].rename(columns=lambda year: f"Perf {year}")
+
+    window = df[df["year"] >= start_year].groupby(ID_COL).agg(
+        low=("low", "min"), high=("high", "max"),
+        n=("n_returns", "sum"), s=("sum_returns", "sum"), ss=("sum_sq_returns", "sum")
+    )
+    variance = (window["ss"] - window["s"] ** 2 / window["n"]) / (window["n"] - 1)
+    latest = df.groupby(ID_COL)[["last_value", "ytd_base", "vol_1m", "vol_3m", "vol_1y"]].first()
+
+    stats = pd.DataFrame({
+        "Valeur actuelle": latest["last_value"],
+        "Min": window["low"],
+        "Max": window["high"],
+        "Perf YTD": (latest["last_value"] / latest["ytd_base"] - 1) * 100,
+        "Volatilité réalisée (%)": (variance.clip(lower=0) * TRADING_DAYS) ** 0.5 * 100,
+        "Vol 1M (%)": latest["vol_1m"] * 100,
+        "Vol 3M (%)": latest["vol_3m"] * 100,
+        "Vol 1Y (%)": latest["vol_1y"] * 100,
+    })
+    return stats.join(perf).reindex([i for i in lexifi_ids if i in stats.index])
+
+@versioned_cache(TABLE_NAME)
+def fetch_spot_at_date(lexifi_id, obs_date):
+    df = run_query("spot_at_date", {"lexifi_id": lexifi_id, "obs_date": obs_date})
+    return None if df.empty else df.iloc[0][VALUE_COL]
+
+def trading_days_to_calendar(n_days):
+    return pd.Timedelta(days=int(n_days * 7 / 5) + 10)
+
+# Vols réalisées / corrélations : clé de cache = (panier trié, paramètres, date d'arrêté) + version de asset_spot
+@versioned_cache(TABLE_NAME)
+def fetch_ewma_correlation(lexifi_ids, as_of, halflife=EWMA_HALFLIFE):
+    start = pd.Timestamp(as_of) - trading_days_to_calendar(EWMA_LOOKBACK_HALFLIVES * halflife)
+    panel = fetch_spot_panel(list(lexifi_ids), start.date())
+    panel = panel[panel.index <= pd.Timestamp(as_of)]
+    return ewma_covariance(log_returns(panel), halflife)
+
+@versioned_cache(TABLE_NAME)
+def fetch_realized_vols(lexifi_ids, start_date, as_of, windows=REALIZED_VOL_WINDOWS):
+    # Historique chargé en amont de start_date pour que la plus longue fenêtre soit pleine dès le début du graphique
+    panel = fetch_spot_panel(list(lexifi_ids), (pd.Timestamp(start_date) - trading_days_to_calendar(max(windows))).date())
+    panel = panel[panel.index <= pd.Timestamp(as_of)]
+    vols = rolling_realized_vol(log_returns(panel), windows)
+    return {window: vol[vol.index >= pd.Timestamp(start_date)] for window, vol in vols.items()}
+
+@st.cache_data
+def fetch_asset_mapping():
+    df = run_query("asset_mapping")
+    df['asset_name'] = df['asset_name'].astype(str).apply(lambda x: x.encode('utf-8', errors='replace').decode('utf-8'))
+    return dict(zip(df["lexifi_id"], df["asset_name"]))
+
+# ----------------------- FORWARD -----------------------
+
+@versioned_cache(table_arg=0)
+def fetch_forward_ids(forward_table):
+    catalog = fetch_catalog(forward_table)
+    if not catalog.empty:
+        return catalog.rename(columns={"instrument_id": FORWARD_ID, "base_id": FORWARD_BASE_ID})[[FORWARD_ID, FORWARD_BASE_ID]]
+    return run_query("forward_ids", forward_table=forward_table)
+
+@versioned_cache(table_arg=0)
+def fetch_forward_bounds(forward_table, forward_ids):
+    rows = catalog_rows(forward_table, forward_ids)
+    if rows is not None:
+        return rows["first_date"].min(), rows["last_date"].max()
+    df = run_query("forward_bounds", {"forward_ids": list(forward_ids)}, forward_table=forward_table)
+    return pd.to_datetime(df.iloc[0]["min_date"]), pd.to_datetime(df.iloc[0]["max_date"])
+
+def fetch_forward_history(forward_table, forward_ids, start_date=None):
+    series = fetch_ranged_series(forward_table, FORWARD_ID, FORWARD_VALUE, forward_ids, start_date)
+    return series_to_long(series, FORWARD_ID, FORWARD_DATE, FORWARD_VALUE, FORWARD_BASE_ID)
+
+@versioned_cache(table_arg=0)
+def fetch_forward_dates(forward_table, lexifi_id):
+    available = fetch_available_dates(forward_table, lexifi_id)
+    if available:
+        return pd.DataFrame({FORWARD_DATE: pd.to_datetime(available)})
+    df = run_query("forward_dates", {"lexifi_id": lexifi_id}, forward_table=forward_table)
+    df[FORWARD_DATE] = pd.to_datetime(df[FORWARD_DATE])
+    return df
+
+@versioned_cache(table_arg=0)
+def fetch_forward_term(forward_table, lexifi_id, obs_date):
+    return run_query("forward_term", {"lexifi_id": lexifi_id, "obs_date": obs_date}, forward_table=forward_table)
+
+# ----------------------- VOLATILITY -----------------------
+
+@versioned_cache(VOL_TABLE)
+def fetch_vol_ids():
+    catalog = fetch_catalog(VOL_TABLE)
+    if not catalog.empty:
+        return catalog.rename(columns={"instrument_id": VOL_ID_COL, "base_id": VOL_BASE_ID})[[VOL_ID_COL, VOL_BASE_ID]]
+    return run_query("vol_ids")
+
+@versioned_cache(VOL_TABLE)
+def fetch_vol_date_range(vol_ids):
+    rows = catalog_rows(VOL_TABLE, vol_ids)
+    if rows is not None:
+        return rows["first_date"].min(), rows["last_date"].max()
+    df = run_query("vol_date_range", {"vol_ids": list(vol_ids)})
+    return pd.to_datetime(df.iloc[0]["min_date"]), pd.to_datetime(df.iloc[0]["max_date"])
+
+def vol_history_step(start_date, end_date):
+    # Pas d'agrégation selon la profondeur d'historique affichée
+    span_days = (pd.Timestamp(end_date) - pd.Timestamp(start_date)).days
+    for step, max_days in VOL_HISTORY_STEPS:
+        if max_days is None or span_days <= max_days:
+            return step
+
+@versioned_cache(VOL_TABLE)
+def fetch_vol_history_agg(vol_ids, start_date, step="day", min_points=VOL_MIN_POINTS):
+    df = run_query("vol_history_agg", {"vol_ids": list(vol_ids), "start_date": start_date, "step": step, "min_points": int(min_points)})
+    df[VOL_DATE_COL] = pd.to_datetime(df[VOL_DATE_COL])
+    return df
+
+@versioned_cache(SPREAD_TABLE)
+def fetch_vol_spread_screen(tenor, obs_date):
+    # Vide si lexifi_mkt_data_db_vol_spread n'a pas encore tourné
+    try:
+        df = run_query("vol_spread_screen", {"tenor": int(tenor), "obs_date": obs_date})
+    except Exception:
+        return pd.DataFrame(columns=[VOL_BASE_ID, VOL_DATE_COL, "implied_vol", "realized_vol", "spread"])
+    df[VOL_DATE_COL] = pd.to_datetime(df[VOL_DATE_COL])
+    return df
+
+@versioned_cache(VOL_TABLE)
+def fetch_vol_term(lexifi_id, obs_date):
+    return run_query("vol_term", {"lexifi_id": lexifi_id, "obs_date": obs_date})
+
+@versioned_cache(VOL_TABLE)
+def fetch_vol_dates(lexifi_id):
+    available = fetch_available_dates(VOL_TABLE, lexifi_id)
+    if available:
+        return available
+    df = run_query("vol_dates", {"lexifi_id": lexifi_id})
+    df[VOL_DATE_COL] = pd.to_datetime(df[VOL_DATE_COL])
+    return df[VOL_DATE_COL].dt.date.tolist()
+
+@versioned_cache(VOL_TABLE, SURFACE_TABLE)
+def fetch_vol_surface(lexifi_id, obs_date, normalized=False):
+    # (tenors, strikes, vols 2D). Par défaut les points cotés de asset_volatility ;
+    # normalized=True : grille interpolée 40-160% / 1-10Y de asset_volatility_surface (None si absente)
+    if not normalized:
+        term_df = fetch_vol_term(lexifi_id, obs_date)
+        if term_df.empty:
+            return None
+        pivot = term_df.pivot_table(index="Tenor", columns="Strike", values=VOL_VALUE_COL).sort_index().sort_index(axis=1)
+        return pivot.index.to_numpy(dtype=float), pivot.columns.to_numpy(dtype=float), pivot.to_numpy(dtype=float)
+    start = perf_counter()
+    raw_conn = get_engine().raw_connection()
+    try:
+        cur = raw_conn.cursor()
+        surface = fetch_surface(cur, lexifi_id, obs_date)
+        cur.close()
+    except Exception:
+        surface = None
+    finally:
+        raw_conn.close()
+    record_timing("vol_surface", (perf_counter() - start) * 1000, 0 if surface is None else surface[2].size)
+    return surface
+
+# ----------------------- SNAPSHOTS -----------------------
+
+@versioned_cache(table_arg=0)
+def fetch_asof_snapshot(source_table, as_of, max_age_days=None):
+    # Dernière observation <= as_of de chaque instrument (colonnes NumPy), voir lexifi_mkt_data_snapshot
+    start = perf_counter()
+    raw_conn = get_engine().raw_connection()
+    try:
+        cur = raw_conn.cursor()
+        snapshot = fetch_snapshot(cur, source_table, as_of, max_age_days=max_age_days)
+        cur.close()
+    finally:
+        raw_conn.close()
+    record_timing(f"snapshot_{source_table}", (perf_counter() - start) * 1000, len(snapshot["value"]))
+    return snapshot
+
+# ----------------------- RECHERCHE D'INSTRUMENTS -----------------------
+
+@st.cache_resource(max_entries=6)
+def build_cached_search_index(kind, source_table, data_version):
+    # Partagé entre sessions sans copie ; reconstruit quand la version de la table source change
+    names = fetch_asset_mapping()
+    if kind == "spot":
+        ids = connect_and_fetch_ids()
+        base_ids = ids
+    elif kind == "forward":
+        df = fetch_forward_ids(source_table)
+        ids, base_ids = df[FORWARD_ID].tolist(), df[FORWARD_BASE_ID].tolist()
+    else:
+        df = fetch_vol_ids()
+        ids, base_ids = df[VOL_ID_COL].tolist(), df[VOL_BASE_ID].tolist()
+    return build_search_index(ids, base_ids, [names.get(b, "Inconnu") for b in base_ids])
+
+def get_search_index(kind, source_table):
+    return build_cached_search_index(kind, source_table, table_versions((source_table,)))
+
+def asset_picker(index, key, label="Sélectionner un ou plusieurs IDs :"):
+    # Seuls la sélection courante et les meilleurs résultats de la recherche sont envoyés au navigateur
+    query = st.text_input(f"🔎 Rechercher par ID ou nom ({len(index['ids'])} instruments)", key=f"{key}_query")
+    selected = st.session_state.get(key, [])
+    options = list(dict.fromkeys(selected + search(index, query)))
+    return st.multiselect(label, options, key=key, format_func=lambda instrument_id: label_of(index, instrument_id))
+
+# ----------------------- EXPORT -----------------------
+
+# Table(s) source de chaque export, pour inclure leur version dans l'empreinte
+EXPORT_SOURCES = {
+    "spot": lambda tables: (TABLE_NAME,),
+    "forward": lambda tables: (tables["forward_table"],),
+    "vol": lambda tables: (VOL_TABLE,),
+    "vol_surface": lambda tables: (VOL_TABLE,),
+}
+
+def run_export(kind, params, fmt, fingerprint, **tables):
+    start = perf_counter()
+    raw_conn = get_engine().raw_connection()
+    try:
+        path = build_export(raw_conn, kind, params, fmt, fingerprint, **tables)
+    finally:
+        raw_conn.close()
+    record_timing(f"export_{kind}", (perf_counter() - start) * 1000, 0)
+    return path
+
+def render_export(kind, params, key, file_stem, **tables):
+    # Le fichier n'est construit qu'au clic, puis servi depuis le disque tant que la requête et les données sont inchangées
+    with st.expander("📁 Exporter les données"):
+        fmt = st.radio("Format", list(EXPORT_FORMATS), horizontal=True, key=f"{key}_format")
+        version = table_versions(EXPORT_SOURCES[kind](tables))
+        fingerprint = export_fingerprint(kind, params, fmt, version, **tables)
+        path = export_path(fingerprint, fmt)
+        if not path.exists() and st.button("Préparer le fichier", key=f"{key}_build"):
+            with st.spinner("Export en cours..."):
+                try:
+                    path = run_export(kind, params, fmt, fingerprint, **tables)
+                except Exception as e:
+                    st.error(f"❌ Export impossible : {e}")
+                    return
+        if path.exists():
+            extension, mime = EXPORT_FORMATS[fmt]
+            with open(path, "rb") as f:
+                st.download_button(f"📁 Télécharger ({fmt}, {path.stat().st_size / 1024 / 1024:.1f} Mo)", data=f, file_name=f"{file_stem}.{extension}", mime=mime, key=f"{key}_download")
@@ -1,21 +1,27 @@
 import os
 import re
 import json
-import math
 import gc
 import psycopg2
 import numpy as np
 from datetime import datetime
 from pathlib import Path
 from time import time
-from scipy.interpolate import PchipInterpolator, interp1d, LSQUnivariateSpline
+from itertools import groupby
 from psycopg2.extras import execute_values
+from lexifi_mkt_data_interpolation import interpolate_forward
+from lexifi_mkt_data_spot_index import resolve_growth_rows, print_metrics
+from lexifi_mkt_data_db_metadata import ensure_metadata_tables, catalog_empty, refresh_catalog, dates_empty, rebuild_available_dates, bump_data_version
+from lexifi_mkt_data_normalizer_io import file_changed, file_signature, keys_join, keys_params, replace_groups, ensure_source_counts_table, reset_source_counts, grouped_raw_query, copy_replace_groups, report_failed_groups
+from lexifi_mkt_data_snapshot import ensure_snapshot_index
 
 FOLDER = r"C:\\Users\\Simon\\Documents\\ArkeaAM\\VSCode\\Database\\lexifi_mkt_data"
 EXT = ".md"
 CACHE_DIR = Path(FOLDER) / "cache"
 CACHE_DIR.mkdir(exist_ok=True)
 CHUNK_SIZE = 500
+FETCH_SIZE = 50000  # lignes par aller-retour du curseur serveur (SOURCE = "db")
+FLUSH_GROUPS = 2000  # groupes (lexifi_id, date) accumulés avant écriture COPY
 
 DB_PARAMS = {
     "dbname": "lexifi_mkt_data",
@@ -25,8 +31,10 @@ DB_PARAMS = {
     "port": "5432"
 }
 
-RESET = True  # uniquement asset_forward_normalized
+RESET = False  # True : reconstruction complète de asset_forward_normalized
 INTERPOLATION_METHOD = "pchip"  # "pchip", "nspline", "linear" (fallback inclus)
+SOURCE = "files"  # "files" : relecture des .md, "db" : lecture de asset_forward (alimentée par lexifi_mkt_data_db_updater)
+RAW_TABLE = "asset_forward"
 
 TABLE_CONFIG = {
     "final": "asset_forward_normalized",
@@ -61,39 +69,10 @@ def parse_md_file(file_path):
                     data[key].append(line.replace(f"{key};", "", 1))
     return data
 
-def interpolate_forward(ttms, values):
-    grid = np.arange(1, 11)
-    try:
-        if INTERPOLATION_METHOD == "nspline" and len(ttms) >= 4:
-            try:
-                knots = np.linspace(ttms[1], ttms[-2], len(ttms) - 2)
-                spline = LSQUnivariateSpline(ttms, values, knots)
-                out = spline(grid)
-                if np.any(out <= 0):
-                    raise ValueError("Negative output")
-                return dict(zip(grid, out))
-            except Exception:
-                pass
-        if INTERPOLATION_METHOD in ["pchip", "nspline"]:
-            try:
-                interp = PchipInterpolator(ttms, values, extrapolate=True)
-                out = interp(grid)
-                if np.any(out <= 0):
-                    raise ValueError("Negative output")
-                return dict(zip(grid, out))
-            except Exception:
-                pass
-        fallback = interp1d(ttms, values, kind="linear", fill_value="extrapolate")
-        out = fallback(grid)
-        if np.any(out <= 0):
-            raise ValueError("Negative output")
-        return dict(zip(grid, out))
-    except Exception:
-        return {}
-
-def process_data(data):
-    forwards = {}
+def parse_growth_rows(data):
+    # Lignes en taux de croissance (lexifi_id, date, maturité, g) et spots du fichier
     spot_cache = {}
+    growth_rows = []
 
     for row in data["Asset_spot"]:
         parts = row.split(';')
@@ -108,7 +87,7 @@ def process_data(data):
             except Exception:
                 continue
 
-    for row in data["Asset_forward"]:
+    for row in data["Asset_forward_growth_rate"]:
         parts = row.split(';')
         if len(parts) >= 3:
             id_date = clean_id(parts[0])
@@ -119,11 +98,28 @@ def process_data(data):
             if len(lexifi_id) != 12:
                 continue
             date = datetime.strptime(parts[2], "%Y-%m-%d").date()
-            ttm = (datetime.strptime(maturity, "%Y-%m-%d").date() - date).days / 365
-            key = (lexifi_id, date)
-            forwards.setdefault(key, []).append((ttm, float(parts[1])))
+            maturity_date = datetime.strptime(maturity, "%Y-%m-%d").date()
+            if (maturity_date - date).days <= 0:
+                continue
+            growth_rows.append((lexifi_id, date, maturity_date, float(parts[1])))
 
-    for row in data["Asset_forward_growth_rate"]:
+    return growth_rows, spot_cache
+
+def resolve_growth_rates(files, cur, metrics):
+    # Passe préalable sur tous les fichiers à traiter : spot * exp(g*T) en un seul passage vectorisé,
+    # spot pris dans n'importe lequel de ces fichiers, sinon dans l'index asset_spot
+    growth_rows, spot_cache = [], {}
+    for file in files:
+        rows, spots = parse_growth_rows(parse_md_file(file))
+        growth_rows.extend(rows)
+        spot_cache.update(spots)
+    return resolve_growth_rows(growth_rows, spot_cache, cur, metrics)
+
+def process_data(data, resolved):
+    # resolved : forwards reconstruits par resolve_growth_rates
+    forwards = {}
+
+    for row in data["Asset_forward"]:
         parts = row.split(';')
         if len(parts) >= 3:
             id_date = clean_id(parts[0])
@@ -134,26 +130,46 @@ def process_data(data):
             if len(lexifi_id) != 12:
                 continue
             date = datetime.strptime(parts[2], "%Y-%m-%d").date()
-            maturity_date = datetime.strptime(maturity, "%Y-%m-%d").date()
-            T = (maturity_date - date).days / 365
-            if T <= 0:
-                continue
-            spot = spot_cache.get((lexifi_id, date))
-            if spot is None:
-                continue
-            fwd = spot * math.exp(float(parts[1]) * T)
-            forwards.setdefault((lexifi_id, date), []).append((T, fwd))
+            ttm = (datetime.strptime(maturity, "%Y-%m-%d").date() - date).days / 365
+            key = (lexifi_id, date)
+            forwards.setdefault(key, []).append((ttm, float(parts[1])))
+
+    growth_rows, _ = parse_growth_rows(data)
+    for key in growth_rows:
+        fwd = resolved.get(key)
+        if fwd is not None:
+            lexifi_id, date, maturity_date, _ = key
+            forwards.setdefault((lexifi_id, date), []).append(((maturity_date - date).days / 365, fwd))
+
+    return forwards
 
+def merge_raw_points(cur, groups):
+    # Un groupe peut être coté dans plusieurs fichiers : il est refait avec tous ses points de asset_forward,
+    # ceux du fichier courant priment à maturité égale
+    if not groups:
+        return groups
+    cur.execute(raw_quotes_query(keys_join("f")), keys_params(list(groups)))
+    merged = {}
+    for lexifi_id, date, ttm, fwd in cur.fetchall():
+        if ttm > 0:
+            merged.setdefault((lexifi_id, date), {})[round(float(ttm), 8)] = float(fwd)
+    for key, points in groups.items():
+        by_ttm = merged.setdefault(key, {})
+        for ttm, fwd in points:
+            by_ttm[round(ttm, 8)] = fwd
+    return {key: list(by_ttm.items()) for key, by_ttm in merged.items()}
+
+def normalize_groups(groups):
     normalized = []
-    for (lexifi_id, date), points in forwards.items():
-        points.sort()
-        ttms, values = zip(*points)
-        curve = interpolate_forward(np.array(ttms), np.array(values))
-        for ttm_year, price in curve.items():
-            forward_id = f"{lexifi_id} {ttm_year}Y"
-            normalized.append((lexifi_id, forward_id, round(float(price), 6), date))
+    for (lexifi_id, date), points in groups.items():
+        normalized.extend(normalize_group(lexifi_id, date, points))
+    return normalized, list(groups)
 
-    return normalized
+def normalize_group(lexifi_id, date, points):
+    points = sorted(points)
+    ttms, values = zip(*points)
+    curve = interpolate_forward(np.array(ttms), np.array(values), INTERPOLATION_METHOD)
+    return [(lexifi_id, f"{lexifi_id} {ttm_year}Y", round(float(price), 6), date) for ttm_year, price in curve.items()]
 
 def chunked_insert(cur, rows):
     total = len(rows)
@@ -170,6 +186,90 @@ def chunked_insert(cur, rows):
         if i % (CHUNK_SIZE * 10) == 0 or i + CHUNK_SIZE >= total:
             print(f"      ✅ {min(i + CHUNK_SIZE, total)} / {total}")
 
+def raw_quotes_query(join="", extra_filter=""):
+    return f"""
+        SELECT f.lexifi_id, f.lexifi_date,
+               (split_part(f.lexifi_forward_id, ' ', 2)::date - f.lexifi_date) / 365.0 AS ttm,
+               f.lexifi_forward
+        FROM {RAW_TABLE} f
+        {join}
+        WHERE length(f.lexifi_id) = 12
+          AND split_part(f.lexifi_forward_id, ' ', 2) ~ '^\\d{{4}}-\\d{{2}}-\\d{{2}}$'
+          AND f.lexifi_forward IS NOT NULL
+          {extra_filter}
+    """
+
+def stream_raw_groups(read_conn, only_changed):
+    # (lexifi_id, date, points, raw_count) ; points vide si aucune maturité exploitable (lignes normalisées supprimées)
+    query = grouped_raw_query(raw_quotes_query(), only_changed)
+    cur = read_conn.cursor(name="fwd_normalized_stream")
+    cur.itersize = FETCH_SIZE
+    cur.execute(query, {"source_table": TABLE_CONFIG["final"]})
+    for (lexifi_id, date), group in groupby(cur, key=lambda r: (r[0], r[1])):
+        group = list(group)
+        points = [(float(ttm), float(fwd)) for _, _, ttm, fwd, _ in group if ttm > 0]
+        yield lexifi_id, date, points, group[0][-1]
+    cur.close()
+
+def normalize_from_db(conn, only_changed, touched, failed):
+    print(f"\n🔄 ASSET_FORWARD_NORMALIZED : lecture de {RAW_TABLE} (curseur serveur, {FETCH_SIZE} lignes / lot)")
+    read_conn = psycopg2.connect(**DB_PARAMS)
+    total_inserted = 0
+    total_groups = 0
+    groups, rows = [], []
+    try:
+        for lexifi_id, date, points, raw_count in stream_raw_groups(read_conn, only_changed):
+            groups.append((lexifi_id, date, raw_count))
+            if points:
+                rows.extend(normalize_group(lexifi_id, date, points))
+            if len(groups) >= FLUSH_GROUPS:
+                if copy_replace_groups(conn, TABLE_CONFIG, groups, rows):
+                    total_inserted += len(rows)
+                    total_groups += len(groups)
+                    touched.update(lexifi_id for lexifi_id, _, _ in groups)
+                else:
+                    failed.extend((lexifi_id, date) for lexifi_id, date, _ in groups)
+                groups, rows = [], []
+        if copy_replace_groups(conn, TABLE_CONFIG, groups, rows):
+            total_inserted += len(rows)
+            total_groups += len(groups)
+            touched.update(lexifi_id for lexifi_id, _, _ in groups)
+        else:
+            failed.extend((lexifi_id, date) for lexifi_id, date, _ in groups)
+    finally:
+        read_conn.close()
+    print(f"   ✅ {total_groups} groupe(s) normalisé(s)")
+    return total_inserted
+
+def normalize_from_files(conn, cur, cache, touched, failed):
+    files = sorted(Path(FOLDER).glob(f"*{EXT}"), key=os.path.getmtime)
+    new_files = [f for f in files if file_changed(f, cache.get(f.name))]
+
+    print(f"\n🔄 ASSET_FORWARD_NORMALIZED : {len(new_files)} fichier(s) nouveau(x) ou modifié(s) à traiter")
+    total_inserted = 0
+    growth_metrics = {}
+    resolved = resolve_growth_rates(new_files, cur, growth_metrics)
+
+    for idx, file in enumerate(new_files, 1):
+        print(f"[{idx}/{len(new_files)}] {file.name}")
+        parsed = parse_md_file(file)
+        groups = merge_raw_points(cur, process_data(parsed, resolved))
+        rows, keys = normalize_groups(groups)
+        if RESET:
+            chunked_insert(cur, rows)
+        elif not replace_groups(conn, TABLE_CONFIG, keys, rows):
+            # Fichier non marqué dans le cache : ses groupes seront retentés au prochain lancement
+            failed.extend(keys)
+            continue
+        total_inserted += len(rows)
+        touched.update(lexifi_id for lexifi_id, _ in keys)
+        cache[file.name] = file_signature(file)
+        save_file_cache(cache)
+        gc.collect()
+
+    print_metrics(growth_metrics, "ASSET_FORWARD_NORMALIZED")
+    return total_inserted
+
 def main():
     start = time()
     conn = psycopg2.connect(**DB_PARAMS)
@@ -177,33 +277,39 @@ def main():
     cur = conn.cursor()
 
     cache = load_file_cache()
-    files = sorted(Path(FOLDER).glob(f"*{EXT}"), key=os.path.getmtime)
-    new_files = [f for f in files if f.name not in cache or RESET]
+    ensure_metadata_tables(cur)
+    ensure_source_counts_table(cur)
+    final = TABLE_CONFIG["final"]
+    ensure_snapshot_index(cur, final)
+    rebuild_dates = RESET or dates_empty(cur, final)
 
     if RESET:
         print(f"♻️  RESET demandé pour asset_forward_normalized...")
         json_path = CACHE_DIR / "checksums_forward_normalized.json"
         if json_path.exists():
             os.remove(json_path)
+        cache = {}
         cur.execute(f"DELETE FROM {TABLE_CONFIG['final']};")
+        reset_source_counts(cur, final)
         cur.execute(f"VACUUM ANALYZE {TABLE_CONFIG['final']};")
         cur.execute(f"REINDEX TABLE {TABLE_CONFIG['final']};")
 
-    print(f"\n🔄 ASSET_FORWARD_NORMALIZED : {len(new_files)} fichier(s) à traiter")
-    total_inserted = 0
+    touched = set()
+    failed = []
+    if SOURCE == "db":
+        total_inserted = normalize_from_db(conn, only_changed=not RESET, touched=touched, failed=failed)
+    else:
+        total_inserted = normalize_from_files(conn, cur, cache, touched, failed)
 
-    for idx, file in enumerate(new_files, 1):
-        print(f"[{idx}/{len(new_files)}] {file.name}")
-        parsed = parse_md_file(file)
-        rows = process_data(parsed)
-        chunked_insert(cur, rows)
-        total_inserted += len(rows)
-        cache[file.name] = datetime.now().isoformat()
-        save_file_cache(cache)
-        gc.collect()
+    refresh_catalog(conn, final, None if RESET or catalog_empty(cur, final) else touched)
+    if rebuild_dates:
+        rebuild_available_dates(conn, final)
+    if touched or RESET:
+        bump_data_version(cur, final)
 
     cur.close()
     conn.close()
+    report_failed_groups(failed, "ASSET_FORWARD_NORMALIZED")
     print(f"\n✅ Script terminé : {total_inserted} ligne(s) injectée(s) en {round(time() - start, 2)} secondes")
 
 if __name__ == "__main__":
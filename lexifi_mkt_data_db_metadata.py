@@ -0,0 +1,178 @@
+from psycopg2.extras import execute_values
+
+CATALOG_TABLE = "instrument_catalog"
+DATES_TABLE = "date_availability"
+VERSION_TABLE = "data_version"
+VERSION_CHANNEL = "data_version"
+
+# Tables de données suivies dans le catalogue : type d'instrument, colonne identifiant, colonne valeur
+CATALOG_SOURCES = {
+    "asset_spot": {"type": "spot", "key": "lexifi_id", "value": "lexifi_spot"},
+    "asset_forward": {"type": "forward", "key": "lexifi_forward_id", "value": "lexifi_forward"},
+    "asset_forward_normalized": {"type": "forward", "key": "lexifi_forward_id", "value": "lexifi_forward"},
+    "asset_volatility": {"type": "vol", "key": "lexifi_vol_id", "value": "lexifi_vol"},
+    "asset_volatility_normalized": {"type": "vol", "key": "lexifi_vol_id", "value": "lexifi_vol"},
+}
+BASE_COL = "lexifi_id"
+DATE_COL = "lexifi_date"
+
+def ensure_metadata_tables(cur):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CATALOG_TABLE} (
+            source_table TEXT NOT NULL,
+            instrument_id TEXT NOT NULL,
+            instrument_type TEXT NOT NULL,
+            base_id TEXT NOT NULL,
+            first_date DATE NOT NULL,
+            last_date DATE NOT NULL,
+            n_points BIGINT NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT now(),
+            PRIMARY KEY (source_table, instrument_id)
+        )
+    """)
+    cur.execute(f"CREATE INDEX IF NOT EXISTS {CATALOG_TABLE}_base_idx ON {CATALOG_TABLE} (source_table, base_id)")
+    # Dates d'observation disponibles par sous-jacent : la PK sert directement les sélecteurs de date (index-only scan)
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {DATES_TABLE} (
+            source_table TEXT NOT NULL,
+            base_id TEXT NOT NULL,
+            obs_date DATE NOT NULL,
+            PRIMARY KEY (source_table, base_id, obs_date)
+        )
+    """)
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+            source_table TEXT PRIMARY KEY,
+            version BIGINT NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT now()
+        )
+    """)
+
+def catalog_empty(cur, source_table):
+    cur.execute(f"SELECT NOT EXISTS (SELECT 1 FROM {CATALOG_TABLE} WHERE source_table = %s)", (source_table,))
+    return cur.fetchone()[0]
+
+def insert_with_catalog(cur, source_table, columns, rows, page_size=100):
+    # Insertion (ON CONFLICT DO NOTHING) et mise à jour incrémentale du catalogue dans la même requête :
+    # seules les lignes réellement insérées sont agrégées, l'historique existant n'est pas relu
+    source = CATALOG_SOURCES[source_table]
+    execute_values(cur, f"""
+        WITH inserted AS (
+            INSERT INTO {source_table} ({', '.join(columns)}) VALUES %s
+            ON CONFLICT DO NOTHING
+            RETURNING {source['key']} AS instrument_id, {BASE_COL} AS base_id, {DATE_COL} AS obs_date, {source['value']} AS obs_value
+        )
+        INSERT INTO {CATALOG_TABLE} AS c (source_table, instrument_id, instrument_type, base_id, first_date, last_date, n_points)
+        SELECT '{source_table}', instrument_id, '{source['type']}', base_id, MIN(obs_date), MAX(obs_date), COUNT(*)
+        FROM inserted
+        WHERE obs_value IS NOT NULL
+        GROUP BY instrument_id, base_id
+        ON CONFLICT (source_table, instrument_id) DO UPDATE
+        SET first_date = LEAST(c.first_date, EXCLUDED.first_date),
+            last_date = GREATEST(c.last_date, EXCLUDED.last_date),
+            n_points = c.n_points + EXCLUDED.n_points,
+            updated_at = now()
+    """, rows, page_size=page_size)
+
+def refresh_catalog(conn, source_table, base_ids=None):
+    # Recalcul complet sur l'historique : base_ids = sous-jacents dont des groupes ont été remplacés (normaliseurs),
+    # None = reconstruction complète de la table source. Les ajouts simples passent par insert_with_catalog.
+    if base_ids is not None and not base_ids:
+        return True
+    source = CATALOG_SOURCES[source_table]
+    catalog_filter = "" if base_ids is None else "AND base_id = ANY(%(base_ids)s)"
+    source_filter = "" if base_ids is None else f"AND {BASE_COL} = ANY(%(base_ids)s)"
+    params = {"source_table": source_table, "instrument_type": source["type"], "base_ids": None if base_ids is None else sorted(base_ids)}
+    label = "complet" if base_ids is None else f"{len(params['base_ids'])} actif(s)"
+    print(f"🗂️  Catalogue {source_table} ({label})...")
+    conn.autocommit = False
+    try:
+        with conn.cursor() as cur:
+            ensure_metadata_tables(cur)
+            cur.execute(f"""
+                DELETE FROM {CATALOG_TABLE}
+                WHERE source_table = %(source_table)s {catalog_filter}
+            """, params)
+            cur.execute(f"""
+                INSERT INTO {CATALOG_TABLE} (source_table, instrument_id, instrument_type, base_id, first_date, last_date, n_points)
+                SELECT %(source_table)s, {source['key']}, %(instrument_type)s, {BASE_COL}, MIN({DATE_COL}), MAX({DATE_COL}), COUNT(*)
+                FROM {source_table}
+                WHERE {source['value']} IS NOT NULL {source_filter}
+                GROUP BY {source['key']}, {BASE_COL}
+            """, params)
+            n_instruments = cur.rowcount
+        conn.commit()
+        print(f"   ✅ {n_instruments} instrument(s) catalogué(s)")
+        return True
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Erreur lors de la mise à jour du catalogue, transaction annulée : {e}")
+        return False
+    finally:
+        conn.autocommit = True
+
+# ----------------------- DATES DISPONIBLES -----------------------
+
+def dates_empty(cur, source_table):
+    cur.execute(f"SELECT NOT EXISTS (SELECT 1 FROM {DATES_TABLE} WHERE source_table = %s)", (source_table,))
+    return cur.fetchone()[0]
+
+def add_available_dates(cur, source_table, rows):
+    # rows : lignes de la table source, lexifi_id en 1re colonne et lexifi_date en dernière
+    values = [(source_table, lexifi_id, date) for lexifi_id, date in sorted({(row[0], row[-1]) for row in rows})]
+    if not values:
+        return
+    execute_values(cur, f"""
+        INSERT INTO {DATES_TABLE} (source_table, base_id, obs_date) VALUES %s
+        ON CONFLICT DO NOTHING
+    """, values)
+
+def add_available_dates_from(cur, source_table, rows_table):
+    cur.execute(f"""
+        INSERT INTO {DATES_TABLE} (source_table, base_id, obs_date)
+        SELECT DISTINCT %s, {BASE_COL}, {DATE_COL} FROM {rows_table}
+        ON CONFLICT DO NOTHING
+    """, (source_table,))
+
+def rebuild_available_dates(conn, source_table):
+    source = CATALOG_SOURCES[source_table]
+    print(f"📅 Dates disponibles {source_table} (reconstruction complète)...")
+    conn.autocommit = False
+    try:
+        with conn.cursor() as cur:
+            ensure_metadata_tables(cur)
+            cur.execute(f"DELETE FROM {DATES_TABLE} WHERE source_table = %s", (source_table,))
+            cur.execute(f"""
+                INSERT INTO {DATES_TABLE} (source_table, base_id, obs_date)
+                SELECT DISTINCT %s, {BASE_COL}, {DATE_COL} FROM {source_table}
+                WHERE {source['value']} IS NOT NULL
+            """, (source_table,))
+            n_dates = cur.rowcount
+        conn.commit()
+        print(f"   ✅ {n_dates} couple(s) (actif, date)")
+        return True
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Erreur lors de la reconstruction des dates, transaction annulée : {e}")
+        return False
+    finally:
+        conn.autocommit = True
+
+# ----------------------- VERSIONS DE DONNÉES -----------------------
+
+def current_data_version(cur, source_table):
+    cur.execute(f"SELECT version FROM {VERSION_TABLE} WHERE source_table = %s", (source_table,))
+    row = cur.fetchone()
+    return 0 if row is None else row[0]
+
+def bump_data_version(cur, source_table):
+    # À appeler en fin d'ingestion, une fois les tables dérivées à jour : les dashboards invalident leurs caches pour cette table
+    cur.execute(f"""
+        INSERT INTO {VERSION_TABLE} (source_table, version) VALUES (%s, 1)
+        ON CONFLICT (source_table) DO UPDATE SET version = {VERSION_TABLE}.version + 1, updated_at = now()
+        RETURNING version
+    """, (source_table,))
+    version = cur.fetchone()[0]
+    cur.execute("SELECT pg_notify(%s, %s)", (VERSION_CHANNEL, f"{source_table}:{version}"))
+    print(f"🔖 {source_table} : version {version}")
+    return version
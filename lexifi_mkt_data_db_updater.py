@@ -1,13 +1,16 @@
 import os
 import re
 import json
-import math
 import gc
 import psycopg2
-from psycopg2.extras import execute_values
 from datetime import datetime
 from pathlib import Path
 from time import time
+from lexifi_mkt_data_spot_index import resolve_growth_rows, print_metrics
+from lexifi_mkt_data_spot_stats import YEARLY_TABLE, STATS_TABLE, ensure_stats_tables, stats_table_empty, refresh_spot_stats
+from lexifi_mkt_data_db_metadata import ensure_metadata_tables, catalog_empty, refresh_catalog, insert_with_catalog, dates_empty, add_available_dates, rebuild_available_dates, current_data_version, bump_data_version
+from lexifi_mkt_data_spot_matrix import sync_spot_matrix
+from lexifi_mkt_data_snapshot import SNAPSHOT_TABLES, ensure_snapshot_index
 
 FOLDER = r"C:\\Users\\Simon\\Documents\\ArkeaAM\\VSCode\\Database\\lexifi_mkt_data"
 EXT = ".md"
@@ -77,6 +80,11 @@ def save_file_cache(table, cache):
     with open(path, "w", encoding="utf-8") as f:
         json.dump(cache, f, indent=2)
 
+def save_metrics(table, metrics):
+    path = CACHE_DIR / f"metrics_{table}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"run": datetime.now().isoformat(), **metrics}, f, indent=2)
+
 def parse_md_file(file_path):
     data = {
         "Asset_spot": [],
@@ -95,6 +103,7 @@ def parse_md_file(file_path):
     return data
 
 def chunked_insert(cur, rows, table_config):
+    # Catalogue des instruments mis à jour avec les seules lignes insérées (même requête)
     columns = table_config["columns"]
     final = table_config["final"]
     total = len(rows)
@@ -103,14 +112,20 @@ def chunked_insert(cur, rows, table_config):
     print(f"   ↪ À injecter : {total} dans {final}")
     for i in range(0, total, CHUNK_SIZE):
         chunk = rows[i:i + CHUNK_SIZE]
-        query = f"INSERT INTO {final} ({', '.join(columns)}) VALUES %s ON CONFLICT DO NOTHING"
         try:
-            execute_values(cur, query, chunk)
+            insert_with_catalog(cur, final, columns, chunk)
         except Exception as e:
             print(f"❌ Erreur à l'injection du chunk {i}-{i+CHUNK_SIZE}: {e}")
         if i % (CHUNK_SIZE * 10) == 0 or i + CHUNK_SIZE >= total:
             print(f"      ✅ {min(i + CHUNK_SIZE, total)} / {total}")
 
+def mark_touched(rows, touched):
+    # lexifi_id (1re colonne) -> première année modifiée (date en dernière colonne)
+    for row in rows:
+        lexifi_id, year = row[0], row[-1].year
+        if lexifi_id not in touched or year < touched[lexifi_id]:
+            touched[lexifi_id] = year
+
 def process_and_insert(table, cur):
     cache = load_file_cache(table)
     files = sorted(Path(FOLDER).glob(f"*{EXT}"), key=os.path.getmtime)
@@ -119,21 +134,30 @@ def process_and_insert(table, cur):
 
     print(f"\n🔄 {table.upper()} : {total_files} fichier(s) à traiter")
     total_inserted = 0
+    growth_metrics = {}
+    touched = {}
+    resolved = resolve_growth_rates(new_files, cur, growth_metrics) if table == "forward" else {}
 
     for idx, file in enumerate(new_files, 1):
         print(f"[{idx}/{total_files}] {file.name}")
         parsed = parse_md_file(file)
-        rows_spot, rows_forward, rows_vol = process_data([parsed])
+        rows_spot, rows_forward, rows_vol = process_data([parsed], resolved)
 
         if table == "spot":
             chunked_insert(cur, rows_spot, TABLES["spot"])
+            add_available_dates(cur, TABLES["spot"]["final"], rows_spot)
             total_inserted += len(rows_spot)
+            mark_touched(rows_spot, touched)
         elif table == "forward":
             chunked_insert(cur, rows_forward, TABLES["forward"])
+            add_available_dates(cur, TABLES["forward"]["final"], rows_forward)
             total_inserted += len(rows_forward)
+            mark_touched(rows_forward, touched)
         elif table == "vol":
             chunked_insert(cur, rows_vol, TABLES["vol"])
+            add_available_dates(cur, TABLES["vol"]["final"], rows_vol)
             total_inserted += len(rows_vol)
+            mark_touched(rows_vol, touched)
 
         cache[file.name] = datetime.now().isoformat()
         save_file_cache(table, cache)
@@ -141,10 +165,43 @@ def process_and_insert(table, cur):
         del parsed, rows_spot, rows_forward, rows_vol
         gc.collect()
 
+    if growth_metrics:
+        print_metrics(growth_metrics, table.upper())
+        save_metrics(table, growth_metrics)
     print(f"✅ {table.upper()} terminé : {total_inserted} ligne(s) injectée(s)")
+    return touched
 
-def process_data(all_data):
+def parse_growth_rows(data):
+    # Lignes en taux de croissance (lexifi_id, date, maturité, g, maturité brute) et spots du fichier
     spot_dict = {}
+    growth_rows = []
+    for row in data["Asset_spot"]:
+        parts = row.split(';')
+        if len(parts) >= 3:
+            spot_dict[(parts[0], datetime.strptime(parts[2], "%Y-%m-%d").date())] = float(parts[1])
+    for row in data["Asset_forward_growth_rate"]:
+        parts = row.split(';')
+        if len(parts) >= 3:
+            id_date = clean_id(parts[0])
+            lexifi_id, maturity = id_date.split()
+            growth_rate = float(parts[1])
+            date = datetime.strptime(parts[2], "%Y-%m-%d").date()
+            maturity_date = datetime.strptime(maturity, "%Y-%m-%d").date()
+            growth_rows.append((lexifi_id, date, maturity_date, growth_rate, maturity))
+    return growth_rows, spot_dict
+
+def resolve_growth_rates(files, cur, metrics):
+    # Passe préalable sur tous les fichiers à traiter : spot * exp(g*T) en un seul passage vectorisé,
+    # spot pris dans n'importe lequel de ces fichiers, sinon dans l'index asset_spot
+    growth_rows, spot_dict = [], {}
+    for file in files:
+        rows, spots = parse_growth_rows(parse_md_file(file))
+        growth_rows.extend(rows)
+        spot_dict.update(spots)
+    return resolve_growth_rows(growth_rows, spot_dict, cur, metrics)
+
+def process_data(all_data, resolved=None):
+    # resolved : forwards en taux de croissance reconstruits par resolve_growth_rates (None : lignes ignorées)
     rows_spot = []
     rows_forward = []
     rows_vol = []
@@ -157,7 +214,6 @@ def process_data(all_data):
                 spot = float(parts[1])
                 date = datetime.strptime(parts[2], "%Y-%m-%d").date()
                 rows_spot.append((lexifi_id, spot, date))
-                spot_dict[(lexifi_id, date)] = spot
 
         for row in data["Asset_forward"]:
             parts = row.split(';')
@@ -169,20 +225,13 @@ def process_data(all_data):
                 date = datetime.strptime(parts[2], "%Y-%m-%d").date()
                 rows_forward.append((lexifi_id, forward_id, forward_val, date))
 
-        for row in data["Asset_forward_growth_rate"]:
-            parts = row.split(';')
-            if len(parts) >= 3:
-                id_date = clean_id(parts[0])
-                lexifi_id, maturity = id_date.split()
-                growth_rate = float(parts[1])
-                date = datetime.strptime(parts[2], "%Y-%m-%d").date()
-                maturity_date = datetime.strptime(maturity, "%Y-%m-%d").date()
-                T = (maturity_date - date).days / 365
-                spot = spot_dict.get((lexifi_id, date))
-                if spot:
-                    forward_val = spot * math.exp(growth_rate * T)
-                    forward_id = f"{lexifi_id} {maturity}"
-                    rows_forward.append((lexifi_id, forward_id, round(forward_val, 6), date))
+        if resolved:
+            growth_rows, _ = parse_growth_rows(data)
+            for lexifi_id, date, maturity_date, growth_rate, maturity in growth_rows:
+                forward_val = resolved.get((lexifi_id, date, maturity_date, growth_rate))
+                if forward_val is None:
+                    continue
+                rows_forward.append((lexifi_id, f"{lexifi_id} {maturity}", round(forward_val, 6), date))
 
         for row in data["Asset_volatility"]:
             parts = row.split(';')
@@ -216,8 +265,35 @@ def main():
                 os.remove(cache_path)
             cur.execute(f"DELETE FROM {TABLES[table]['final']};")
             vacuum_and_reindex_table(cur, TABLES[table]['final'])
+            if table == "spot":
+                ensure_stats_tables(cur)
+                cur.execute(f"DELETE FROM {YEARLY_TABLE};")
+                cur.execute(f"DELETE FROM {STATS_TABLE};")
 
-        process_and_insert(table, cur)
+        ensure_metadata_tables(cur)
+        final = TABLES[table]["final"]
+        if final in SNAPSHOT_TABLES.values():
+            ensure_snapshot_index(cur, final)
+        rebuild_dates = RESET[table] or dates_empty(cur, final)
+        rebuild_catalog = RESET[table] or catalog_empty(cur, final)
+        touched = process_and_insert(table, cur)
+
+        # Statistiques de perf / vol précalculées pour le dashboard : seules les années touchées sont recalculées
+        if table == "spot":
+            ensure_stats_tables(cur)
+            refresh_spot_stats(conn, None if stats_table_empty(cur) else touched)
+
+        # Catalogue des instruments : tenu à jour à l'insertion, recalcul complet seulement après un RESET ou s'il était vide
+        if rebuild_catalog:
+            refresh_catalog(conn, final)
+        if rebuild_dates:
+            rebuild_available_dates(conn, final)
+        previous_version = current_data_version(cur, final)
+        version = bump_data_version(cur, final) if touched or RESET[table] else previous_version
+
+        # Matrice dates x actifs mappée en mémoire pour les calculs multi-actifs, alignée sur la version publiée
+        if table == "spot":
+            sync_spot_matrix(conn, version, None if RESET[table] else touched, previous_version)
 
     if DO_VACUUM:
         for conf in TABLES.values():
@@ -4,18 +4,24 @@ import json
 import math
 import gc
 import psycopg2
-import numpy as np
 from datetime import datetime
 from pathlib import Path
 from time import time
-from scipy.interpolate import CloughTocher2DInterpolator, LinearNDInterpolator
+from itertools import groupby
 from psycopg2.extras import execute_values
+from lexifi_mkt_data_interpolation import GRID_STRIKES, GRID_TTMS, interpolate_surface
+from lexifi_mkt_data_vol_surface import ensure_surface_tables, get_grid_id, replace_surfaces, copy_surfaces, SURFACE_TABLE
+from lexifi_mkt_data_db_metadata import ensure_metadata_tables, catalog_empty, refresh_catalog, dates_empty, rebuild_available_dates, bump_data_version
+from lexifi_mkt_data_normalizer_io import file_changed, file_signature, keys_join, keys_params, replace_groups, ensure_source_counts_table, reset_source_counts, grouped_raw_query, copy_replace_groups, report_failed_groups
+from lexifi_mkt_data_snapshot import ensure_snapshot_index
 
 FOLDER = r"C:\\Users\\Simon\\Documents\\ArkeaAM\\VSCode\\Database\\lexifi_mkt_data"
 EXT = ".md"
 CACHE_DIR = Path(FOLDER) / "cache"
 CACHE_DIR.mkdir(exist_ok=True)
 CHUNK_SIZE = 500
+FETCH_SIZE = 50000  # lignes par aller-retour du curseur serveur (SOURCE = "db")
+FLUSH_GROUPS = 500  # surfaces (lexifi_id, date) accumulées avant écriture COPY
 
 DB_PARAMS = {
     "dbname": "lexifi_mkt_data",
@@ -25,8 +31,11 @@ DB_PARAMS = {
     "port": "5432"
 }
 
-RESET = True
+RESET = False  # True : reconstruction complète de asset_volatility_normalized
 INTERPOLATION_METHOD = "clough"  # "clough", "linear"
+SOURCE = "files"  # "files" : relecture des .md, "db" : lecture de asset_volatility (alimentée par lexifi_mkt_data_db_updater)
+RAW_TABLE = "asset_volatility"
+WRITE_SURFACE_TABLE = True  # écrit aussi asset_volatility_surface (une ligne real[] par lexifi_id, date)
 
 TABLE_CONFIG = {
     "final": "asset_volatility_normalized",
@@ -69,30 +78,6 @@ def format_strike(value):
             return None
     return None
 
-def interpolate_surface(strikes, ttms, values):
-    grid_strikes = np.arange(40.0, 161.0, 10.0)  # 40%, 50%, ..., 160%
-    grid_ttms = np.arange(1, 11)  # 1Y to 10Y
-    points = np.array(list(zip(ttms, strikes)))
-    values = np.array(values)
-    try:
-        if INTERPOLATION_METHOD == "clough":
-            interpolator = CloughTocher2DInterpolator(points, values)
-        elif INTERPOLATION_METHOD == "linear":
-            interpolator = LinearNDInterpolator(points, values)
-        else:
-            raise ValueError("Méthode d'interpolation inconnue")
-
-        surface = {}
-        for ttm in grid_ttms:
-            for strike in grid_strikes:
-                vol = interpolator(ttm, strike)
-                if np.isnan(vol) or vol <= 0:
-                    continue
-                surface[(ttm, strike)] = round(float(vol), 6)
-        return surface
-    except Exception:
-        return {}
-
 def process_data(data):
     vols_by_id_date = {}
 
@@ -121,15 +106,38 @@ def process_data(data):
             except Exception:
                 continue
 
+    return vols_by_id_date
+
+def merge_raw_points(cur, groups):
+    # Une surface peut être cotée dans plusieurs fichiers : elle est refaite avec tous ses points de asset_volatility,
+    # ceux du fichier courant priment à (maturité, strike) égaux
+    if not groups:
+        return groups
+    cur.execute(raw_quotes_query(keys_join("v")), keys_params(list(groups)))
+    merged = {}
+    for lexifi_id, date, ttm, strike, vol in cur.fetchall():
+        if ttm > 0:
+            merged.setdefault((lexifi_id, date), {})[(round(float(ttm), 8), round(strike, 4))] = float(vol)
+    for key, records in groups.items():
+        by_point = merged.setdefault(key, {})
+        for ttm, strike, vol in records:
+            by_point[(round(ttm, 8), strike)] = vol
+    return {key: [(ttm, strike, vol) for (ttm, strike), vol in by_point.items()] for key, by_point in merged.items()}
+
+def normalize_groups(groups):
     normalized = []
-    for (lexifi_id, date), records in vols_by_id_date.items():
-        ttms, strikes, vols = zip(*records)
-        surface = interpolate_surface(strikes, ttms, vols)
-        for (ttm, strike), vol in surface.items():
-            vol_id = f"{lexifi_id} {ttm}Y {strike:.2f}%"
-            normalized.append((lexifi_id, vol_id, vol, date))
+    surfaces = []
+    for (lexifi_id, date), records in groups.items():
+        rows, surface = normalize_group(lexifi_id, date, records)
+        normalized.extend(rows)
+        surfaces.append((lexifi_id, date, surface))
+    return normalized, list(groups), surfaces
 
-    return normalized
+def normalize_group(lexifi_id, date, records):
+    ttms, strikes, vols = zip(*records)
+    surface = interpolate_surface(strikes, ttms, vols, INTERPOLATION_METHOD)
+    rows = [(lexifi_id, f"{lexifi_id} {ttm}Y {strike:.2f}%", vol, date) for (ttm, strike), vol in surface.items()]
+    return rows, surface
 
 def chunked_insert(cur, rows):
     total = len(rows)
@@ -146,6 +154,101 @@ def chunked_insert(cur, rows):
         if i % (CHUNK_SIZE * 10) == 0 or i + CHUNK_SIZE >= total:
             print(f"      ✅ {min(i + CHUNK_SIZE, total)} / {total}")
 
+def raw_quotes_query(join="", extra_filter=""):
+    # % doublés : requête exécutée avec paramètres
+    return f"""
+        SELECT v.lexifi_id, v.lexifi_date,
+               (split_part(v.lexifi_vol_id, ' ', 2)::date - v.lexifi_date) / 365.0 AS ttm,
+               rtrim(split_part(v.lexifi_vol_id, ' ', 3), '%%')::float AS strike,
+               v.lexifi_vol
+        FROM {RAW_TABLE} v
+        {join}
+        WHERE length(v.lexifi_id) = 12
+          AND split_part(v.lexifi_vol_id, ' ', 2) ~ '^\\d{{4}}-\\d{{2}}-\\d{{2}}$'
+          AND split_part(v.lexifi_vol_id, ' ', 3) ~ '^-?[0-9.]+%%$'
+          AND v.lexifi_vol IS NOT NULL
+          {extra_filter}
+    """
+
+def stream_raw_groups(read_conn, only_changed):
+    # (lexifi_id, date, records, raw_count) ; records vide si aucun point exploitable (lignes normalisées supprimées)
+    query = grouped_raw_query(raw_quotes_query(), only_changed)
+    cur = read_conn.cursor(name="vol_normalized_stream")
+    cur.itersize = FETCH_SIZE
+    cur.execute(query, {"source_table": TABLE_CONFIG["final"]})
+    for (lexifi_id, date), group in groupby(cur, key=lambda r: (r[0], r[1])):
+        group = list(group)
+        records = [(float(ttm), round(strike, 4), float(vol)) for _, _, ttm, strike, vol, _ in group if ttm > 0]
+        yield lexifi_id, date, records, group[0][-1]
+    cur.close()
+
+def normalize_from_db(conn, only_changed, touched, failed):
+    print(f"\n🔄 ASSET_VOLATILITY_NORMALIZED : lecture de {RAW_TABLE} (curseur serveur, {FETCH_SIZE} lignes / lot)")
+    read_conn = psycopg2.connect(**DB_PARAMS)
+    total_inserted = 0
+    total_groups = 0
+    groups, rows, surfaces = [], [], []
+
+    def write_surfaces(cur, keys_table):
+        copy_surfaces(cur, keys_table, surfaces, GRID_TTMS, GRID_STRIKES)
+
+    write_extra = write_surfaces if WRITE_SURFACE_TABLE else None
+    try:
+        for lexifi_id, date, records, raw_count in stream_raw_groups(read_conn, only_changed):
+            groups.append((lexifi_id, date, raw_count))
+            if records:
+                group_rows, surface = normalize_group(lexifi_id, date, records)
+                rows.extend(group_rows)
+                surfaces.append((lexifi_id, date, surface))
+            if len(groups) >= FLUSH_GROUPS:
+                if copy_replace_groups(conn, TABLE_CONFIG, groups, rows, write_extra):
+                    total_inserted += len(rows)
+                    total_groups += len(groups)
+                    touched.update(lexifi_id for lexifi_id, _, _ in groups)
+                else:
+                    failed.extend((lexifi_id, date) for lexifi_id, date, _ in groups)
+                groups, rows = [], []
+                surfaces.clear()
+        if copy_replace_groups(conn, TABLE_CONFIG, groups, rows, write_extra):
+            total_inserted += len(rows)
+            total_groups += len(groups)
+            touched.update(lexifi_id for lexifi_id, _, _ in groups)
+        else:
+            failed.extend((lexifi_id, date) for lexifi_id, date, _ in groups)
+    finally:
+        read_conn.close()
+    print(f"   ✅ {total_groups} groupe(s) normalisé(s)")
+    return total_inserted
+
+def normalize_from_files(conn, cur, cache, touched, failed):
+    files = sorted(Path(FOLDER).glob(f"*{EXT}"), key=os.path.getmtime)
+    new_files = [f for f in files if file_changed(f, cache.get(f.name))]
+
+    print(f"\n🔄 ASSET_VOLATILITY_NORMALIZED : {len(new_files)} fichier(s) nouveau(x) ou modifié(s) à traiter")
+    total_inserted = 0
+
+    for idx, file in enumerate(new_files, 1):
+        print(f"[{idx}/{len(new_files)}] {file.name}")
+        parsed = parse_md_file(file)
+        groups = merge_raw_points(cur, process_data(parsed))
+        rows, keys, surfaces = normalize_groups(groups)
+        write_surfaces = (lambda c, k: replace_surfaces(c, k, surfaces, GRID_TTMS, GRID_STRIKES)) if WRITE_SURFACE_TABLE else None
+        if RESET:
+            chunked_insert(cur, rows)
+            if write_surfaces:
+                write_surfaces(cur, keys)
+        elif not replace_groups(conn, TABLE_CONFIG, keys, rows, write_surfaces):
+            # Fichier non marqué dans le cache : ses groupes seront retentés au prochain lancement
+            failed.extend(keys)
+            continue
+        total_inserted += len(rows)
+        touched.update(lexifi_id for lexifi_id, _ in keys)
+        cache[file.name] = file_signature(file)
+        save_file_cache(cache)
+        gc.collect()
+
+    return total_inserted
+
 def main():
     start = time()
     conn = psycopg2.connect(**DB_PARAMS)
@@ -153,33 +256,47 @@ def main():
     cur = conn.cursor()
 
     cache = load_file_cache()
-    files = sorted(Path(FOLDER).glob(f"*{EXT}"), key=os.path.getmtime)
-    new_files = [f for f in files if f.name not in cache or RESET]
+    ensure_metadata_tables(cur)
+    ensure_source_counts_table(cur)
+    final = TABLE_CONFIG["final"]
+    ensure_snapshot_index(cur, final)
+    rebuild_dates = RESET or dates_empty(cur, final)
+    if WRITE_SURFACE_TABLE:
+        ensure_surface_tables(cur)
+        # Grille enregistrée et mise en cache hors transaction : les lots annulés ne peuvent pas l'invalider
+        get_grid_id(cur, GRID_TTMS, GRID_STRIKES)
 
     if RESET:
         print(f"♻️  RESET demandé pour asset_volatility_normalized...")
         json_path = CACHE_DIR / "checksums_volatility_normalized.json"
         if json_path.exists():
             os.remove(json_path)
+        cache = {}
         cur.execute(f"DELETE FROM {TABLE_CONFIG['final']};")
+        reset_source_counts(cur, final)
         cur.execute(f"VACUUM ANALYZE {TABLE_CONFIG['final']};")
         cur.execute(f"REINDEX TABLE {TABLE_CONFIG['final']};")
+        if WRITE_SURFACE_TABLE:
+            cur.execute(f"DELETE FROM {SURFACE_TABLE};")
 
-    print(f"\n🔄 ASSET_VOLATILITY_NORMALIZED : {len(new_files)} fichier(s) à traiter")
-    total_inserted = 0
+    touched = set()
+    failed = []
+    if SOURCE == "db":
+        total_inserted = normalize_from_db(conn, only_changed=not RESET, touched=touched, failed=failed)
+    else:
+        total_inserted = normalize_from_files(conn, cur, cache, touched, failed)
 
-    for idx, file in enumerate(new_files, 1):
-        print(f"[{idx}/{len(new_files)}] {file.name}")
-        parsed = parse_md_file(file)
-        rows = process_data(parsed)
-        chunked_insert(cur, rows)
-        total_inserted += len(rows)
-        cache[file.name] = datetime.now().isoformat()
-        save_file_cache(cache)
-        gc.collect()
+    refresh_catalog(conn, final, None if RESET or catalog_empty(cur, final) else touched)
+    if rebuild_dates:
+        rebuild_available_dates(conn, final)
+    if touched or RESET:
+        bump_data_version(cur, final)
+        if WRITE_SURFACE_TABLE:
+            bump_data_version(cur, SURFACE_TABLE)
 
     cur.close()
     conn.close()
+    report_failed_groups(failed, "ASSET_VOLATILITY_NORMALIZED")
     print(f"\n✅ Script terminé : {total_inserted} ligne(s) injectée(s) en {round(time() - start, 2)} secondes")
 
 if __name__ == "__main__":
@@ -0,0 +1,237 @@
+import io
+import psycopg2
+from psycopg2.extras import execute_values
+import numpy as np
+import pandas as pd
+from time import time
+from lexifi_mkt_data_analytics import TRADING_DAYS, log_returns, rolling_realized_vol
+from lexifi_mkt_data_db_metadata import ensure_metadata_tables, current_data_version, bump_data_version
+from lexifi_mkt_data_normalizer_io import report_failed_groups
+
+DB_PARAMS = {
+    "dbname": "lexifi_mkt_data",
+    "user": "postgres",
+    "password": "0112",
+    "host": "localhost",
+    "port": "5432"
+}
+
+RESET = False  # True : recalcul complet de asset_vol_spread
+BATCH_SIZE = 25  # sous-jacents calculés par passe
+STALE_DAYS = 10  # vol réalisée ignorée si le dernier spot a plus de STALE_DAYS jours à la date d'observation
+
+SPOT_TABLE = "asset_spot"
+VOL_TABLE = "asset_volatility_normalized"
+SPREAD_TABLE = "asset_vol_spread"
+SOURCES_TABLE = "asset_vol_spread_sources"
+ATM_STRIKE = "100.00%"  # libellé du strike 100% dans lexifi_vol_id (grille normalisée)
+SPREAD_TENORS = list(range(1, 11))  # années ; vol réalisée sur tenor x 252 jours de cotation
+VOL_SCALE = 100.0  # lexifi_vol est en points de % : la vol réalisée est ramenée à la même échelle
+
+def ensure_spread_table(cur):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SPREAD_TABLE} (
+            lexifi_id TEXT NOT NULL,
+            lexifi_date DATE NOT NULL,
+            tenor INTEGER NOT NULL,
+            implied_vol DOUBLE PRECISION NOT NULL,
+            realized_vol DOUBLE PRECISION,
+            spread DOUBLE PRECISION,
+            spot_date DATE,
+            PRIMARY KEY (lexifi_id, lexifi_date, tenor)
+        )
+    """)
+    # spot_date : dernière cotation spot <= lexifi_date utilisée pour la vol réalisée (NULL si aucune)
+    cur.execute(f"ALTER TABLE {SPREAD_TABLE} ADD COLUMN IF NOT EXISTS spot_date DATE")
+    # Versions des tables sources déjà traitées : rien à rechercher tant qu'elles n'ont pas changé
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SOURCES_TABLE} (
+            source_table TEXT PRIMARY KEY,
+            version BIGINT NOT NULL
+        )
+    """)
+    # Screener : tous les sous-jacents pour une date et un tenor
+    cur.execute(f"CREATE INDEX IF NOT EXISTS {SPREAD_TABLE}_screen_idx ON {SPREAD_TABLE} (lexifi_date, tenor)")
+
+def source_versions(cur):
+    return {table: current_data_version(cur, table) for table in (SPOT_TABLE, VOL_TABLE)}
+
+def processed_versions(cur):
+    cur.execute(f"SELECT source_table, version FROM {SOURCES_TABLE}")
+    return dict(cur.fetchall())
+
+def save_processed_versions(cur, versions):
+    execute_values(cur, f"""
+        INSERT INTO {SOURCES_TABLE} (source_table, version) VALUES %s
+        ON CONFLICT (source_table) DO UPDATE SET version = EXCLUDED.version
+    """, list(versions.items()))
+
+def pending_dates(cur):
+    # Sous-jacent -> dates à (re)calculer, pour chaque vol ATM normalisée de la grille :
+    # - aucune ligne de spread (nouvelle date, y compris antérieure aux dates déjà calculées)
+    # - implied_vol différente de la vol normalisée actuelle (date renormalisée après le calcul)
+    # - vol réalisée absente alors qu'une cotation spot plus récente que celle utilisée existe dans la fenêtre STALE_DAYS
+    cur.execute(f"""
+        WITH atm AS (
+            SELECT lexifi_id, lexifi_date, lexifi_vol,
+                   CASE WHEN split_part(lexifi_vol_id, ' ', 2) ~ '^[0-9]+Y$'
+                        THEN rtrim(split_part(lexifi_vol_id, ' ', 2), 'Y')::int END AS tenor
+            FROM {VOL_TABLE}
+            WHERE split_part(lexifi_vol_id, ' ', 3) = %(atm_strike)s AND lexifi_vol IS NOT NULL
+        )
+        SELECT a.lexifi_id, array_agg(DISTINCT a.lexifi_date ORDER BY a.lexifi_date)
+        FROM atm a
+        LEFT JOIN {SPREAD_TABLE} s ON s.lexifi_id = a.lexifi_id AND s.lexifi_date = a.lexifi_date AND s.tenor = a.tenor
+        WHERE a.tenor = ANY(%(tenors)s)
+          AND (
+            s.lexifi_id IS NULL
+            OR s.implied_vol IS DISTINCT FROM a.lexifi_vol
+            OR (s.realized_vol IS NULL AND EXISTS (
+                SELECT 1 FROM {SPOT_TABLE} p
+                WHERE p.lexifi_id = a.lexifi_id AND p.lexifi_spot IS NOT NULL
+                  AND p.lexifi_date <= a.lexifi_date AND p.lexifi_date >= a.lexifi_date - %(stale_days)s
+                  AND (s.spot_date IS NULL OR p.lexifi_date > s.spot_date)
+            ))
+          )
+        GROUP BY a.lexifi_id
+        ORDER BY a.lexifi_id
+    """, {"atm_strike": ATM_STRIKE, "tenors": SPREAD_TENORS, "stale_days": STALE_DAYS})
+    return dict(cur.fetchall())
+
+def load_atm_vols(cur, pending):
+    pairs = [(lexifi_id, obs_date) for lexifi_id, dates in pending.items() for obs_date in dates]
+    cur.execute(f"""
+        SELECT n.lexifi_id, n.lexifi_date, rtrim(split_part(n.lexifi_vol_id, ' ', 2), 'Y')::int AS tenor, n.lexifi_vol
+        FROM {VOL_TABLE} n
+        JOIN unnest(%s::text[], %s::date[]) AS p(lexifi_id, lexifi_date) ON p.lexifi_id = n.lexifi_id AND p.lexifi_date = n.lexifi_date
+        WHERE split_part(n.lexifi_vol_id, ' ', 3) = %s
+          AND split_part(n.lexifi_vol_id, ' ', 2) ~ '^[0-9]+Y$'
+          AND n.lexifi_vol IS NOT NULL
+    """, ([p[0] for p in pairs], [p[1] for p in pairs], ATM_STRIKE))
+    df = pd.DataFrame(cur.fetchall(), columns=["lexifi_id", "lexifi_date", "tenor", "implied_vol"])
+    df = df[df["tenor"].isin(SPREAD_TENORS)].reset_index(drop=True)
+    df["lexifi_date"] = pd.to_datetime(df["lexifi_date"])
+    df["implied_vol"] = df["implied_vol"].astype(float)
+    return df
+
+def load_spot_panel(cur, lexifi_ids, start_date):
+    cur.execute(f"""
+        SELECT lexifi_id, lexifi_date, lexifi_spot FROM {SPOT_TABLE}
+        WHERE lexifi_id = ANY(%s) AND lexifi_date >= %s AND lexifi_spot IS NOT NULL
+    """, (list(lexifi_ids), start_date))
+    df = pd.DataFrame(cur.fetchall(), columns=["lexifi_id", "lexifi_date", "lexifi_spot"])
+    panel = df.pivot(index="lexifi_date", columns="lexifi_id", values="lexifi_spot").astype(float)
+    panel.index = pd.to_datetime(panel.index)
+    return panel.sort_index()
+
+def realized_at_dates(panel, implied):
+    # Vol réalisée de même horizon que chaque ligne implicite, lue à la dernière cotation <= date d'observation :
+    # une passe rolling_realized_vol pour tous les tenors et tous les sous-jacents du lot.
+    # Renvoie aussi la date de cette dernière cotation (NaT si aucune), stockée pour reprendre la ligne si un spot arrive ensuite
+    realized = np.full(len(implied), np.nan)
+    spot_dates = np.full(len(implied), np.datetime64("NaT"), dtype="datetime64[ns]")
+    if panel.empty or implied.empty:
+        return realized, spot_dates
+    windows = [tenor * TRADING_DAYS for tenor in SPREAD_TENORS]
+    vols = rolling_realized_vol(log_returns(panel), windows)
+    all_dates = panel.index.union(pd.DatetimeIndex(implied["lexifi_date"].unique()))
+    rows = all_dates.get_indexer(implied["lexifi_date"])
+    cols = panel.columns.get_indexer(implied["lexifi_id"])
+    has_spot = cols >= 0
+
+    last_quote = pd.DataFrame(np.where(panel.notna(), panel.index.to_numpy()[:, None], np.datetime64("NaT")), index=panel.index, columns=panel.columns)
+    last_quote = last_quote.reindex(all_dates).ffill().to_numpy(dtype="datetime64[ns]")
+    spot_dates[has_spot] = last_quote[rows[has_spot], cols[has_spot]]
+    quote_age = implied["lexifi_date"].to_numpy() - spot_dates
+    fresh = has_spot & (quote_age <= np.timedelta64(STALE_DAYS, "D"))
+
+    tenors = implied["tenor"].to_numpy()
+    for tenor, window in zip(SPREAD_TENORS, windows):
+        selected = fresh & (tenors == tenor)
+        if selected.any():
+            values = vols[window].reindex(all_dates).ffill().to_numpy()
+            realized[selected] = values[rows[selected], cols[selected]] * VOL_SCALE
+    return realized, spot_dates
+
+def write_spreads(cur, df):
+    columns = "lexifi_id, lexifi_date, tenor, implied_vol, realized_vol, spread, spot_date"
+    buffer = io.StringIO()
+    df.to_csv(buffer, sep="\t", header=False, index=False, na_rep="\\N", date_format="%Y-%m-%d")
+    buffer.seek(0)
+    cur.execute(f"CREATE TEMP TABLE tmp_vol_spread ON COMMIT DROP AS SELECT {columns} FROM {SPREAD_TABLE} WITH NO DATA")
+    cur.copy_expert(f"COPY tmp_vol_spread ({columns}) FROM STDIN", buffer)
+    cur.execute(f"""
+        INSERT INTO {SPREAD_TABLE} ({columns}) SELECT {columns} FROM tmp_vol_spread
+        ON CONFLICT (lexifi_id, lexifi_date, tenor) DO UPDATE
+        SET implied_vol = EXCLUDED.implied_vol, realized_vol = EXCLUDED.realized_vol, spread = EXCLUDED.spread, spot_date = EXCLUDED.spot_date
+    """)
+
+def refresh_batch(conn, pending):
+    # pending : lexifi_id -> dates à calculer
+    conn.autocommit = False
+    try:
+        with conn.cursor() as cur:
+            implied = load_atm_vols(cur, pending)
+            if implied.empty:
+                conn.commit()
+                return 0
+            # Historique spot suffisant pour la fenêtre du plus long tenor à la première date à calculer
+            spot_start = (implied["lexifi_date"].min() - pd.DateOffset(years=max(SPREAD_TENORS) + 1)).date()
+            panel = load_spot_panel(cur, implied["lexifi_id"].unique().tolist(), spot_start)
+            implied["realized_vol"], implied["spot_date"] = realized_at_dates(panel, implied)
+            implied["spread"] = implied["implied_vol"] - implied["realized_vol"]
+            write_spreads(cur, implied[["lexifi_id", "lexifi_date", "tenor", "implied_vol", "realized_vol", "spread", "spot_date"]])
+        conn.commit()
+        print(f"   ✅ {len(pending)} sous-jacent(s) : {len(implied)} ligne(s), {int(implied['realized_vol'].notna().sum())} avec vol réalisée")
+        return len(implied)
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Erreur sur le lot {next(iter(pending))}..., transaction annulée : {e}")
+        return None
+    finally:
+        conn.autocommit = True
+
+def main():
+    start = time()
+    conn = psycopg2.connect(**DB_PARAMS)
+    conn.set_session(autocommit=True)
+    cur = conn.cursor()
+
+    ensure_metadata_tables(cur)
+    ensure_spread_table(cur)
+    if RESET:
+        print(f"♻️  RESET demandé pour {SPREAD_TABLE}...")
+        cur.execute(f"DELETE FROM {SPREAD_TABLE};")
+
+    # À lancer après lexifi_mkt_data_db_updater (spot) et lexifi_mkt_data_db_vol_normalized :
+    # recherche des dates à calculer seulement si l'une des deux sources a changé depuis le dernier passage complet
+    versions = source_versions(cur)
+    if not RESET and processed_versions(cur) == versions:
+        print(f"✔️ {SPOT_TABLE} et {VOL_TABLE} inchangées depuis le dernier calcul")
+        pending = {}
+    else:
+        pending = pending_dates(cur)
+    print(f"🔍 {len(pending)} sous-jacent(s), {sum(len(dates) for dates in pending.values())} date(s) de vol normalisée à calculer")
+    ids = sorted(pending)
+    total_rows = 0
+    failed = []
+    for i in range(0, len(ids), BATCH_SIZE):
+        batch = {lexifi_id: pending[lexifi_id] for lexifi_id in ids[i:i + BATCH_SIZE]}
+        n_rows = refresh_batch(conn, batch)
+        if n_rows is None:
+            failed.extend((lexifi_id, obs_date) for lexifi_id, dates in batch.items() for obs_date in dates)
+        else:
+            total_rows += n_rows
+
+    if total_rows or RESET:
+        bump_data_version(cur, SPREAD_TABLE)
+    if not failed:
+        save_processed_versions(cur, versions)
+
+    cur.close()
+    conn.close()
+    report_failed_groups(failed, SPREAD_TABLE.upper())
+    print(f"\n✅ Script terminé : {total_rows} ligne(s) calculée(s) en {round(time() - start, 2)} secondes")
+
+if __name__ == "__main__":
+    main()
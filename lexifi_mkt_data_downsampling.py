@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+DEFAULT_CHART_WIDTH_PX = 1400
+POINTS_PER_PIXEL = 2  # au-delà, Plotly n'affiche rien de plus à l'écran
+
+def target_points(width_px=DEFAULT_CHART_WIDTH_PX, points_per_pixel=POINTS_PER_PIXEL):
+    return max(int(width_px * points_per_pixel), 3)
+
+def lttb_indices(x, y, n_out):
+    # Largest-Triangle-Three-Buckets : indices des points conservés (premier et dernier inclus)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    every = (n - 2) / (n_out - 2)
+    edges = np.floor(np.arange(n_out - 1) * every).astype(np.int64) + 1
+    edges[-1] = n - 1
+
+    starts = edges[:-1] - 1
+    counts = np.diff(np.r_[starts, n - 2])
+    avg_x = np.add.reduceat(x[1:n - 1], starts) / counts
+    avg_y = np.add.reduceat(y[1:n - 1], starts) / counts
+    next_x = np.r_[avg_x[1:], x[-1]]
+    next_y = np.r_[avg_y[1:], y[-1]]
+
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        area = np.abs((x[a] - next_x[b]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y[b] - y[a]))
+        a = lo + int(np.argmax(area))
+        indices[b + 1] = a
+    return indices
+
+def downsample_long(df, x_col, y_col, group_col, n_out):
+    # Format long (une ligne par point et par série), comme attendu par px.line(color=group_col)
+    if n_out is None or df.empty:
+        return df
+    parts = []
+    for _, group in df.groupby(group_col, sort=False):
+        group = group.dropna(subset=[y_col]).sort_values(x_col)
+        if len(group) > n_out:
+            x = pd.DatetimeIndex(group[x_col]).asi8 if pd.api.types.is_datetime64_any_dtype(group[x_col]) else group[x_col].to_numpy(dtype=float)
+            group = group.iloc[lttb_indices(x, group[y_col].to_numpy(dtype=float), n_out)]
+        parts.append(group)
+    return pd.concat(parts, ignore_index=True)
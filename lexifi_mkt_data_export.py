@@ -0,0 +1,160 @@
+import csv
+import hashlib
+import os
+import tempfile
+import pandas as pd
+from pathlib import Path
+
+EXPORT_DIR = Path(tempfile.gettempdir()) / "lexifi_mkt_data_exports"
+EXPORT_CHUNK_ROWS = 100000
+EXPORT_CACHE_SIZE = 20  # fichiers gardés sur disque, les plus anciens sont supprimés
+
+# Libellé -> (extension, type MIME)
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Arrow": ("arrow", "application/vnd.apache.arrow.file"),
+}
+
+# Requêtes d'export au format psycopg2 (curseur serveur) ; {forward_table} résolu à l'appel
+EXPORT_QUERIES = {
+    "spot": """
+        SELECT lexifi_id, lexifi_date, lexifi_spot
+        FROM asset_spot
+        WHERE lexifi_id = ANY(%(ids)s) AND lexifi_date >= %(start_date)s
+        ORDER BY lexifi_id, lexifi_date
+    """,
+    "forward": """
+        SELECT lexifi_id, lexifi_forward_id, lexifi_date, lexifi_forward
+        FROM {forward_table}
+        WHERE lexifi_forward_id = ANY(%(ids)s) AND lexifi_date >= %(start_date)s
+        ORDER BY lexifi_forward_id, lexifi_date
+    """,
+    "vol": """
+        SELECT lexifi_id, lexifi_vol_id, lexifi_date, lexifi_vol
+        FROM asset_volatility
+        WHERE lexifi_vol_id = ANY(%(ids)s) AND lexifi_date >= %(start_date)s
+        ORDER BY lexifi_vol_id, lexifi_date
+    """,
+    "vol_surface": """
+        SELECT lexifi_id, lexifi_vol_id, lexifi_date, lexifi_vol
+        FROM asset_volatility
+        WHERE lexifi_id = %(lexifi_id)s AND lexifi_date BETWEEN %(start_date)s AND %(end_date)s
+        ORDER BY lexifi_date, lexifi_vol_id
+    """,
+}
+
+def export_fingerprint(kind, params, fmt, version, **tables):
+    payload = repr((kind, sorted(tables.items()), sorted((k, str(v)) for k, v in params.items()), fmt, version))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def export_path(fingerprint, fmt):
+    return EXPORT_DIR / f"{fingerprint}.{EXPORT_FORMATS[fmt][0]}"
+
+# OID PostgreSQL -> type Arrow (nom de fabrique pyarrow) ; type inconnu exporté en texte
+PG_ARROW_TYPES = {
+    16: "bool_",
+    20: "int64", 21: "int64", 23: "int64",
+    700: "float64", 701: "float64", 1700: "float64",
+    1082: "date32",
+    25: "string", 1043: "string",
+}
+
+def query_columns(conn, sql, params):
+    # (nom, OID) des colonnes de la requête, sans lire de ligne : le schéma ne dépend pas du premier lot
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT * FROM ({sql}) q LIMIT 0", params)
+        return [(d[0], d[1]) for d in cur.description]
+
+def _chunks(conn, sql, params):
+    cur = conn.cursor(name="lexifi_export")
+    cur.itersize = EXPORT_CHUNK_ROWS
+    cur.execute(sql, params)
+    try:
+        while True:
+            rows = cur.fetchmany(EXPORT_CHUNK_ROWS)
+            if not rows:
+                break
+            yield pd.DataFrame(rows, columns=[d[0] for d in cur.description])
+    finally:
+        cur.close()
+
+def _arrow_schema(pa, columns):
+    return pa.schema([(name, getattr(pa, PG_ARROW_TYPES.get(type_code, "string"))()) for name, type_code in columns])
+
+def _coerce(chunk, schema, pa):
+    # Colonnes ramenées au type du schéma (numeric -> Decimal, entiers avec NULL, types inconnus en texte)
+    chunk = chunk.copy()
+    for field in schema:
+        values = chunk[field.name]
+        if pa.types.is_floating(field.type):
+            chunk[field.name] = values.astype("float64")
+        elif pa.types.is_integer(field.type):
+            chunk[field.name] = values.astype("Int64")
+        elif pa.types.is_string(field.type):
+            chunk[field.name] = values.map(lambda v: None if v is None else str(v))
+    return chunk
+
+def write_chunks(chunks, path, fmt, columns):
+    # Écriture au fil de l'eau : un seul lot de EXPORT_CHUNK_ROWS lignes en mémoire à la fois.
+    # columns : (nom, OID) de query_columns, pour l'en-tête CSV et le schéma Arrow même sans ligne
+    n_rows = 0
+    if fmt == "CSV":
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            csv.writer(f, quoting=csv.QUOTE_MINIMAL).writerow([name for name, _ in columns])
+            for chunk in chunks:
+                chunk.to_csv(f, header=False, index=False, quoting=csv.QUOTE_MINIMAL)
+                n_rows += len(chunk)
+        return n_rows
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = _arrow_schema(pa, columns)
+    writer = pq.ParquetWriter(str(path), schema) if fmt == "Parquet" else pa.ipc.new_file(str(path), schema)
+    try:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pandas(_coerce(chunk, schema, pa), schema=schema, preserve_index=False))
+            n_rows += len(chunk)
+    finally:
+        writer.close()
+    return n_rows
+
+def prune_exports():
+    # Les fichiers .part sont des exports en cours d'écriture (autres sessions) : jamais supprimés ici
+    files = []
+    for path in EXPORT_DIR.glob("*.*"):
+        if path.suffix == ".part":
+            continue
+        try:
+            files.append((os.path.getmtime(path), path))
+        except OSError:
+            pass
+    files.sort(reverse=True)
+    for _, path in files[EXPORT_CACHE_SIZE:]:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+def build_export(conn, kind, params, fmt, fingerprint, **tables):
+    # Réutilise le fichier si la même requête (même version de données) a déjà été exportée
+    EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    path = export_path(fingerprint, fmt)
+    if path.exists():
+        path.touch()
+        return path
+    # Nom temporaire unique : deux sessions exportant la même empreinte n'écrivent pas le même fichier
+    with tempfile.NamedTemporaryFile(dir=EXPORT_DIR, prefix=f"{fingerprint}.", suffix=".part", delete=False) as tmp:
+        tmp_path = Path(tmp.name)
+    sql = EXPORT_QUERIES[kind].format(**tables)
+    try:
+        write_chunks(_chunks(conn, sql, params), tmp_path, fmt, query_columns(conn, sql, params))
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+        raise
+    prune_exports()
+    return path
@@ -0,0 +1,74 @@
+import numpy as np
+from scipy.interpolate import PchipInterpolator, interp1d, LSQUnivariateSpline, CloughTocher2DInterpolator, LinearNDInterpolator
+
+# Interpolateurs partagés par les normaliseurs et lexifi_mkt_data_query_service : aucun effet de bord à l'import
+
+FORWARD_GRID = np.arange(1, 11)  # 1Y à 10Y
+GRID_STRIKES = np.arange(40.0, 161.0, 10.0)  # 40%, 50%, ..., 160%
+GRID_TTMS = np.arange(1, 11)  # 1Y to 10Y
+
+# ----------------------- FORWARDS -----------------------
+
+def build_forward_interpolator(ttms, values, method="pchip"):
+    # method : "pchip", "nspline", "linear" (fallback inclus)
+    grid = FORWARD_GRID
+    if method == "nspline" and len(ttms) >= 4:
+        try:
+            knots = np.linspace(ttms[1], ttms[-2], len(ttms) - 2)
+            spline = LSQUnivariateSpline(ttms, values, knots)
+            if not np.any(spline(grid) <= 0):
+                return spline
+        except Exception:
+            pass
+    if method in ["pchip", "nspline"]:
+        try:
+            interp = PchipInterpolator(ttms, values, extrapolate=True)
+            if not np.any(interp(grid) <= 0):
+                return interp
+        except Exception:
+            pass
+    try:
+        fallback = interp1d(ttms, values, kind="linear", fill_value="extrapolate")
+        if not np.any(fallback(grid) <= 0):
+            return fallback
+    except Exception:
+        pass
+    return None
+
+def interpolate_forward(ttms, values, method="pchip"):
+    grid = FORWARD_GRID
+    interp = build_forward_interpolator(ttms, values, method)
+    if interp is None:
+        return {}
+    return dict(zip(grid, interp(grid)))
+
+# ----------------------- SURFACES DE VOL -----------------------
+
+def build_surface_interpolator(strikes, ttms, values, method="clough"):
+    # method : "clough", "linear"
+    points = np.array(list(zip(ttms, strikes)))
+    values = np.array(values)
+    if method == "clough":
+        return CloughTocher2DInterpolator(points, values)
+    elif method == "linear":
+        return LinearNDInterpolator(points, values)
+    raise ValueError("Méthode d'interpolation inconnue")
+
+def interpolate_surface(strikes, ttms, values, method="clough"):
+    grid_strikes = GRID_STRIKES
+    grid_ttms = GRID_TTMS
+    try:
+        interpolator = build_surface_interpolator(strikes, ttms, values, method)
+        mesh_ttms, mesh_strikes = np.meshgrid(grid_ttms, grid_strikes, indexing="ij")
+        vols = interpolator(mesh_ttms, mesh_strikes)
+
+        surface = {}
+        for i, ttm in enumerate(grid_ttms):
+            for j, strike in enumerate(grid_strikes):
+                vol = vols[i, j]
+                if np.isnan(vol) or vol <= 0:
+                    continue
+                surface[(ttm, strike)] = round(float(vol), 6)
+        return surface
+    except Exception:
+        return {}
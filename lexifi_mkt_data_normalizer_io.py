@@ -0,0 +1,159 @@
+import os
+import io
+import hashlib
+from datetime import datetime
+from psycopg2.extras import execute_values
+from lexifi_mkt_data_db_metadata import add_available_dates, add_available_dates_from
+
+CHUNK_SIZE = 500
+SOURCE_COUNTS_TABLE = "normalized_source_counts"
+
+# Outils communs à lexifi_mkt_data_db_fwd_normalized et lexifi_mkt_data_db_vol_normalized
+
+# ----------------------- FICHIERS .md -----------------------
+
+def file_checksum(path):
+    with open(path, "rb") as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+def file_signature(path):
+    stat = os.stat(path)
+    return {"mtime": stat.st_mtime, "size": stat.st_size, "checksum": file_checksum(path)}
+
+def file_changed(path, entry):
+    if entry is None:
+        return True
+    if isinstance(entry, str):  # ancien format du cache : date de traitement
+        return os.path.getmtime(path) > datetime.fromisoformat(entry).timestamp()
+    stat = os.stat(path)
+    if stat.st_mtime == entry.get("mtime") and stat.st_size == entry.get("size"):
+        return False
+    return file_checksum(path) != entry.get("checksum")
+
+# ----------------------- GROUPES (lexifi_id, date) -----------------------
+
+def keys_join(alias):
+    # Jointure sur une liste de groupes passée en deux tableaux (voir keys_params)
+    return f"""
+        JOIN unnest(%s::text[], %s::date[]) AS k(lexifi_id, lexifi_date)
+          ON k.lexifi_id = {alias}.lexifi_id AND k.lexifi_date = {alias}.lexifi_date
+    """
+
+def keys_params(keys):
+    return [lexifi_id for lexifi_id, _ in keys], [date for _, date in keys]
+
+def replace_groups(conn, table_config, keys, rows, write_extra=None):
+    # Suppression puis réinsertion des groupes dans une seule transaction ; write_extra(cur, keys) pour les tables dérivées
+    if not keys:
+        return True
+    final = table_config["final"]
+    print(f"   ↪ Remplacement de {len(keys)} groupe(s) (lexifi_id, date) : {len(rows)} ligne(s) dans {final}")
+    delete_query = f"""
+        DELETE FROM {final} AS t
+        USING (VALUES %s) AS k(lexifi_id, lexifi_date)
+        WHERE t.lexifi_id = k.lexifi_id AND t.lexifi_date = k.lexifi_date
+    """
+    insert_query = f"INSERT INTO {final} ({', '.join(table_config['columns'])}) VALUES %s ON CONFLICT DO NOTHING"
+    conn.autocommit = False
+    try:
+        with conn.cursor() as cur:
+            execute_values(cur, delete_query, keys, page_size=CHUNK_SIZE)
+            execute_values(cur, insert_query, rows, page_size=CHUNK_SIZE)
+            add_available_dates(cur, final, rows)
+            if write_extra is not None:
+                write_extra(cur, keys)
+        conn.commit()
+        return True
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Erreur lors du remplacement, transaction annulée : {e}")
+        return False
+    finally:
+        conn.autocommit = True
+
+# ----------------------- NORMALISATION DEPUIS LES TABLES BRUTES -----------------------
+
+def ensure_source_counts_table(cur):
+    # Nombre de cotations brutes de chaque groupe lors de sa dernière normalisation (SOURCE = "db")
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SOURCE_COUNTS_TABLE} (
+            source_table TEXT NOT NULL,
+            lexifi_id TEXT NOT NULL,
+            lexifi_date DATE NOT NULL,
+            raw_count INTEGER NOT NULL,
+            PRIMARY KEY (source_table, lexifi_id, lexifi_date)
+        )
+    """)
+
+def reset_source_counts(cur, source_table):
+    cur.execute(f"DELETE FROM {SOURCE_COUNTS_TABLE} WHERE source_table = %(source_table)s", {"source_table": source_table})
+
+def grouped_raw_query(raw_query, only_changed):
+    # Cotations brutes triées par (lexifi_id, date) avec le nombre de cotations du groupe en dernière colonne.
+    # only_changed : groupes dont ce nombre diffère de la dernière normalisation. L'updater n'écrase jamais une
+    # cotation existante (ON CONFLICT DO NOTHING) : un groupe brut ne change que par ajout ou suppression de points.
+    # Paramètre : %(source_table)s = table normalisée.
+    changed_filter = f"""
+        LEFT JOIN {SOURCE_COUNTS_TABLE} s
+          ON s.source_table = %(source_table)s AND s.lexifi_id = q.lexifi_id AND s.lexifi_date = q.lexifi_date
+        WHERE s.raw_count IS DISTINCT FROM q.raw_count
+    """ if only_changed else ""
+    return f"""
+        SELECT q.* FROM (
+            SELECT r.*, COUNT(*) OVER (PARTITION BY r.lexifi_id, r.lexifi_date) AS raw_count
+            FROM ({raw_query}) r
+        ) q
+        {changed_filter}
+        ORDER BY q.lexifi_id, q.lexifi_date
+    """
+
+def copy_replace_groups(conn, table_config, groups, rows, write_extra=None):
+    # groups : (lexifi_id, date, raw_count). Suppression, COPY des nouvelles lignes et mise à jour des comptes
+    # bruts dans une seule transaction ; write_extra(cur, keys_table) pour les tables dérivées
+    if not groups:
+        return True
+    final = table_config["final"]
+    columns = ", ".join(table_config["columns"])
+    print(f"   ↪ COPY de {len(groups)} groupe(s) (lexifi_id, date) : {len(rows)} ligne(s) dans {final}")
+    keys_buffer = io.StringIO("".join(f"{lexifi_id}\t{date}\t{raw_count}\n" for lexifi_id, date, raw_count in groups))
+    rows_buffer = io.StringIO("".join("\t".join(str(v) for v in row) + "\n" for row in rows))
+    conn.autocommit = False
+    try:
+        with conn.cursor() as cur:
+            cur.execute("CREATE TEMP TABLE tmp_norm_keys (lexifi_id TEXT, lexifi_date DATE, raw_count INTEGER) ON COMMIT DROP")
+            cur.execute(f"CREATE TEMP TABLE tmp_norm_rows ON COMMIT DROP AS SELECT {columns} FROM {final} WITH NO DATA")
+            cur.copy_expert("COPY tmp_norm_keys (lexifi_id, lexifi_date, raw_count) FROM STDIN", keys_buffer)
+            cur.copy_expert(f"COPY tmp_norm_rows ({columns}) FROM STDIN", rows_buffer)
+            cur.execute(f"""
+                DELETE FROM {final} AS t
+                USING tmp_norm_keys AS k
+                WHERE t.lexifi_id = k.lexifi_id AND t.lexifi_date = k.lexifi_date
+            """)
+            cur.execute(f"INSERT INTO {final} ({columns}) SELECT {columns} FROM tmp_norm_rows ON CONFLICT DO NOTHING")
+            add_available_dates_from(cur, final, "tmp_norm_rows")
+            cur.execute(f"""
+                INSERT INTO {SOURCE_COUNTS_TABLE} (source_table, lexifi_id, lexifi_date, raw_count)
+                SELECT %s, lexifi_id, lexifi_date, raw_count FROM tmp_norm_keys
+                ON CONFLICT (source_table, lexifi_id, lexifi_date) DO UPDATE SET raw_count = EXCLUDED.raw_count
+            """, (final,))
+            if write_extra is not None:
+                write_extra(cur, "tmp_norm_keys")
+        conn.commit()
+        return True
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Erreur lors du COPY, transaction annulée : {e}")
+        return False
+    finally:
+        conn.autocommit = True
+
+def report_failed_groups(failed, label):
+    # Groupes non écrits : leur compte brut n'a pas été enregistré, ils seront repris au prochain passage
+    if not failed:
+        return
+    print(f"❌ {label} : {len(failed)} groupe(s) (lexifi_id, date) non écrit(s), repris au prochain lancement")
+    for lexifi_id, date in failed[:20]:
+        print(f"   ↪ {lexifi_id} {date}")
+    if len(failed) > 20:
+        print(f"   ↪ ... et {len(failed) - 20} autre(s)")
+    raise SystemExit(1)
@@ -0,0 +1,158 @@
+import numpy as np
+from scipy.special import ndtr
+from lexifi_mkt_data_snapshot import SNAPSHOT_TABLES, fetch_snapshot, snapshot_grid, parse_grid_ids
+
+# Grilles de asset_forward_normalized / asset_volatility_normalized
+PRICING_TENORS = np.arange(1, 11).astype(float)  # années
+PRICING_STRIKES = np.arange(40.0, 161.0, 10.0)  # % du spot
+PRICING_MAX_AGE_DAYS = 10  # observations plus anciennes ignorées dans un snapshot
+INV_SQRT_2PI = 1.0 / np.sqrt(2.0 * np.pi)
+DAYS_PER_YEAR = 365.0
+
+# ----------------------- BLACK-76 -----------------------
+
+def black76(forward, strike, ttm, vol, rate=0.0, greeks=False):
+    # Call / put européens sur forward, tous les arguments diffusables (ndarray) ; vol en décimal, ttm en années.
+    # Greeks : delta et gamma par rapport au forward, vega pour 1 point de vol, theta par jour calendaire.
+    # NaN si ttm <= 0, vol <= 0 ou entrée manquante.
+    forward, strike, ttm, vol = (np.asarray(x, dtype=np.float64) for x in (forward, strike, ttm, vol))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sqrt_t = np.sqrt(np.where(ttm > 0, ttm, np.nan))
+        sigma_t = np.where(vol > 0, vol, np.nan) * sqrt_t
+        d1 = np.log(forward / strike) / sigma_t + 0.5 * sigma_t
+        d2 = d1 - sigma_t
+        discount = np.exp(-rate * ttm)
+        nd1 = ndtr(d1)
+        nd2 = ndtr(d2)
+        call = discount * (forward * nd1 - strike * nd2)
+        # Parité call / put : pas de second appel à ndtr
+        put = call - discount * (forward - strike)
+        result = {"call": call, "put": put}
+        if greeks:
+            pdf_d1 = INV_SQRT_2PI * np.exp(-0.5 * d1 * d1)
+            discounted_pdf = discount * pdf_d1
+            time_decay = -forward * discounted_pdf * sigma_t / (2.0 * ttm)
+            result.update({
+                "delta_call": discount * nd1,
+                "delta_put": discount * (nd1 - 1.0),
+                "gamma": discounted_pdf / (forward * sigma_t),
+                "vega": forward * discounted_pdf * sqrt_t / 100.0,
+                "theta_call": (time_decay + rate * call) / DAYS_PER_YEAR,
+                "theta_put": (time_decay + rate * put) / DAYS_PER_YEAR,
+            })
+    return result
+
+def price_grid(spot, forwards, vols, tenors=PRICING_TENORS, strikes=PRICING_STRIKES, rate=0.0, greeks=False):
+    # spot (..., N), forwards (..., N, T), vols (..., N, T, K) en points de % -> résultats (..., N, T, K) en % du spot.
+    # Tout est normalisé par le spot : F/S et K/S = strike / 100, le résultat ne dépend pas du niveau de l'actif.
+    # Prix, gamma, vega et theta en % du spot (gamma : dérivée seconde par rapport à F/S), delta sans unité.
+    spot = np.asarray(spot, dtype=np.float64)
+    forward_ratio = np.asarray(forwards, dtype=np.float64) / spot[..., None]
+    result = black76(
+        forward_ratio[..., None],
+        np.asarray(strikes, dtype=np.float64) / 100.0,
+        np.asarray(tenors, dtype=np.float64)[:, None],
+        np.asarray(vols, dtype=np.float64) / 100.0,
+        rate,
+        greeks,
+    )
+    for name in ("call", "put", "gamma", "vega", "theta_call", "theta_put"):
+        if name in result:
+            result[name] = result[name] * 100.0
+    return result
+
+# ----------------------- CHARGEMENT -----------------------
+
+def latest_observations(snapshot):
+    # Seules les lignes à la date la plus récente de leur sous-jacent sont gardées : une courbe ou une surface
+    # ne mélange pas plusieurs dates d'observation. Renvoie aussi (sous-jacents triés, date retenue).
+    base_ids = snapshot["base_id"].astype(str)
+    obs_dates = snapshot["obs_date"]
+    order = np.lexsort((obs_dates, base_ids))[::-1]
+    unique_ids, first = np.unique(base_ids[order], return_index=True)
+    latest = obs_dates[order][first]
+    keep = obs_dates == latest[np.searchsorted(unique_ids, base_ids)]
+    return {name: values[keep] for name, values in snapshot.items()}, unique_ids, latest
+
+def align_inputs(spot_snapshot, forward_snapshot, vol_snapshot, tenors=PRICING_TENORS, strikes=PRICING_STRIKES):
+    # Snapshots colonnaires -> tableaux alignés sur les sous-jacents ayant spot, courbe forward et surface de vol,
+    # avec la date d'observation de chaque entrée ; same_date = les trois entrées viennent de la même date
+    spot_snapshot, spot_ids, spot_dates = latest_observations(spot_snapshot)
+    forward_snapshot, _, forward_dates = latest_observations(forward_snapshot)
+    vol_snapshot, _, vol_dates = latest_observations(vol_snapshot)
+    forward_ids, forwards = snapshot_grid(forward_snapshot, tenors)
+    vol_ids, vols = snapshot_grid(vol_snapshot, tenors, strikes)
+    base_ids = np.intersect1d(np.intersect1d(forward_ids, vol_ids), spot_ids)
+    spot_pos = np.searchsorted(spot_ids, base_ids)
+    spot_order = np.argsort(spot_snapshot["base_id"].astype(str))
+    spots = spot_snapshot["value"][spot_order][spot_pos]
+    forward_pos = np.searchsorted(forward_ids, base_ids)
+    vol_pos = np.searchsorted(vol_ids, base_ids)
+    spot_date, forward_date, vol_date = spot_dates[spot_pos], forward_dates[forward_pos], vol_dates[vol_pos]
+    return {
+        "base_ids": base_ids,
+        "spot": spots,
+        "forwards": forwards[forward_pos],
+        "vols": vols[vol_pos],
+        "spot_date": spot_date,
+        "forward_date": forward_date,
+        "vol_date": vol_date,
+        "same_date": (spot_date == forward_date) & (forward_date == vol_date),
+    }
+
+def select_underlyings(inputs, mask):
+    return {name: values[mask] for name, values in inputs.items()}
+
+def load_pricing_snapshot(cur, as_of, base_ids=None, max_age_days=PRICING_MAX_AGE_DAYS, common_date=True):
+    # Dernier spot, courbe forward et surface de vol <= as_of de chaque sous-jacent ;
+    # common_date : sous-jacents dont les trois entrées n'ont pas la même date d'observation écartés
+    snapshots = [fetch_snapshot(cur, SNAPSHOT_TABLES[kind], as_of, base_ids, max_age_days) for kind in ("spot", "forward", "vol")]
+    inputs = align_inputs(*snapshots)
+    return select_underlyings(inputs, inputs["same_date"]) if common_date else inputs
+
+def _load_history(cur, source_table, key_col, value_col, base_ids, dates):
+    cur.execute(f"""
+        SELECT lexifi_id, lexifi_date, {key_col}, {value_col}
+        FROM {source_table}
+        WHERE lexifi_id = ANY(%s) AND lexifi_date = ANY(%s) AND {value_col} IS NOT NULL
+    """, (list(base_ids), dates.astype(object).tolist()))
+    rows = cur.fetchall()
+    if not rows:
+        return np.array([], dtype=object), np.array([], dtype="datetime64[D]"), np.array([], dtype=object), np.array([], dtype=np.float64)
+    lexifi_ids, obs_dates, instrument_ids, values = zip(*rows)
+    return np.array(lexifi_ids, dtype=object), np.array(obs_dates, dtype="datetime64[D]"), np.array(instrument_ids, dtype=object), np.array(values, dtype=np.float64)
+
+def load_pricing_history(cur, base_ids, dates, tenors=PRICING_TENORS, strikes=PRICING_STRIKES):
+    # Observations exactes aux dates demandées : spot (D, N), forwards (D, N, T), vols (D, N, T, K), NaN si absent
+    base_ids = np.array(sorted(set(base_ids)), dtype=object)
+    dates = np.unique(np.array(dates, dtype="datetime64[D]"))
+    shape = (len(dates), len(base_ids))
+    tenor_pos = {float(t): i for i, t in enumerate(tenors)}
+    strike_pos = {float(k): j for j, k in enumerate(strikes)}
+
+    def positions(lexifi_ids, obs_dates):
+        return np.searchsorted(dates, obs_dates), np.searchsorted(base_ids, lexifi_ids)
+
+    spot = np.full(shape, np.nan)
+    lexifi_ids, obs_dates, _, values = _load_history(cur, "asset_spot", "lexifi_id", "lexifi_spot", base_ids, dates)
+    d_idx, n_idx = positions(lexifi_ids, obs_dates)
+    spot[d_idx, n_idx] = values
+
+    forwards = np.full(shape + (len(tenors),), np.nan)
+    lexifi_ids, obs_dates, instrument_ids, values = _load_history(cur, SNAPSHOT_TABLES["forward"], "lexifi_forward_id", "lexifi_forward", base_ids, dates)
+    grid_tenors, _ = parse_grid_ids(instrument_ids)
+    t_idx = np.array([tenor_pos.get(t, -1) for t in grid_tenors], dtype=np.int64)
+    keep = t_idx >= 0
+    d_idx, n_idx = positions(lexifi_ids[keep], obs_dates[keep])
+    forwards[d_idx, n_idx, t_idx[keep]] = values[keep]
+
+    vols = np.full(shape + (len(tenors), len(strikes)), np.nan)
+    lexifi_ids, obs_dates, instrument_ids, values = _load_history(cur, SNAPSHOT_TABLES["vol"], "lexifi_vol_id", "lexifi_vol", base_ids, dates)
+    grid_tenors, grid_strikes = parse_grid_ids(instrument_ids)
+    t_idx = np.array([tenor_pos.get(t, -1) for t in grid_tenors], dtype=np.int64)
+    k_idx = np.array([strike_pos.get(k, -1) for k in grid_strikes], dtype=np.int64)
+    keep = (t_idx >= 0) & (k_idx >= 0)
+    d_idx, n_idx = positions(lexifi_ids[keep], obs_dates[keep])
+    vols[d_idx, n_idx, t_idx[keep], k_idx[keep]] = values[keep]
+
+    return {"dates": dates, "base_ids": base_ids, "spot": spot, "forwards": forwards, "vols": vols}
@@ -0,0 +1,289 @@
+import json
+import select
+import threading
+import psycopg2
+import numpy as np
+from contextlib import contextmanager
+from datetime import date, datetime
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from time import time, sleep
+from psycopg2.pool import ThreadedConnectionPool
+
+from lexifi_mkt_data_interpolation import build_forward_interpolator, build_surface_interpolator
+from lexifi_mkt_data_db_metadata import VERSION_TABLE, VERSION_CHANNEL
+
+DB_PARAMS = {
+    "dbname": "lexifi_mkt_data",
+    "user": "postgres",
+    "password": "0112",
+    "host": "localhost",
+    "port": "5432"
+}
+
+CACHE_SIZE = 2048  # nombre d'interpolateurs (lexifi_id, date) gardés en mémoire, par type
+POOL_MAX = 8  # connexions ouvertes au plus (une par requête HTTP en cours)
+FORWARD_METHOD = "pchip"  # mêmes méthodes que les normaliseurs
+SURFACE_METHOD = "clough"
+HTTP_HOST = "127.0.0.1"
+HTTP_PORT = 8765
+VERSION_POLL_SECONDS = 60  # relecture des versions même sans NOTIFY
+
+FORWARD_RAW_TABLE = "asset_forward"
+VOL_RAW_TABLE = "asset_volatility"
+
+_pool = None
+_pool_lock = threading.Lock()
+_versions = None
+_versions_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.closed:
+            _pool = ThreadedConnectionPool(1, POOL_MAX, **DB_PARAMS)
+    return _pool
+
+@contextmanager
+def connection():
+    # Une connexion du pool par thread appelant, rendue au pool après usage (fermée si cassée)
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        if not conn.autocommit:
+            conn.rollback()
+            conn.set_session(autocommit=True, readonly=True)
+        yield conn
+    except psycopg2.Error:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn, close=bool(conn.closed))
+
+# ----------------------- VERSIONS DE DONNÉES -----------------------
+
+def _read_versions(cur):
+    cur.execute(f"SELECT source_table, version FROM {VERSION_TABLE}")
+    return {table: int(version) for table, version in cur.fetchall()}
+
+def _listen_data_versions(versions):
+    # Connexion dédiée hors pool : LISTEN sur le canal des scripts d'ingestion, relecture périodique en filet de sécurité
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(**DB_PARAMS)
+            conn.autocommit = True
+            cur = conn.cursor()
+            cur.execute(f"LISTEN {VERSION_CHANNEL}")
+            while True:
+                if select.select([conn], [], [], VERSION_POLL_SECONDS) != ([], [], []):
+                    conn.poll()
+                    conn.notifies.clear()
+                versions.update(_read_versions(cur))
+        except Exception:
+            pass
+        finally:
+            if conn is not None:
+                conn.close()
+        sleep(VERSION_POLL_SECONDS)
+
+def data_version(table):
+    # Version courante de la table (clé des caches d'interpolateurs) ; écoute lancée au premier appel
+    global _versions
+    with _versions_lock:
+        if _versions is None:
+            _versions = {}
+            try:
+                with connection() as conn, conn.cursor() as cur:
+                    _versions.update(_read_versions(cur))
+            except psycopg2.Error:
+                pass
+            threading.Thread(target=_listen_data_versions, args=(_versions,), daemon=True).start()
+    return _versions.get(table, 0)
+
+# ----------------------- INTERPOLATEURS -----------------------
+
+class NoData(Exception):
+    # Pas de points ou ajustement impossible : levée pour que lru_cache ne mémorise pas l'absence de résultat
+    pass
+
+def to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value), "%Y-%m-%d").date()
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _forward_interpolator(lexifi_id, obs_date, version):
+    query = f"""
+        SELECT (split_part(lexifi_forward_id, ' ', 2)::date - lexifi_date) / 365.0 AS ttm, lexifi_forward
+        FROM {FORWARD_RAW_TABLE}
+        WHERE lexifi_id = %s AND lexifi_date = %s
+          AND split_part(lexifi_forward_id, ' ', 2) ~ '^\\d{{4}}-\\d{{2}}-\\d{{2}}$'
+          AND lexifi_forward IS NOT NULL
+    """
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(query, (lexifi_id, obs_date))
+        points = sorted((float(ttm), float(fwd)) for ttm, fwd in cur.fetchall() if ttm > 0)
+    if not points:
+        raise NoData(lexifi_id, obs_date)
+    ttms, values = zip(*points)
+    interp = build_forward_interpolator(np.array(ttms), np.array(values), FORWARD_METHOD)
+    if interp is None:
+        raise NoData(lexifi_id, obs_date)
+    return interp
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _vol_interpolator(lexifi_id, obs_date, version):
+    query = f"""
+        SELECT (split_part(lexifi_vol_id, ' ', 2)::date - lexifi_date) / 365.0 AS ttm,
+               rtrim(split_part(lexifi_vol_id, ' ', 3), '%%')::float AS strike,
+               lexifi_vol
+        FROM {VOL_RAW_TABLE}
+        WHERE lexifi_id = %s AND lexifi_date = %s
+          AND split_part(lexifi_vol_id, ' ', 2) ~ '^\\d{{4}}-\\d{{2}}-\\d{{2}}$'
+          AND split_part(lexifi_vol_id, ' ', 3) ~ '^-?[0-9.]+%%$'
+          AND lexifi_vol IS NOT NULL
+    """
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(query, (lexifi_id, obs_date))
+        records = [(float(ttm), round(strike, 4), float(vol)) for ttm, strike, vol in cur.fetchall() if ttm > 0]
+    if not records:
+        raise NoData(lexifi_id, obs_date)
+    ttms, strikes, vols = zip(*records)
+    try:
+        return build_surface_interpolator(strikes, ttms, vols, SURFACE_METHOD)
+    except Exception as e:
+        raise NoData(lexifi_id, obs_date) from e
+
+def get_forward_interpolator(lexifi_id, obs_date):
+    # None si aucune courbe : non mémorisé, une date ingérée plus tard est servie sans redémarrage
+    try:
+        return _forward_interpolator(lexifi_id, obs_date, data_version(FORWARD_RAW_TABLE))
+    except NoData:
+        return None
+
+def get_vol_interpolator(lexifi_id, obs_date):
+    try:
+        return _vol_interpolator(lexifi_id, obs_date, data_version(VOL_RAW_TABLE))
+    except NoData:
+        return None
+
+def fwd(lexifi_id, obs_date, tenor):
+    interp = get_forward_interpolator(lexifi_id, to_date(obs_date))
+    tenor = np.asarray(tenor, dtype=float)
+    if interp is None:
+        out = np.full(tenor.shape, np.nan)
+    else:
+        out = np.asarray(interp(tenor), dtype=float)
+    return float(out) if out.ndim == 0 else out
+
+def vol(lexifi_id, obs_date, tenor, strike):
+    interp = get_vol_interpolator(lexifi_id, to_date(obs_date))
+    tenor, strike = np.broadcast_arrays(np.asarray(tenor, dtype=float), np.asarray(strike, dtype=float))
+    if interp is None:
+        out = np.full(tenor.shape, np.nan)
+    else:
+        out = np.asarray(interp(tenor, strike), dtype=float)
+    return float(out) if out.ndim == 0 else out
+
+def _group_positions(lexifi_ids, obs_dates):
+    groups = {}
+    for pos, key in enumerate(zip(lexifi_ids, (to_date(d) for d in obs_dates))):
+        groups.setdefault(key, []).append(pos)
+    return groups
+
+def fwd_batch(lexifi_ids, obs_dates, tenors):
+    tenors = np.asarray(tenors, dtype=float)
+    out = np.full(tenors.shape, np.nan)
+    for (lexifi_id, obs_date), positions in _group_positions(lexifi_ids, obs_dates).items():
+        out[positions] = fwd(lexifi_id, obs_date, tenors[positions])
+    return out
+
+def vol_batch(lexifi_ids, obs_dates, tenors, strikes):
+    tenors = np.asarray(tenors, dtype=float)
+    strikes = np.asarray(strikes, dtype=float)
+    out = np.full(tenors.shape, np.nan)
+    for (lexifi_id, obs_date), positions in _group_positions(lexifi_ids, obs_dates).items():
+        out[positions] = vol(lexifi_id, obs_date, tenors[positions], strikes[positions])
+    return out
+
+def cache_stats():
+    return {
+        "forward": _forward_interpolator.cache_info()._asdict(),
+        "vol": _vol_interpolator.cache_info()._asdict()
+    }
+
+def clear_cache():
+    _forward_interpolator.cache_clear()
+    _vol_interpolator.cache_clear()
+
+# ----------------------- HTTP (localhost) -----------------------
+
+def _floats(params, name):
+    return [float(v) for v in params[name][0].split(",")]
+
+def _json_values(values):
+    return [None if np.isnan(v) else float(v) for v in np.atleast_1d(values)]
+
+class QueryHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        start = time()
+        try:
+            if url.path == "/fwd":
+                values = fwd(params["lexifi_id"][0], params["date"][0], _floats(params, "tenor"))
+                payload = {"fwd": _json_values(values)}
+            elif url.path == "/vol":
+                values = vol(params["lexifi_id"][0], params["date"][0], _floats(params, "tenor"), _floats(params, "strike"))
+                payload = {"vol": _json_values(values)}
+            elif url.path == "/stats":
+                payload = cache_stats()
+            else:
+                self.send_json(404, {"error": "Routes : /fwd, /vol, /stats"})
+                return
+        except (KeyError, ValueError) as e:
+            self.send_json(400, {"error": f"Paramètre manquant ou invalide : {e}"})
+            return
+        except psycopg2.Error as e:
+            # Connexion remise en état par connection() : la requête suivante repart sur une connexion saine
+            self.send_json(503, {"error": f"Erreur base de données : {str(e).strip()}"})
+            return
+        except Exception as e:
+            self.send_json(500, {"error": f"Erreur interne : {type(e).__name__}: {e}"})
+            return
+        payload["elapsed_ms"] = round((time() - start) * 1000, 3)
+        self.send_json(200, payload)
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    server = ThreadingHTTPServer((HTTP_HOST, HTTP_PORT), QueryHandler)
+    print(f"🚀 Service d'interpolation sur http://{HTTP_HOST}:{HTTP_PORT}")
+    print("   ↪ /vol?lexifi_id=...&date=YYYY-MM-DD&tenor=2.5&strike=87")
+    print("   ↪ /fwd?lexifi_id=...&date=YYYY-MM-DD&tenor=1,2.5,7")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if _pool is not None:
+            _pool.closeall()
+        print("\n✅ Service arrêté")
+
+if __name__ == "__main__":
+    main()
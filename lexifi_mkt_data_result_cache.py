@@ -0,0 +1,133 @@
+import pickle
+import sqlite3
+import threading
+import pandas as pd
+from pathlib import Path
+from time import time
+from functools import lru_cache
+
+DEFAULT_PATH = Path.home() / ".cache" / "lexifi_mkt_data" / "results.sqlite"
+DEFAULT_MAX_MB = 2048
+BUSY_TIMEOUT = 30  # secondes d'attente si un autre worker écrit
+
+# ----------------------- SÉRIALISATION -----------------------
+
+SERIES_COLUMN = "__series__"
+
+@lru_cache(maxsize=None)
+def get_arrow():
+    # Import différé : pyarrow n'est chargé qu'à la première écriture / lecture Arrow
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError:
+        return None
+
+def serialize(value):
+    # DataFrame / Series en Arrow IPC, le reste (ou une colonne que Arrow refuse) en pickle
+    pa = get_arrow()
+    if pa is not None and isinstance(value, (pd.DataFrame, pd.Series)):
+        is_series = isinstance(value, pd.Series)
+        frame = value.to_frame(name=SERIES_COLUMN) if is_series else value
+        try:
+            table = pa.Table.from_pandas(frame, preserve_index=True)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            return ("arrow_series" if is_series else "arrow"), sink.getvalue().to_pybytes()
+        except (pa.ArrowException, TypeError, ValueError):
+            pass
+    return "pickle", pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+def deserialize(kind, payload):
+    if kind == "pickle":
+        return pickle.loads(payload)
+    frame = get_arrow().ipc.open_stream(payload).read_all().to_pandas()
+    return frame[SERIES_COLUMN].rename(None) if kind == "arrow_series" else frame
+
+# ----------------------- BACKENDS -----------------------
+
+class NullResultCache:
+    # Pas de cache partagé : seul le st.cache_data du process sert
+    def __init__(self, **options):
+        pass
+
+    def get(self, key, version):
+        return False, None
+
+    def put(self, key, version, value):
+        pass
+
+    def stats(self):
+        return {"backend": "none"}
+
+class SQLiteResultCache:
+    # Un fichier SQLite (WAL) partagé par tous les workers de la machine ; LRU borné en octets, une version par entrée
+    def __init__(self, path=DEFAULT_PATH, max_mb=DEFAULT_MAX_MB):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(str(self.path), timeout=BUSY_TIMEOUT, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                version TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                payload BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+
+    def get(self, key, version):
+        with self.lock:
+            row = self.conn.execute("SELECT version, kind, payload FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or row[0] != repr(version):
+                self.misses += 1
+                return False, None
+            self.conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time(), key))
+            self.hits += 1
+        return True, deserialize(row[1], row[2])
+
+    def put(self, key, version, value):
+        kind, payload = serialize(value)
+        if len(payload) > self.max_bytes:
+            return
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (key, version, kind, payload, size, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, repr(version), kind, sqlite3.Binary(payload), len(payload), time())
+            )
+            self._evict()
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        victims = []
+        for key, size in self.conn.execute("SELECT key, size FROM entries ORDER BY last_access"):
+            victims.append((key,))
+            freed += size
+            if total - freed <= self.max_bytes:
+                break
+        self.conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+
+    def stats(self):
+        with self.lock:
+            n_entries, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"backend": "sqlite", "path": str(self.path), "entries": n_entries, "size_mb": total / 1024 / 1024, "hits": self.hits, "misses": self.misses}
+
+BACKENDS = {
+    None: NullResultCache,
+    "sqlite": SQLiteResultCache,
+}
+
+def make_result_cache(backend, **options):
+    return BACKENDS[backend](**options)
@@ -0,0 +1,51 @@
+import numpy as np
+
+SEARCH_TOP_K = 50
+
+def build_search_index(ids, base_ids, names):
+    # Index trié sur lexifi_id et asset_name (minuscules) : préfixes par dichotomie, sous-chaînes en repli vectorisé
+    ids = np.asarray(list(ids), dtype=str)
+    base_ids = np.asarray(list(base_ids), dtype=str)
+    names = np.asarray(list(names), dtype=str)
+    lower_ids = np.char.lower(ids)
+    lower_names = np.char.lower(names)
+    order_ids = np.argsort(lower_ids, kind="stable")
+    order_names = np.argsort(lower_names, kind="stable")
+    return {
+        "ids": ids,
+        "base_ids": base_ids,
+        "labels": np.char.add(np.char.add(ids, " - "), names),
+        "lower_ids": lower_ids,
+        "lower_names": lower_names,
+        "sorted_ids": lower_ids[order_ids],
+        "order_ids": order_ids,
+        "sorted_names": lower_names[order_names],
+        "order_names": order_names,
+        "positions": {instrument_id: pos for pos, instrument_id in enumerate(ids)},
+    }
+
+def _prefix_positions(sorted_keys, order, prefix):
+    lo = np.searchsorted(sorted_keys, prefix, side="left")
+    hi = np.searchsorted(sorted_keys, prefix + "\uffff", side="left")
+    return order[lo:hi]
+
+def search(index, query, top_k=SEARCH_TOP_K):
+    # Rang : préfixe d'id (id exact en premier), préfixe de nom, puis sous-chaîne dans l'id ou le nom
+    query = query.strip().lower()
+    if not query or len(index["ids"]) == 0:
+        return []
+    found = []
+    found.extend(_prefix_positions(index["sorted_ids"], index["order_ids"], query)[:top_k])
+    found.extend(_prefix_positions(index["sorted_names"], index["order_names"], query)[:top_k])
+    if len(set(found)) < top_k:
+        found.extend(np.flatnonzero(np.char.find(index["lower_ids"], query) >= 0)[:top_k])
+        found.extend(np.flatnonzero(np.char.find(index["lower_names"], query) >= 0)[:top_k])
+    positions = list(dict.fromkeys(int(pos) for pos in found))[:top_k]
+    return index["ids"][positions].tolist()
+
+def label_of(index, instrument_id):
+    pos = index["positions"].get(instrument_id)
+    return instrument_id if pos is None else str(index["labels"][pos])
+
+def base_id_map(index, instrument_ids):
+    return {i: str(index["base_ids"][index["positions"][i]]) if i in index["positions"] else i.split()[0] for i in instrument_ids}
@@ -0,0 +1,106 @@
+import numpy as np
+from lexifi_mkt_data_db_metadata import CATALOG_TABLE, CATALOG_SOURCES, BASE_COL, DATE_COL, catalog_empty
+
+# Tables servies par les snapshots : spot brut, forwards et vols normalisés
+SNAPSHOT_TABLES = {
+    "spot": "asset_spot",
+    "forward": "asset_forward_normalized",
+    "vol": "asset_volatility_normalized",
+}
+
+def ensure_snapshot_index(cur, source_table):
+    # (id, date DESC) + valeur incluse : la dernière observation <= D de chaque instrument est un index-only scan
+    source = CATALOG_SOURCES[source_table]
+    cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS {source_table}_asof_idx
+        ON {source_table} ({source['key']}, {DATE_COL} DESC) INCLUDE ({source['value']})
+    """)
+
+def _snapshot_query(source_table, use_catalog, base_ids, max_age_days):
+    source = CATALOG_SOURCES[source_table]
+    age_filter = "" if max_age_days is None else f"AND t.{DATE_COL} >= %(as_of)s::date - %(max_age_days)s"
+    if use_catalog:
+        # Un LIMIT 1 par instrument du catalogue, chacun servi par l'index asof
+        base_filter = "" if base_ids is None else "AND c.base_id = ANY(%(base_ids)s)"
+        return f"""
+            SELECT c.instrument_id, c.base_id, o.obs_date, o.obs_value
+            FROM {CATALOG_TABLE} c
+            CROSS JOIN LATERAL (
+                SELECT t.{DATE_COL} AS obs_date, t.{source['value']} AS obs_value
+                FROM {source_table} t
+                WHERE t.{source['key']} = c.instrument_id AND t.{DATE_COL} <= %(as_of)s
+                  AND t.{source['value']} IS NOT NULL {age_filter}
+                ORDER BY t.{DATE_COL} DESC
+                LIMIT 1
+            ) o
+            WHERE c.source_table = %(source_table)s AND c.first_date <= %(as_of)s {base_filter}
+            ORDER BY c.instrument_id
+        """
+    # Table pas encore cataloguée : DISTINCT ON sur la plage de dates (plus lent, même résultat)
+    base_filter = "" if base_ids is None else f"AND t.{BASE_COL} = ANY(%(base_ids)s)"
+    return f"""
+        SELECT DISTINCT ON (t.{source['key']}) t.{source['key']}, t.{BASE_COL}, t.{DATE_COL}, t.{source['value']}
+        FROM {source_table} t
+        WHERE t.{DATE_COL} <= %(as_of)s AND t.{source['value']} IS NOT NULL {age_filter} {base_filter}
+        ORDER BY t.{source['key']}, t.{DATE_COL} DESC
+    """
+
+def fetch_snapshot(cur, source_table, as_of, base_ids=None, max_age_days=None):
+    # Dernière observation <= as_of de chaque instrument de source_table, en colonnes NumPy :
+    # instrument_id / base_id (object), obs_date (datetime64[D]), value (float64)
+    params = {"source_table": source_table, "as_of": as_of, "base_ids": None if base_ids is None else list(base_ids), "max_age_days": max_age_days}
+    cur.execute(_snapshot_query(source_table, not catalog_empty(cur, source_table), base_ids, max_age_days), params)
+    rows = cur.fetchall()
+    if not rows:
+        return {
+            "instrument_id": np.array([], dtype=object),
+            "base_id": np.array([], dtype=object),
+            "obs_date": np.array([], dtype="datetime64[D]"),
+            "value": np.array([], dtype=np.float64),
+        }
+    instrument_ids, base_col, dates, values = zip(*rows)
+    return {
+        "instrument_id": np.array(instrument_ids, dtype=object),
+        "base_id": np.array(base_col, dtype=object),
+        "obs_date": np.array(dates, dtype="datetime64[D]"),
+        "value": np.array(values, dtype=np.float64),
+    }
+
+def fetch_universe_snapshot(cur, as_of, base_ids=None, max_age_days=None):
+    # Spot, forwards et vols normalisés de tous les sous-jacents à la date as_of
+    return {kind: fetch_snapshot(cur, table, as_of, base_ids, max_age_days) for kind, table in SNAPSHOT_TABLES.items()}
+
+# ----------------------- GRILLES NORMALISÉES -----------------------
+
+def parse_grid_ids(instrument_ids):
+    # "<id> 5Y 100.00%" -> (5.0, 100.0) ; "<id> 5Y" -> (5.0, nan) ; NaN si le format ne correspond pas
+    tenors = np.full(len(instrument_ids), np.nan)
+    strikes = np.full(len(instrument_ids), np.nan)
+    for pos, instrument_id in enumerate(instrument_ids):
+        parts = instrument_id.split()
+        if len(parts) >= 2 and parts[1].endswith("Y"):
+            try:
+                tenors[pos] = float(parts[1][:-1])
+                if len(parts) >= 3 and parts[2].endswith("%"):
+                    strikes[pos] = float(parts[2][:-1])
+            except ValueError:
+                pass
+    return tenors, strikes
+
+def snapshot_grid(snapshot, tenors, strikes=None):
+    # Snapshot colonnaire -> cube (sous-jacents x tenors [x strikes]) aligné sur les grilles demandées, NaN si absent
+    grid_tenors, grid_strikes = parse_grid_ids(snapshot["instrument_id"])
+    base_ids, rows = np.unique(snapshot["base_id"].astype(str), return_inverse=True)
+    tenor_pos = {float(t): i for i, t in enumerate(tenors)}
+    t_idx = np.array([tenor_pos.get(t, -1) for t in grid_tenors], dtype=np.int64)
+    if strikes is None:
+        cube = np.full((len(base_ids), len(tenors)), np.nan)
+        keep = t_idx >= 0
+        cube[rows[keep], t_idx[keep]] = snapshot["value"][keep]
+        return base_ids, cube
+    strike_pos = {float(k): j for j, k in enumerate(strikes)}
+    k_idx = np.array([strike_pos.get(k, -1) for k in grid_strikes], dtype=np.int64)
+    cube = np.full((len(base_ids), len(tenors), len(strikes)), np.nan)
+    keep = (t_idx >= 0) & (k_idx >= 0)
+    cube[rows[keep], t_idx[keep], k_idx[keep]] = snapshot["value"][keep]
+    return base_ids, cube
@@ -0,0 +1,114 @@
+import numpy as np
+from lexifi_mkt_data_db_metadata import current_data_version
+
+SPOT_TABLE = "asset_spot"
+
+# lexifi_id -> (dates datetime64[D] triées, spots float64), alimenté à la demande depuis asset_spot
+# et vidé dès que la data_version de asset_spot change (processus long, ingestion spot entre deux appels)
+_index = {}
+_index_version = None
+
+def clear_spot_index():
+    global _index_version
+    _index.clear()
+    _index_version = None
+
+def load_spot_index(cur, lexifi_ids):
+    global _index_version
+    version = current_data_version(cur, SPOT_TABLE)
+    if version != _index_version:
+        _index.clear()
+        _index_version = version
+    missing = sorted(set(lexifi_ids) - set(_index))
+    if not missing:
+        return _index
+    cur.execute(f"""
+        SELECT lexifi_id, lexifi_date, lexifi_spot
+        FROM {SPOT_TABLE}
+        WHERE lexifi_id = ANY(%s) AND lexifi_spot IS NOT NULL
+        ORDER BY lexifi_id, lexifi_date
+    """, (missing,))
+    rows = cur.fetchall()
+    for lexifi_id in missing:
+        _index[lexifi_id] = (np.array([], dtype="datetime64[D]"), np.array([], dtype=float))
+    if rows:
+        ids = np.array([r[0] for r in rows], dtype=object)
+        dates = np.array([r[1] for r in rows], dtype="datetime64[D]")
+        spots = np.array([r[2] for r in rows], dtype=float)
+        bounds = np.flatnonzero(ids[1:] != ids[:-1]) + 1
+        for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(ids)]):
+            _index[ids[start]] = (dates[start:end], spots[start:end])
+    return _index
+
+def lookup_spots(lexifi_ids, dates):
+    lexifi_ids = np.asarray(lexifi_ids, dtype=object)
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    out = np.full(len(lexifi_ids), np.nan)
+    if len(lexifi_ids) == 0:
+        return out
+    unique_ids, inverse = np.unique(lexifi_ids, return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.searchsorted(inverse[order], np.arange(len(unique_ids) + 1))
+    for k, lexifi_id in enumerate(unique_ids):
+        positions = order[bounds[k]:bounds[k + 1]]
+        idx_dates, idx_spots = _index.get(lexifi_id, (None, None))
+        if idx_dates is None or len(idx_dates) == 0:
+            continue
+        pos = np.searchsorted(idx_dates, dates[positions])
+        pos = np.minimum(pos, len(idx_dates) - 1)
+        found = idx_dates[pos] == dates[positions]
+        out[positions[found]] = idx_spots[pos[found]]
+    return out
+
+def resolve_growth_rate_forwards(lexifi_ids, dates, maturities, growth_rates, local_spots=None, cur=None):
+    n = len(lexifi_ids)
+    metrics = {"growth_rate_rows": n, "spot_from_file": 0, "spot_from_index": 0, "dropped_no_spot": 0}
+    if n == 0:
+        return np.array([], dtype=float), np.array([], dtype=float), metrics
+
+    lexifi_ids = np.asarray(lexifi_ids, dtype=object)
+    date_keys = list(dates)
+    dates = np.array(date_keys, dtype="datetime64[D]")
+    maturities = np.array(maturities, dtype="datetime64[D]")
+    growth_rates = np.asarray(growth_rates, dtype=float)
+    T = (maturities - dates).astype(float) / 365
+
+    if local_spots:
+        spots = np.fromiter((local_spots.get(k, np.nan) for k in zip(lexifi_ids, date_keys)), dtype=float, count=n)
+    else:
+        spots = np.full(n, np.nan)
+    metrics["spot_from_file"] = int(np.count_nonzero(~np.isnan(spots)))
+
+    missing = np.isnan(spots)
+    if cur is not None and missing.any():
+        load_spot_index(cur, lexifi_ids[missing])
+        spots[missing] = lookup_spots(lexifi_ids[missing], dates[missing])
+        metrics["spot_from_index"] = int(np.count_nonzero(~np.isnan(spots[missing])))
+
+    forwards = spots * np.exp(growth_rates * T)
+    metrics["dropped_no_spot"] = int(np.count_nonzero(np.isnan(forwards)))
+    return forwards, T, metrics
+
+def resolve_growth_rows(growth_rows, local_spots, cur=None, metrics=None):
+    # growth_rows : (lexifi_id, date, maturity_date, growth_rate, ...) de tous les fichiers d'un passage,
+    # local_spots : spots lus dans ces mêmes fichiers. Un seul appel vectorisé -> {ligne[:4]: forward}, lignes sans spot exclues
+    if not growth_rows:
+        return {}
+    ids, dates, maturity_dates, growth_rates = zip(*(row[:4] for row in growth_rows))
+    forwards, _, run_metrics = resolve_growth_rate_forwards(ids, dates, maturity_dates, growth_rates, local_spots, cur)
+    if metrics is not None:
+        merge_metrics(metrics, run_metrics)
+    return {tuple(row[:4]): float(fwd) for row, fwd in zip(growth_rows, forwards) if not np.isnan(fwd)}
+
+def merge_metrics(total, metrics):
+    for key, value in metrics.items():
+        total[key] = total.get(key, 0) + value
+    return total
+
+def print_metrics(metrics, label):
+    if not metrics.get("growth_rate_rows"):
+        return
+    print(f"📏 {label} : {metrics['growth_rate_rows']} forward(s) en taux de croissance")
+    print(f"   ↪ spot trouvé dans le fichier : {metrics['spot_from_file']}")
+    print(f"   ↪ spot trouvé dans {SPOT_TABLE} : {metrics['spot_from_index']}")
+    print(f"   ↪ ignoré(s) faute de spot : {metrics['dropped_no_spot']}")
@@ -0,0 +1,287 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+SPOT_TABLE = "asset_spot"
+STORE_DIR = Path.home() / ".cache" / "lexifi_mkt_data" / "spot_matrix"
+META_FILE = "meta.json"
+ROW_CHUNK = 512  # dates réservées d'avance à chaque agrandissement (~2 ans de cotations)
+MIN_COL_CAPACITY = 256
+COPY_BLOCK_ROWS = 4096
+LOAD_CHUNK_ROWS = 200000  # cotations lues par bloc depuis la base
+ANCHOR_LOOKBACK = 256  # lignes remontées par bloc pour retrouver la dernière cotation avant la fenêtre
+
+# Matrice dates x actifs en float64 (NaN = pas de cotation), fichier brut mappé en mémoire.
+# meta.json (remplacé atomiquement) donne la taille utile, les ids et les fichiers de la génération courante :
+# les ajouts vont dans la capacité libre, un agrandissement ou une révision écrit une nouvelle génération,
+# les lecteurs ouverts gardent leur génération et leur taille utile.
+
+def read_meta(path=STORE_DIR):
+    try:
+        with open(Path(path) / META_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def spot_matrix_version(path=STORE_DIR):
+    meta = read_meta(path)
+    return None if meta is None else meta["version"]
+
+# ----------------------- LECTURE -----------------------
+
+class SpotMatrix:
+    def __init__(self, path=STORE_DIR, meta=None):
+        self.path = Path(path)
+        meta = meta or read_meta(self.path)
+        if meta is None:
+            raise FileNotFoundError(f"Pas de matrice spot dans {self.path}")
+        self.version = meta["version"]
+        self.ids = meta["ids"]
+        self.n_rows = meta["n_rows"]
+        self.columns = {lexifi_id: col for col, lexifi_id in enumerate(self.ids)}
+        self.dates = np.load(self.path / meta["dates_file"], mmap_mode="r")[:self.n_rows]
+        full = np.memmap(self.path / meta["values_file"], dtype=np.float64, mode="r", shape=(meta["row_capacity"], meta["col_capacity"]))
+        self.values = full[:self.n_rows, :len(self.ids)]
+
+    def row_range(self, start=None, end=None):
+        # [r0, r1) des dates comprises entre start et end inclus
+        r0 = 0 if start is None else int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start).date(), "D"), side="left"))
+        r1 = self.n_rows if end is None else int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(end).date(), "D"), side="right"))
+        return r0, max(r0, r1)
+
+    def window(self, start=None, end=None):
+        # Tout l'univers sur une fenêtre de dates : vues sans copie
+        r0, r1 = self.row_range(start, end)
+        return self.dates[r0:r1], self.values[r0:r1]
+
+    def column_positions(self, lexifi_ids):
+        return np.array([self.columns.get(i, -1) for i in lexifi_ids], dtype=np.int64)
+
+    def select(self, lexifi_ids, start=None, end=None):
+        # Vue sans copie si les colonnes demandées sont régulièrement espacées (plage contiguë, un seul actif...),
+        # sinon seules les colonnes demandées sont lues et copiées. Ids inconnus ignorés.
+        cols = self.column_positions(lexifi_ids)
+        cols = cols[cols >= 0]
+        dates, block = self.window(start, end)
+        steps = np.diff(cols)
+        if len(cols) and (len(cols) == 1 or (steps[0] > 0 and (steps == steps[0]).all())):
+            return dates, block[:, cols[0]:cols[-1] + 1:(steps[0] if len(steps) else 1)]
+        return dates, block[:, cols]
+
+    def anchor_rows(self, cols, r0):
+        # Dernière ligne cotée avant r0 pour chaque colonne (-1 si aucune), en remontant par blocs
+        anchors = np.full(len(cols), -1, dtype=np.int64)
+        missing = np.arange(len(cols))
+        hi = r0
+        while len(missing) and hi > 0:
+            lo = max(0, hi - ANCHOR_LOOKBACK)
+            valid = ~np.isnan(self.values[lo:hi][:, cols[missing]])
+            found = valid.any(axis=0)
+            last = hi - 1 - np.argmax(valid[::-1], axis=0)
+            anchors[missing[found]] = last[found]
+            missing = missing[~found]
+            hi = lo
+        return anchors
+
+    def frame(self, lexifi_ids, start=None, end=None, with_anchor=False):
+        # Même forme que le panel du dashboard : une colonne par id demandé, lignes sans aucune cotation retirées,
+        # with_anchor = dernière cotation de chaque actif avant start ajoutée à sa date
+        lexifi_ids = list(dict.fromkeys(lexifi_ids))
+        positions = self.column_positions(lexifi_ids)
+        known = positions >= 0
+        cols = positions[known]
+        r0, r1 = self.row_range(start, end)
+        values = np.full((r1 - r0, len(lexifi_ids)), np.nan)
+        values[:, known] = self.values[r0:r1][:, cols]
+        dates = self.dates[r0:r1]
+        if with_anchor and start is not None and len(cols):
+            anchors = self.anchor_rows(cols, r0)
+            anchor_rows = np.unique(anchors[anchors >= 0])
+            if len(anchor_rows):
+                head = np.full((len(anchor_rows), len(lexifi_ids)), np.nan)
+                has_anchor = anchors >= 0
+                head[np.searchsorted(anchor_rows, anchors[has_anchor]), np.flatnonzero(known)[has_anchor]] = self.values[anchors[has_anchor], cols[has_anchor]]
+                values = np.vstack([head, values])
+                dates = np.concatenate([self.dates[anchor_rows], dates])
+        keep = ~np.isnan(values).all(axis=1)
+        return pd.DataFrame(values[keep], index=pd.DatetimeIndex(dates[keep].astype("datetime64[ns]")), columns=lexifi_ids)
+
+def open_spot_matrix(path=STORE_DIR):
+    try:
+        return SpotMatrix(path)
+    except (OSError, ValueError, KeyError):
+        return None
+
+# ----------------------- ÉCRITURE (INGESTION) -----------------------
+
+def _source_query(select, dirty=None):
+    # dirty : lexifi_id -> première année touchée ; None = toute la table
+    sql = f"SELECT {select} FROM {SPOT_TABLE} s"
+    params = None
+    if dirty is not None:
+        sql += """
+            JOIN unnest(%s::text[], %s::int[]) AS d(lexifi_id, since_year)
+              ON d.lexifi_id = s.lexifi_id AND s.lexifi_date >= make_date(d.since_year, 1, 1)
+        """
+        params = (list(dirty.keys()), [int(year) for year in dirty.values()])
+    return sql + " WHERE s.lexifi_spot IS NOT NULL", params
+
+def _load_axes(conn, dirty=None):
+    # Dates et actifs présents dans la sélection, pour dimensionner la matrice avant de la remplir
+    with conn.cursor() as cur:
+        cur.execute(*_source_query("DISTINCT s.lexifi_date", dirty))
+        dates = np.array(sorted(row[0] for row in cur.fetchall()), dtype="datetime64[D]")
+        cur.execute(*_source_query("DISTINCT s.lexifi_id", dirty))
+        ids = sorted(row[0] for row in cur.fetchall())
+    return dates, ids
+
+def _iter_rows(conn, dirty=None):
+    # Curseur serveur lu par blocs de LOAD_CHUNK_ROWS lignes : la table n'est jamais entièrement en mémoire
+    cur = conn.cursor(name="lexifi_spot_matrix", withhold=True)
+    cur.itersize = LOAD_CHUNK_ROWS
+    cur.execute(*_source_query("s.lexifi_id, s.lexifi_date, s.lexifi_spot", dirty))
+    try:
+        while True:
+            rows = cur.fetchmany(LOAD_CHUNK_ROWS)
+            if not rows:
+                break
+            lexifi_ids, dates, spots = zip(*rows)
+            yield np.array(lexifi_ids, dtype=object), np.array(dates, dtype="datetime64[D]"), np.array(spots, dtype=np.float64)
+    finally:
+        cur.close()
+
+def _allocate(path, generation, row_capacity, col_capacity):
+    values_file = f"values_{generation}.f64"
+    mm = np.memmap(path / values_file, dtype=np.float64, mode="w+", shape=(row_capacity, col_capacity))
+    for r in range(0, row_capacity, COPY_BLOCK_ROWS):
+        mm[r:r + COPY_BLOCK_ROWS] = np.nan
+    return values_file, mm
+
+def _write_meta(path, meta):
+    tmp_path = path / (META_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, path / META_FILE)
+
+def _prune(path, meta):
+    # Anciennes générations : suppression best effort (un lecteur peut encore les avoir ouvertes sous Windows)
+    current = {meta["values_file"], meta["dates_file"]}
+    for file in list(path.glob("values_*.f64")) + list(path.glob("dates_*.npy")):
+        if file.name not in current:
+            try:
+                file.unlink()
+            except OSError:
+                pass
+
+def _copy_values(path, meta, mm, n_rows, n_cols):
+    old = np.memmap(path / meta["values_file"], dtype=np.float64, mode="r", shape=(meta["row_capacity"], meta["col_capacity"]))
+    for r in range(0, n_rows, COPY_BLOCK_ROWS):
+        stop = min(r + COPY_BLOCK_ROWS, n_rows)
+        mm[r:stop, :n_cols] = old[r:stop, :n_cols]
+    del old
+
+def update_spot_matrix(conn, version, dirty=None, path=STORE_DIR):
+    # dirty : lexifi_id -> première année touchée par l'ingestion ; None = reconstruction complète
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    meta = read_meta(path)
+    full = meta is None or dirty is None
+    label = "complète" if full else f"{len(dirty)} actif(s)"
+    print(f"🧮 Matrice spot ({label})...")
+    try:
+        if not full and not dirty:
+            _write_meta(path, {**meta, "version": version})
+            return True
+        loaded_dates, loaded_ids = _load_axes(conn, None if full else dirty)
+
+        if full:
+            meta = {"generation": meta["generation"] if meta else 0, "ids": [], "n_rows": 0, "row_capacity": 0, "col_capacity": 0}
+            old_dates = np.array([], dtype="datetime64[D]")
+        else:
+            old_dates = np.load(path / meta["dates_file"])[:meta["n_rows"]]
+        new_dates = np.setdiff1d(loaded_dates, old_dates)
+        if len(new_dates) and len(old_dates) and new_dates[0] <= old_dates[-1]:
+            # Date insérée au milieu de l'historique : les lignes ne peuvent plus être ajoutées en fin de fichier
+            print("   ↩️  Dates antérieures à la dernière ligne, reconstruction complète")
+            return update_spot_matrix(conn, version, None, path)
+
+        ids = meta["ids"] + sorted(set(loaded_ids) - set(meta["ids"]))
+        dates = np.concatenate([old_dates, new_dates])
+        n_rows, n_cols = len(dates), len(ids)
+        old_rows, old_cols = meta["n_rows"], len(meta["ids"])
+        columns = {lexifi_id: col for col, lexifi_id in enumerate(ids)}
+
+        # Les lecteurs ouverts ne voient que [:old_rows, :old_cols] : les nouvelles lignes / colonnes sont écrites
+        # dans la capacité libre du fichier courant et publiées par meta.json. Nouvelle génération (copie) seulement
+        # si la capacité est dépassée, ou si une cotation déjà visible change (copie sur écriture, voir plus bas).
+        generation = meta["generation"]
+        if full or n_rows > meta["row_capacity"] or n_cols > meta["col_capacity"]:
+            generation += 1
+            row_capacity = (n_rows // ROW_CHUNK + 1) * ROW_CHUNK
+            col_capacity = max(MIN_COL_CAPACITY, meta["col_capacity"], 2 * n_cols if n_cols > meta["col_capacity"] else 0)
+            values_file, mm = _allocate(path, generation, row_capacity, col_capacity)
+            if not full and old_rows:
+                _copy_values(path, meta, mm, old_rows, old_cols)
+            in_place = False
+        else:
+            row_capacity, col_capacity = meta["row_capacity"], meta["col_capacity"]
+            values_file = meta["values_file"]
+            mm = np.memmap(path / values_file, dtype=np.float64, mode="r+", shape=(row_capacity, col_capacity))
+            # Zone non publiée remise à NaN : une mise à jour interrompue a pu y laisser des valeurs
+            mm[old_rows:n_rows] = np.nan
+            if n_cols > old_cols:
+                for r in range(0, old_rows, COPY_BLOCK_ROWS):
+                    mm[r:r + COPY_BLOCK_ROWS, old_cols:n_cols] = np.nan
+            in_place = True
+
+        # Écriture vectorisée bloc par bloc : (ligne de la date, colonne de l'actif)
+        n_quotes = 0
+        revised = []
+        for lexifi_ids, obs_dates, spots in _iter_rows(conn, None if full else dirty):
+            rows = np.searchsorted(dates, obs_dates)
+            cols = np.fromiter((columns[i] for i in lexifi_ids), dtype=np.int64, count=len(lexifi_ids))
+            n_quotes += len(spots)
+            if in_place:
+                visible = (rows < old_rows) & (cols < old_cols)
+                current = mm[rows[visible], cols[visible]]
+                changed = current != spots[visible]
+                if changed.any():
+                    revised.append((rows[visible][changed], cols[visible][changed], spots[visible][changed]))
+                rows, cols, spots = rows[~visible], cols[~visible], spots[~visible]
+            mm[rows, cols] = spots
+        mm.flush()
+        del mm
+
+        if revised:
+            # Cotations déjà publiées modifiées : nouvelle génération pour ne pas changer les cellules sous les lecteurs
+            generation += 1
+            values_file, mm = _allocate(path, generation, row_capacity, col_capacity)
+            _copy_values(path, meta, mm, n_rows, n_cols)
+            for rows, cols, spots in revised:
+                mm[rows, cols] = spots
+            mm.flush()
+            del mm
+
+        dates_file = f"dates_{generation}_{version}.npy"
+        np.save(path / dates_file, dates)
+        new_meta = {
+            "version": version, "generation": generation, "ids": ids, "n_rows": n_rows,
+            "row_capacity": row_capacity, "col_capacity": col_capacity,
+            "values_file": values_file, "dates_file": dates_file,
+        }
+        _write_meta(path, new_meta)
+        _prune(path, new_meta)
+        print(f"   ✅ {n_rows} date(s) x {n_cols} actif(s), {n_quotes} cotation(s) écrite(s)")
+        return True
+    except Exception as e:
+        print(f"❌ Erreur lors de la mise à jour de la matrice spot : {e}")
+        return False
+
+def sync_spot_matrix(conn, version, dirty, previous_version, path=STORE_DIR):
+    # Incrémental seulement si la matrice reflète la base d'avant cette ingestion, sinon reconstruction complète
+    stored = spot_matrix_version(path)
+    if stored == version:
+        return True
+    return update_spot_matrix(conn, version, dirty if stored == previous_version else None, path)
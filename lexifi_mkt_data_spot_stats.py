@@ -0,0 +1,128 @@
+from psycopg2.extras import execute_values
+
+SPOT_TABLE = "asset_spot"
+YEARLY_TABLE = "asset_spot_yearly"
+STATS_TABLE = "asset_spot_stats"
+TRADING_DAYS = 252
+
+def ensure_stats_tables(cur):
+    # Une ligne par (actif, année) : clôture, extrêmes et sommes des rendements pour recomposer la vol sur n'importe quelle plage d'années
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {YEARLY_TABLE} (
+            lexifi_id TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            last_date DATE NOT NULL,
+            close DOUBLE PRECISION NOT NULL,
+            low DOUBLE PRECISION NOT NULL,
+            high DOUBLE PRECISION NOT NULL,
+            n_returns INTEGER NOT NULL,
+            sum_returns DOUBLE PRECISION NOT NULL,
+            sum_sq_returns DOUBLE PRECISION NOT NULL,
+            PRIMARY KEY (lexifi_id, year)
+        )
+    """)
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {STATS_TABLE} (
+            lexifi_id TEXT PRIMARY KEY,
+            last_date DATE NOT NULL,
+            last_value DOUBLE PRECISION NOT NULL,
+            ytd_base DOUBLE PRECISION,
+            vol_1m DOUBLE PRECISION,
+            vol_3m DOUBLE PRECISION,
+            vol_1y DOUBLE PRECISION,
+            updated_at TIMESTAMP NOT NULL DEFAULT now()
+        )
+    """)
+
+def stats_table_empty(cur):
+    cur.execute(f"SELECT NOT EXISTS (SELECT 1 FROM {STATS_TABLE})")
+    return cur.fetchone()[0]
+
+def _load_dirty(cur, dirty):
+    cur.execute("CREATE TEMP TABLE tmp_spot_dirty (lexifi_id TEXT PRIMARY KEY, since_year INTEGER NOT NULL) ON COMMIT DROP")
+    if dirty is None:
+        cur.execute(f"""
+            INSERT INTO tmp_spot_dirty
+            SELECT lexifi_id, MIN(EXTRACT(YEAR FROM lexifi_date))::int FROM {SPOT_TABLE} GROUP BY lexifi_id
+        """)
+    else:
+        execute_values(cur, "INSERT INTO tmp_spot_dirty (lexifi_id, since_year) VALUES %s", list(dirty.items()))
+
+def _refresh_yearly(cur):
+    # Le LAG est calculé avec l'année précédente pour que le premier rendement de since_year soit juste
+    cur.execute(f"""
+        DELETE FROM {YEARLY_TABLE} AS y
+        USING tmp_spot_dirty AS d
+        WHERE y.lexifi_id = d.lexifi_id AND y.year >= d.since_year
+    """)
+    cur.execute(f"""
+        INSERT INTO {YEARLY_TABLE} (lexifi_id, year, last_date, close, low, high, n_returns, sum_returns, sum_sq_returns)
+        SELECT lexifi_id, year, MAX(lexifi_date), (ARRAY_AGG(lexifi_spot ORDER BY lexifi_date DESC))[1],
+               MIN(lexifi_spot), MAX(lexifi_spot), COUNT(r), COALESCE(SUM(r), 0), COALESCE(SUM(r * r), 0)
+        FROM (
+            SELECT s.lexifi_id, s.lexifi_date, s.lexifi_spot, d.since_year,
+                   EXTRACT(YEAR FROM s.lexifi_date)::int AS year,
+                   s.lexifi_spot / NULLIF(LAG(s.lexifi_spot) OVER (PARTITION BY s.lexifi_id ORDER BY s.lexifi_date), 0) - 1 AS r
+            FROM {SPOT_TABLE} s
+            JOIN tmp_spot_dirty d ON d.lexifi_id = s.lexifi_id
+            WHERE s.lexifi_spot IS NOT NULL AND s.lexifi_date >= make_date(d.since_year - 1, 1, 1)
+        ) x
+        WHERE year >= since_year
+        GROUP BY lexifi_id, year
+    """)
+
+def _refresh_latest(cur):
+    cur.execute(f"DELETE FROM {STATS_TABLE} AS t USING tmp_spot_dirty AS d WHERE t.lexifi_id = d.lexifi_id")
+    cur.execute(f"""
+        INSERT INTO {STATS_TABLE} (lexifi_id, last_date, last_value, ytd_base, vol_1m, vol_3m, vol_1y)
+        SELECT l.lexifi_id, l.last_date, l.close,
+               (SELECT p.close FROM {YEARLY_TABLE} p WHERE p.lexifi_id = l.lexifi_id AND p.year < l.year ORDER BY p.year DESC LIMIT 1),
+               v.vol_1m, v.vol_3m, v.vol_1y
+        FROM (
+            SELECT DISTINCT ON (y.lexifi_id) y.lexifi_id, y.year, y.last_date, y.close
+            FROM {YEARLY_TABLE} y
+            JOIN tmp_spot_dirty d ON d.lexifi_id = y.lexifi_id
+            ORDER BY y.lexifi_id, y.year DESC
+        ) l
+        LEFT JOIN (
+            SELECT lexifi_id,
+                   STDDEV_SAMP(r) FILTER (WHERE lexifi_date > last_date - INTERVAL '1 month') * SQRT({TRADING_DAYS}) AS vol_1m,
+                   STDDEV_SAMP(r) FILTER (WHERE lexifi_date > last_date - INTERVAL '3 months') * SQRT({TRADING_DAYS}) AS vol_3m,
+                   STDDEV_SAMP(r) FILTER (WHERE lexifi_date > last_date - INTERVAL '1 year') * SQRT({TRADING_DAYS}) AS vol_1y
+            FROM (
+                SELECT s.lexifi_id, s.lexifi_date, m.last_date,
+                       s.lexifi_spot / NULLIF(LAG(s.lexifi_spot) OVER (PARTITION BY s.lexifi_id ORDER BY s.lexifi_date), 0) - 1 AS r
+                FROM {SPOT_TABLE} s
+                JOIN (
+                    SELECT y.lexifi_id, MAX(y.last_date) AS last_date
+                    FROM {YEARLY_TABLE} y JOIN tmp_spot_dirty d ON d.lexifi_id = y.lexifi_id
+                    GROUP BY y.lexifi_id
+                ) m ON m.lexifi_id = s.lexifi_id
+                WHERE s.lexifi_spot IS NOT NULL AND s.lexifi_date >= m.last_date - INTERVAL '13 months'
+            ) x
+            GROUP BY lexifi_id
+        ) v ON v.lexifi_id = l.lexifi_id
+    """)
+
+def refresh_spot_stats(conn, dirty=None):
+    # dirty = {lexifi_id: première année modifiée} ; None = recalcul complet
+    if dirty is not None and not dirty:
+        return True
+    label = "complet" if dirty is None else f"{len(dirty)} actif(s)"
+    print(f"📊 Rafraîchissement des statistiques spot ({label})...")
+    conn.autocommit = False
+    try:
+        with conn.cursor() as cur:
+            ensure_stats_tables(cur)
+            _load_dirty(cur, dirty)
+            _refresh_yearly(cur)
+            _refresh_latest(cur)
+        conn.commit()
+        print(f"   ✅ {YEARLY_TABLE} / {STATS_TABLE} à jour")
+        return True
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Erreur lors du rafraîchissement des statistiques, transaction annulée : {e}")
+        return False
+    finally:
+        conn.autocommit = True
@@ -0,0 +1,105 @@
+import io
+import numpy as np
+from psycopg2.extras import execute_values
+
+SURFACE_TABLE = "asset_volatility_surface"
+GRID_TABLE = "vol_surface_grid"
+
+# (tenors, strikes) -> grid_id, pour ne pas relire vol_surface_grid à chaque écriture.
+# Seuls les ids validés (curseur en autocommit) y sont mis : un id inséré dans une transaction annulée n'existe pas.
+_grid_ids = {}
+
+def ensure_surface_tables(cur):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {GRID_TABLE} (
+            grid_id SERIAL PRIMARY KEY,
+            tenors REAL[] NOT NULL,
+            strikes REAL[] NOT NULL,
+            UNIQUE (tenors, strikes)
+        )
+    """)
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SURFACE_TABLE} (
+            lexifi_id TEXT NOT NULL,
+            lexifi_date DATE NOT NULL,
+            grid_id INTEGER NOT NULL REFERENCES {GRID_TABLE} (grid_id),
+            vols REAL[] NOT NULL,
+            PRIMARY KEY (lexifi_id, lexifi_date)
+        )
+    """)
+
+def get_grid_id(cur, tenors, strikes):
+    # À appeler une fois en autocommit avant les transactions d'écriture pour profiter du cache
+    key = (tuple(float(t) for t in tenors), tuple(float(k) for k in strikes))
+    if key in _grid_ids:
+        return _grid_ids[key]
+    cur.execute(f"""
+        INSERT INTO {GRID_TABLE} (tenors, strikes) VALUES (%s::real[], %s::real[])
+        ON CONFLICT (tenors, strikes) DO NOTHING
+    """, (list(key[0]), list(key[1])))
+    cur.execute(f"SELECT grid_id FROM {GRID_TABLE} WHERE tenors = %s::real[] AND strikes = %s::real[]", (list(key[0]), list(key[1])))
+    grid_id = cur.fetchone()[0]
+    if cur.connection.autocommit:
+        _grid_ids[key] = grid_id
+    return grid_id
+
+def surface_to_array(surface, tenors, strikes):
+    tenor_pos = {float(t): i for i, t in enumerate(tenors)}
+    strike_pos = {float(k): j for j, k in enumerate(strikes)}
+    values = np.full((len(tenors), len(strikes)), np.nan)
+    for (ttm, strike), vol in surface.items():
+        values[tenor_pos[float(ttm)], strike_pos[float(strike)]] = vol
+    return values
+
+def _array_values(values):
+    return [None if np.isnan(v) else float(v) for v in values.ravel()]
+
+def replace_surfaces(cur, keys, surfaces, tenors, strikes):
+    if not keys:
+        return
+    grid_id = get_grid_id(cur, tenors, strikes)
+    execute_values(cur, f"""
+        DELETE FROM {SURFACE_TABLE} AS t
+        USING (VALUES %s) AS k(lexifi_id, lexifi_date)
+        WHERE t.lexifi_id = k.lexifi_id AND t.lexifi_date = k.lexifi_date
+    """, keys)
+    rows = [
+        (lexifi_id, date, grid_id, _array_values(surface_to_array(surface, tenors, strikes)))
+        for lexifi_id, date, surface in surfaces if surface
+    ]
+    execute_values(cur, f"""
+        INSERT INTO {SURFACE_TABLE} (lexifi_id, lexifi_date, grid_id, vols) VALUES %s
+        ON CONFLICT (lexifi_id, lexifi_date) DO UPDATE SET grid_id = EXCLUDED.grid_id, vols = EXCLUDED.vols
+    """, rows, template="(%s, %s, %s, %s::real[])")
+
+def copy_surfaces(cur, keys_table, surfaces, tenors, strikes):
+    grid_id = get_grid_id(cur, tenors, strikes)
+    cur.execute(f"""
+        DELETE FROM {SURFACE_TABLE} AS t
+        USING {keys_table} AS k
+        WHERE t.lexifi_id = k.lexifi_id AND t.lexifi_date = k.lexifi_date
+    """)
+    buffer = io.StringIO()
+    for lexifi_id, date, surface in surfaces:
+        if not surface:
+            continue
+        values = surface_to_array(surface, tenors, strikes).ravel()
+        literal = ",".join("NULL" if np.isnan(v) else repr(float(v)) for v in values)
+        buffer.write(f"{lexifi_id}\t{date}\t{grid_id}\t{{{literal}}}\n")
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {SURFACE_TABLE} (lexifi_id, lexifi_date, grid_id, vols) FROM STDIN", buffer)
+
+def fetch_surface(cur, lexifi_id, date):
+    cur.execute(f"""
+        SELECT g.tenors, g.strikes, s.vols
+        FROM {SURFACE_TABLE} s
+        JOIN {GRID_TABLE} g ON g.grid_id = s.grid_id
+        WHERE s.lexifi_id = %s AND s.lexifi_date = %s
+    """, (lexifi_id, date))
+    row = cur.fetchone()
+    if row is None:
+        return None
+    tenors = np.array(row[0], dtype=float)
+    strikes = np.array(row[1], dtype=float)
+    vols = np.array(row[2], dtype=float).reshape(len(tenors), len(strikes))
+    return tenors, strikes, vols
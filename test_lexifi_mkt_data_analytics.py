@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+from lexifi_mkt_data_analytics import rebase_panel, yearly_performance, annualized_vol, relative_slope_matrix
+from lexifi_mkt_data_analytics_bench import loop_rebase, loop_yearly_performance, loop_annualized_vol, loop_slope_matrix
+
+@pytest.fixture
+def panel():
+    # Début décalé, trous internes, année entière manquante et série vide
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range("2019-11-01", "2022-03-31")
+    values = 100 * np.exp(np.cumsum(rng.normal(0.0, 0.01, size=(len(dates), 4)), axis=0))
+    panel = pd.DataFrame(values, index=dates, columns=["A", "B", "C", "EMPTY"])
+    panel.loc[:"2020-02-14", "B"] = np.nan
+    panel.iloc[::7, 0] = np.nan
+    panel.loc["2020-06-01":"2020-06-30", "A"] = np.nan
+    panel.loc["2021-01-01":"2021-12-31", "C"] = np.nan
+    panel["EMPTY"] = np.nan
+    return panel
+
+def test_rebase_panel_values():
+    panel = pd.DataFrame({"A": [np.nan, 50.0, np.nan, 100.0], "B": [np.nan] * 4}, index=pd.bdate_range("2024-01-01", periods=4))
+    rebased, excluded = rebase_panel(panel)
+    assert excluded == ["B"]
+    assert list(rebased.columns) == ["A"]
+    np.testing.assert_allclose(rebased["A"].to_numpy(), [100.0, 100.0, np.nan, 200.0])
+
+def test_rebase_panel_matches_loop(panel):
+    expected, expected_excluded = loop_rebase(panel)
+    result, excluded = rebase_panel(panel)
+    pd.testing.assert_frame_equal(expected, result, check_dtype=False)
+    assert excluded == expected_excluded
+
+def test_yearly_performance_values():
+    dates = pd.to_datetime(["2022-06-30", "2022-12-30", "2023-12-29", "2025-03-31"])
+    panel = pd.DataFrame({"A": [90.0, 100.0, 110.0, 121.0]}, index=dates)
+    perf = yearly_performance(panel, 2023)
+    assert list(perf.columns) == ["Perf 2023", "Perf 2024", "Perf 2025"]
+    np.testing.assert_allclose(perf.loc["A", "Perf 2023"], 10.0)
+    assert np.isnan(perf.loc["A", "Perf 2024"])
+    # 2025 mesurée depuis la dernière clôture connue (fin 2023)
+    np.testing.assert_allclose(perf.loc["A", "Perf 2025"], 10.0)
+
+def test_yearly_performance_matches_loop(panel):
+    expected = loop_yearly_performance(panel, 2020)
+    result = yearly_performance(panel, 2020)
+    pd.testing.assert_frame_equal(expected, result.loc[expected.index, expected.columns], check_dtype=False)
+
+def test_annualized_vol_constant_growth():
+    panel = pd.DataFrame({"A": 100 * 1.01 ** np.arange(10)}, index=pd.bdate_range("2024-01-01", periods=10))
+    np.testing.assert_allclose(annualized_vol(panel)["A"], 0.0, atol=1e-12)
+
+def test_annualized_vol_matches_loop_with_interior_gaps(panel):
+    expected = loop_annualized_vol(panel)
+    result = annualized_vol(panel)
+    pd.testing.assert_series_equal(expected, result, check_names=False)
+
+def test_relative_slope_matrix():
+    values = np.array([100.0, 110.0, 0.0, 121.0])
+    tenors = pd.Index([1, 2, 3, 5])
+    matrix = relative_slope_matrix(values, tenors)
+    np.testing.assert_allclose(matrix.loc[1, 2], 10.0)
+    np.testing.assert_allclose(matrix.loc[2, 5], 10.0)
+    np.testing.assert_allclose(matrix.loc[5, 5], 0.0)
+    assert matrix.loc[3].isna().all()
+    pd.testing.assert_frame_equal(loop_slope_matrix(pd.Series(values, index=tenors)), matrix, check_dtype=False)